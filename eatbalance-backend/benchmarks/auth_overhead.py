@@ -0,0 +1,111 @@
+# benchmarks/auth_overhead.py
+"""
+Coste de la autenticación por petición, antes y después de la caché de tokens.
+
+- Micro: decode del JWT + session.get(User) (el camino de siempre), acierto en
+  la caché de security.auth_cache y modo solo-claims (get_token_claims).
+- HTTP en proceso (httpx + ASGITransport): GET /users/me sin caché y con caché,
+  y GET /menus con y sin AUTH_READ_CLAIMS_ONLY.
+
+Uso (desde eatbalance-backend):  python benchmarks/auth_overhead.py [--repeat 30 --number 200 --requests 300]
+
+La BD se crea en un directorio temporal, no toca eatbalance.db.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from suite import measure, summarize  # noqa: E402
+
+
+def bench_micro(token: str, args):
+    import security
+    from db import engine
+    from models import User
+    from sqlmodel import Session
+
+    def old_path():
+        # una sesión por petición, como get_session
+        with Session(engine) as session:
+            user_id, _, _ = security._decode(token)
+            session.get(User, user_id)
+
+    def cached():
+        with Session(engine) as session:
+            security.get_current_user(token, session)
+
+    out = {"decode + session.get (sin caché)": measure(old_path, args.repeat, number=args.number)}
+    security.auth_cache.clear()
+    out["auth_cache (acierto)"] = measure(cached, args.repeat, number=args.number)
+    out["solo claims (sin BD)"] = measure(lambda: security.get_token_claims(token), args.repeat, number=args.number)
+    return out
+
+
+async def _http_series(client, url: str, headers, requests: int):
+    samples = []
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        r = await client.get(url, headers=headers)
+        samples.append((time.perf_counter() - t0) * 1000)
+        r.raise_for_status()
+    return summarize(samples)
+
+async def bench_http(token: str, args):
+    import httpx
+    import main
+    import security
+
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=main.app)
+    out = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        ttl = security.auth_cache.ttl_s
+        security.auth_cache.ttl_s = 0
+        security.auth_cache.clear()
+        out["http GET /users/me (sin caché)"] = await _http_series(client, "/users/me", headers, args.requests)
+        security.auth_cache.ttl_s = ttl
+        out["http GET /users/me (con caché)"] = await _http_series(client, "/users/me", headers, args.requests)
+        out["http GET /menus (con caché)"] = await _http_series(client, "/menus", headers, args.requests)
+        security.AUTH_READ_CLAIMS_ONLY = True
+        out["http GET /menus (solo claims)"] = await _http_series(client, "/menus", headers, args.requests)
+        security.AUTH_READ_CLAIMS_ONLY = False
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Coste de la autenticación por petición")
+    ap.add_argument("--repeat", type=int, default=30)
+    ap.add_argument("--number", type=int, default=200)
+    ap.add_argument("--requests", type=int, default=300)
+    args = ap.parse_args()
+
+    # db.py abre ./eatbalance.db: la BD queda en un directorio temporal
+    os.chdir(tempfile.mkdtemp(prefix="eatbalance-auth-bench-"))
+    import security
+    from db import create_db_and_tables, engine
+    from models import User
+    from sqlmodel import Session
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        user = User(email="bench@example.com", full_name="Bench", hashed_password="x")
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        token = security.create_user_token(user)
+
+    results = bench_micro(token, args)
+    results.update(asyncio.run(bench_http(token, args)))
+    for name, res in results.items():
+        print(f"  {name:40} mediana {res['median_ms']:8.4f} ms  p95 {res['p95_ms']:8.4f} ms")
+    print(f"\nauth_cache: {security.auth_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# benchmarks/db_load.py
+"""
+Prueba de carga de los routers de persistencia: sesiones síncronas (threadpool)
+frente a async (DB_ASYNC=1), con p50/p95/p99 a distintas concurrencias.
+
+Para cada modo arranca uvicorn en un subproceso (BD nueva en un directorio
+temporal, o la de DATABASE_URL si está definida), registra --users usuarios
+con unos cuantos menús y planes guardados y lanza --requests peticiones con
+la mezcla de la app: 70 % GET /menus, 20 % GET /nutrition/plans/latest y
+10 % POST /users/recent-searches.
+
+Uso (desde eatbalance-backend):
+    python benchmarks/db_load.py [--modes sync,async] [--concurrency 50,200,500] [--requests 3000]
+
+El cliente corre en la misma máquina que el servidor: compara los modos entre
+sí, no da el throughput absoluto.
+"""
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from suite import summarize  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+PLAN = {"sex": "mujer", "age": 30, "height_cm": 165, "weight_kg": 60, "activity_level": "moderado",
+        "goal": "mantenimiento"}
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    s = sorted(samples)
+    return round(s[min(len(s) - 1, int(q * len(s)))], 3)
+
+def start_server(mode: str, port: int, workdir: Path) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DB_ASYNC": "1" if mode == "async" else "0",
+        # el registro de usuarios no es lo que se mide
+        "BCRYPT_ROUNDS": "4",
+        "HASH_MAX_PER_IP": "0",
+        "PYTHONPATH": str(BACKEND_DIR),
+    }
+    # keep-alive largo: con la cola llena, una conexión puede pasar más de 5 s (el valor por defecto) sin usarse
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+           "--no-access-log", "--timeout-keep-alive", "120"]
+    # grupo de procesos propio: los pools (planes, bcrypt) heredan el socket y hay que cerrarlos también
+    return subprocess.Popen(cmd, cwd=workdir, env=env, start_new_session=True)
+
+async def wait_up(client: httpx.AsyncClient, timeout_s: float = 60) -> None:
+    t_end = time.monotonic() + timeout_s
+    while time.monotonic() < t_end:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("el servidor no arrancó")
+
+async def seed(client: httpx.AsyncClient, users: int, menus_per_user: int) -> List[Dict[str, str]]:
+    headers = []
+    run = time.time_ns()
+    for i in range(users):
+        email = f"load{run}_{i}@example.com"
+        r = await client.post("/auth/register", json={"email": email, "full_name": "Load", "password": "load-pass"})
+        r.raise_for_status()
+        r = await client.post("/auth/login", data={"username": email, "password": "load-pass"})
+        r.raise_for_status()
+        h = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        (await client.post("/nutrition/plan/generate", json=PLAN, headers=h)).raise_for_status()
+        for j in range(menus_per_user):
+            payload = {"json_payload": {"name": f"menú {j}", "meals": [{"food_id": "x", "g": 100}] * 5}}
+            (await client.post("/menus", json=payload, headers=h)).raise_for_status()
+        headers.append(h)
+    return headers
+
+async def load(client: httpx.AsyncClient, headers: List[Dict[str, str]], requests: int,
+               concurrency: int, seed_: int) -> Dict:
+    rnd = random.Random(seed_)
+    plan = [(rnd.random(), rnd.choice(headers)) for _ in range(requests)]
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(plan)
+
+    async def worker():
+        nonlocal errors
+        for x, h in counter:
+            t0 = time.perf_counter()
+            try:
+                if x < 0.7:
+                    r = await client.get("/menus", headers=h)
+                elif x < 0.9:
+                    r = await client.get("/nutrition/plans/latest", headers=h)
+                else:
+                    r = await client.post("/users/recent-searches", json={"term": "leche", "source": "local"},
+                                          headers=h)
+                ok = r.status_code < 400
+            except httpx.TransportError:
+                ok = False
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if not ok:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    wall = time.perf_counter() - t0
+    return {**summarize(latencies), "p99_ms": _percentile(latencies, 0.99),
+            "req_s": round(requests / wall, 2), "errors": errors}
+
+async def bench_mode(mode: str, port: int, args) -> Dict[int, Dict]:
+    workdir = Path(tempfile.mkdtemp(prefix=f"eatbalance-load-{mode}-"))
+    proc = start_server(mode, port, workdir)
+    limits = httpx.Limits(max_connections=max(args.concurrency_levels) + 10, max_keepalive_connections=None)
+    out = {}
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+            await wait_up(client)
+            headers = await seed(client, args.users, args.menus)
+            # calentamiento
+            await load(client, headers, min(200, args.requests), 10, args.seed)
+            for c in args.concurrency_levels:
+                out[c] = await load(client, headers, args.requests, c, args.seed + c)
+                r = out[c]
+                print(f"  {mode:5} c={c:<4} {r['req_s']:8.1f} req/s  p50 {r['median_ms']:8.1f} ms  "
+                      f"p95 {r['p95_ms']:8.1f} ms  p99 {r['p99_ms']:8.1f} ms  errores {r['errors']}", flush=True)
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=30)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Carga de los routers de persistencia: sync frente a async")
+    ap.add_argument("--modes", default="sync,async")
+    ap.add_argument("--concurrency", default="50,200,500")
+    ap.add_argument("--requests", type=int, default=3000)
+    ap.add_argument("--users", type=int, default=20)
+    ap.add_argument("--menus", type=int, default=20, help="menús guardados por usuario")
+    ap.add_argument("--port", type=int, default=8790)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    args.concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+
+    print(f"BD: {os.getenv('DATABASE_URL', 'SQLite temporal')}, cpus={os.cpu_count()}, {args.requests} peticiones")
+    # un puerto por modo: el servidor anterior puede tardar en soltar el suyo
+    results = {mode: asyncio.run(bench_mode(mode, args.port + i, args))
+               for i, mode in enumerate(args.modes.split(","))}
+    if {"sync", "async"} <= results.keys():
+        print("\np99 async / sync:")
+        for c in args.concurrency_levels:
+            print(f"  c={c:<4} {results['async'][c]['p99_ms'] / results['sync'][c]['p99_ms']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
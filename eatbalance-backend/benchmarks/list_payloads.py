@@ -0,0 +1,156 @@
+# benchmarks/list_payloads.py
+"""
+Tamaño y latencia de GET /menus para usuarios con miles de menús guardados:
+listado completo de antes (todas las filas con json_payload) frente a la
+paginación por cursor, la proyección resumida y la revalidación con ETag.
+
+Para cada tamaño (--menus 1000,5000) crea un usuario con ese número de menús
+(días de 4 comidas sacados de data/menus.json, ~1,5 KB cada uno) y mide por
+HTTP en proceso (httpx + ASGITransport):
+
+- antes: el GET /menus anterior, replicado en /_bench/menus-full
+- 1ª página resumida (por defecto) y con include_payload=true
+- 304: la misma página con If-None-Match
+- recorrer todas las páginas resumidas (limit=200)
+
+Uso (desde eatbalance-backend):  python benchmarks/list_payloads.py [--menus 1000,5000] [--requests 30]
+
+La BD se crea en un directorio temporal, no toca eatbalance.db.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from suite import summarize  # noqa: E402
+
+DATA_MENUS = Path(__file__).resolve().parents[1] / "data" / "menus.json"
+
+
+def make_payloads(n: int, seed: int = 0):
+    """Días de menú como los que guarda el front: 4 comidas con sus alimentos y macros."""
+    rnd = random.Random(seed)
+    templates = json.loads(DATA_MENUS.read_text(encoding="utf-8"))
+    by_type = {}
+    for m in templates:
+        by_type.setdefault(m["meal_type"], []).append(m)
+    out = []
+    for _ in range(n):
+        meals = []
+        for meal_type, options in by_type.items():
+            m = rnd.choice(options)
+            items = [{"food_id": it["food_id"], "g": round(it["base_g"] * rnd.uniform(0.8, 1.3)),
+                      "kcal": round(rnd.uniform(40, 400), 1), "protein_g": round(rnd.uniform(0, 30), 1),
+                      "carbs_g": round(rnd.uniform(0, 60), 1), "fat_g": round(rnd.uniform(0, 20), 1)}
+                     for it in m["items"]]
+            meals.append({"meal_type": meal_type, "menu_id": m["menu_id"], "menu_name": m["menu_name"],
+                          "items": items})
+        out.append({"meals": meals, "totals": {"kcal": round(rnd.uniform(1600, 2800)), "protein_g": 120,
+                                               "carbs_g": 230, "fat_g": 70}})
+    return out
+
+def seed_user(email: str, n: int):
+    import security
+    from db import engine
+    from models import Menu, User
+    from sqlmodel import Session
+
+    with Session(engine) as session:
+        user = User(email=email, full_name="Bench", hashed_password="x")
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        session.add_all(Menu(user_id=user.id, json_payload=p) for p in make_payloads(n, seed=n))
+        session.commit()
+        return {"Authorization": f"Bearer {security.create_user_token(user)}"}
+
+def add_legacy_route(app):
+    """GET /menus tal como era antes de la paginación: todas las filas, con json_payload."""
+    from fastapi import Depends
+    from sqlmodel import Session, select
+
+    from db import get_session
+    from models import Menu
+    from schemas import MenuOut
+    from security import AuthUser, get_current_user_read
+
+    @app.get("/_bench/menus-full", response_model=list[MenuOut])
+    def menus_full(session: Session = Depends(get_session), user: AuthUser = Depends(get_current_user_read)):
+        return session.exec(select(Menu).where(Menu.user_id == user.id).order_by(Menu.id.desc())).all()
+
+
+async def _series(client, url: str, headers, requests: int, params=None):
+    samples, size = [], 0
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        r = await client.get(url, headers=headers, params=params)
+        samples.append((time.perf_counter() - t0) * 1000)
+        if r.status_code not in (200, 304):
+            r.raise_for_status()
+        size = len(r.content)
+    return {**summarize(samples), "bytes": size}
+
+async def _walk(client, headers, limit: int):
+    t0 = time.perf_counter()
+    size, pages, cursor = 0, 0, None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        r = await client.get("/menus", headers=headers, params=params)
+        r.raise_for_status()
+        size += len(r.content)
+        pages += 1
+        cursor = r.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    return (time.perf_counter() - t0) * 1000, size, pages
+
+async def bench(headers, args):
+    import httpx
+    import main
+
+    out = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        out["antes: lista completa con payload"] = await _series(client, "/_bench/menus-full", headers, args.requests)
+        out["1ª página resumida"] = await _series(client, "/menus", headers, args.requests)
+        out["1ª página con payload"] = await _series(client, "/menus", headers, args.requests,
+                                                     params={"include_payload": "true"})
+        etag = (await client.get("/menus", headers=headers)).headers["etag"]
+        out["revalidación (304)"] = await _series(client, "/menus", {**headers, "If-None-Match": etag},
+                                                  args.requests)
+        walks = [await _walk(client, headers, 200) for _ in range(max(3, args.requests // 10))]
+        out[f"todas las páginas resumidas ({walks[0][2]} x 200)"] = {
+            **summarize([w[0] for w in walks]), "bytes": walks[0][1]}
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="GET /menus: lista completa frente a paginación, proyección y ETag")
+    ap.add_argument("--menus", default="1000,5000", help="menús guardados por usuario")
+    ap.add_argument("--requests", type=int, default=30)
+    args = ap.parse_args()
+
+    # db.py abre ./eatbalance.db: la BD queda en un directorio temporal
+    os.chdir(tempfile.mkdtemp(prefix="eatbalance-list-bench-"))
+    import main as app_main
+    from db import create_db_and_tables
+
+    create_db_and_tables()
+    add_legacy_route(app_main.app)
+    for n in [int(x) for x in args.menus.split(",")]:
+        headers = seed_user(f"bench{n}@example.com", n)
+        print(f"\nUsuario con {n} menús")
+        for name, res in asyncio.run(bench(headers, args)).items():
+            print(f"  {name:40} mediana {res['median_ms']:8.2f} ms  p95 {res['p95_ms']:8.2f} ms  "
+                  f"{res['bytes'] / 1024:9.1f} KB", flush=True)
+
+
+if __name__ == "__main__":
+    main()
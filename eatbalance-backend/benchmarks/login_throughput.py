@@ -0,0 +1,121 @@
+# benchmarks/login_throughput.py
+"""
+Throughput de /auth/login según el tamaño del pool de bcrypt (HASH_WORKERS),
+para dimensionarlo.
+
+Para cada número de procesos (--workers 0,1,2,4; 0 = threadpool) lanza
+--requests logins con --concurrency clientes y, a la vez, peticiones a GET /
+para ver cuánto se frena el resto de la API durante la ráfaga.
+
+Uso (desde eatbalance-backend):  python benchmarks/login_throughput.py [--workers 0,1,2,4] [--rounds 12]
+
+Los límites por IP/email se desactivan (todas las peticiones salen de la misma
+IP). La BD se crea en un directorio temporal, no toca eatbalance.db.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from suite import summarize  # noqa: E402
+
+
+async def _logins(client, emails, requests: int, concurrency: int):
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            t0 = time.perf_counter()
+            r = await client.post("/auth/login", data={"username": emails[i % len(emails)], "password": "bench-pass"})
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if r.status_code != 200:
+                errors += 1
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors
+
+async def _light(client, stop: asyncio.Event):
+    # petición ligera cada 20 ms mientras dura la ráfaga de logins
+    latencies = []
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await client.get("/")
+        latencies.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(0.02)
+    return latencies
+
+async def bench(workers: int, emails, args):
+    import httpx
+    import main
+    from services.password_hasher import password_hasher
+
+    password_hasher.shutdown()
+    password_hasher.workers = workers
+    password_hasher.start()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # calentamiento: arranque de los procesos
+        await _logins(client, emails, max(1, workers), max(1, workers))
+        stop = asyncio.Event()
+        light = asyncio.create_task(_light(client, stop))
+        t0 = time.perf_counter()
+        latencies, errors = await _logins(client, emails, args.requests, args.concurrency)
+        wall = time.perf_counter() - t0
+        stop.set()
+        light_latencies = await light
+    return {
+        **summarize(latencies),
+        "req_s": round(args.requests / wall, 2),
+        "errors": errors,
+        "light_median_ms": summarize(light_latencies)["median_ms"],
+        "light_p95_ms": summarize(light_latencies)["p95_ms"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Throughput de /auth/login según HASH_WORKERS")
+    ap.add_argument("--workers", default="0,1,2,4")
+    ap.add_argument("--requests", type=int, default=40)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--users", type=int, default=8)
+    ap.add_argument("--rounds", type=int, default=None, help="BCRYPT_ROUNDS (por defecto el de security.py)")
+    args = ap.parse_args()
+
+    if args.rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    # db.py abre ./eatbalance.db: la BD queda en un directorio temporal
+    os.chdir(tempfile.mkdtemp(prefix="eatbalance-login-bench-"))
+    import security
+    from db import create_db_and_tables, engine
+    from models import User
+    from services.password_hasher import password_hasher
+    from sqlmodel import Session
+
+    password_hasher.max_per_ip = password_hasher.max_per_email = 0
+    create_db_and_tables()
+    hashed = security.pwd_context.hash("bench-pass")
+    emails = [f"bench{i}@example.com" for i in range(args.users)]
+    with Session(engine) as session:
+        session.add_all(User(email=e, full_name="Bench", hashed_password=hashed) for e in emails)
+        session.commit()
+
+    print(f"bcrypt rounds={security.BCRYPT_ROUNDS}, cpus={os.cpu_count()}, "
+          f"{args.requests} logins, concurrencia {args.concurrency}")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        res = asyncio.run(bench(workers, emails, args))
+        label = f"{workers} procesos" if workers else "threadpool"
+        print(f"  {label:12} {res['req_s']:7.2f} login/s  mediana {res['median_ms']:8.1f} ms  "
+              f"p95 {res['p95_ms']:8.1f} ms  errores {res['errors']}  |  "
+              f"GET / mediana {res['light_median_ms']:.1f} ms  p95 {res['light_p95_ms']:.1f} ms", flush=True)
+    password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
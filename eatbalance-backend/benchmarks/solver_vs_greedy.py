@@ -0,0 +1,68 @@
+# benchmarks/solver_vs_greedy.py
+"""
+Compara el ajuste secuencial (greedy) con el optimizador de porciones (solver):
+error (_error_score) y latencia por menú, y error de la mejor opción por comida.
+
+Uso (desde eatbalance-backend):  python benchmarks/solver_vs_greedy.py --cases 200
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.catalog import get_catalog  # noqa: E402
+from services.menu_generator import DISTS, per_meal_targets, _error_score  # noqa: E402
+from services.scaling_engine import scale_compiled  # noqa: E402
+from services.portion_solver import solve_compiled  # noqa: E402
+
+
+def random_totals(rnd: random.Random) -> dict:
+    kcal = rnd.uniform(1500, 3500)
+    p_pct, f_pct = rnd.uniform(0.2, 0.35), rnd.uniform(0.2, 0.35)
+    P, F = kcal * p_pct / 4, kcal * f_pct / 9
+    C = (kcal - 4 * P - 9 * F) / 4
+    return {"kcal": kcal, "protein_g": P, "carb_g": C, "fat_g": F}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cases", type=int, default=100, help="Perfiles aleatorios de totales diarios")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    catalog = get_catalog()
+    table = catalog.food_table
+    rnd = random.Random(args.seed)
+    stats = {"greedy": {"score": [], "best": [], "t": []}, "solver": {"score": [], "best": [], "t": []}}
+    fns = {"greedy": scale_compiled, "solver": solve_compiled}
+
+    for _ in range(args.cases):
+        totals = random_totals(rnd)
+        scheme = rnd.choice(list(DISTS))
+        targets = per_meal_targets(totals["kcal"], totals["protein_g"], totals["carb_g"], totals["fat_g"], scheme)
+        for meal, target in targets.items():
+            batch = catalog.meal_batches.get(meal)
+            if batch is None or len(batch) == 0:
+                continue
+            for name, fn in fns.items():
+                scores = []
+                for cm in batch.menus:
+                    t0 = time.perf_counter()
+                    _, dbg = fn(cm, table, target)
+                    stats[name]["t"].append(time.perf_counter() - t0)
+                    scores.append(_error_score(dbg["errors"]))
+                stats[name]["score"].extend(scores)
+                stats[name]["best"].append(min(scores))
+
+    print(f"{'modo':8} {'err medio':>10} {'err mediana':>12} {'mejor/comida':>13} {'us/menú':>9}")
+    for name, s in stats.items():
+        print(f"{name:8} {statistics.mean(s['score']):10.2f} {statistics.median(s['score']):12.2f} "
+              f"{statistics.mean(s['best']):13.2f} {1e6 * statistics.mean(s['t']):9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+# benchmarks/suite.py
+"""
+Benchmarks reproducibles del motor de planes y de los endpoints más usados.
+
+- Micro: scale_menu_to_targets, generate_all_options (cada esquema de DISTS),
+  carga del catálogo (load_foods + Catalog.build) y la auditoría /plan/audit/foods.
+- HTTP en proceso (httpx + ASGITransport, sin red): /plan/generate_all,
+  /calcular-macros y /auth/login.
+- Cada benchmark se repite con el catálogo real multiplicado por las escalas
+  pedidas (--scales 1,10,100,1000): alimentos y menús replicados con
+  variaciones (--generator replicate) o generados con
+  services/synthetic_catalog.py (--generator synthetic), mismo formato que
+  data/foods.csv y data/menus.json.
+- Resultado en JSON (--out) y comparación con una línea base guardada
+  (--baseline): sale con código 1 si algún benchmark empeora más de --tolerance.
+
+Uso (desde eatbalance-backend):
+    python benchmarks/suite.py --scales 1,10,100 [--only plan,http] [--save-baseline benchmarks/results/baseline.json]
+    python benchmarks/suite.py --baseline benchmarks/results/baseline.json
+
+La BD de los benchmarks HTTP se crea en un directorio temporal, no toca eatbalance.db.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services import food_audit  # noqa: E402
+from services.catalog import FOODS_PATH, MENUS_PATH, Catalog, load_foods, load_menus  # noqa: E402
+from services.menu_generator import DISTS, generate_all_options, per_meal_targets, scale_menu_to_targets  # noqa: E402
+from services.synthetic_catalog import CatalogProfile, generate_catalog  # noqa: E402
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+MACROS = ("protein_g", "carb_g", "fat_g")
+
+
+# ====== catálogos sintéticos ======
+def scale_catalog(foods_df: pd.DataFrame, menus: list, factor: int, seed: int = 0):
+    """Catálogo `factor` veces mayor: cada alimento y menú se replica con macros y gramos algo distintos."""
+    if factor <= 1:
+        return foods_df.copy(), [dict(m) for m in menus]
+    rnd = np.random.default_rng(seed)
+    n = len(foods_df)
+    reps = []
+    for k in range(factor):
+        rep = foods_df.copy()
+        if k:
+            rep["food_id"] = rep["food_id"] + f"__{k}"
+            jitter = rnd.uniform(0.9, 1.1, size=(n, len(MACROS)))
+            for j, col in enumerate(MACROS):
+                rep[col] = np.round(pd.to_numeric(rep[col], errors="coerce").fillna(0) * jitter[:, j], 1)
+            # kcal coherente con los macros (con el mismo desvío que tenía el original)
+            orig = {c: pd.to_numeric(foods_df[c], errors="coerce").fillna(0) for c in ("kcal",) + MACROS}
+            base_kcal = 4 * (orig["protein_g"] + orig["carb_g"]) + 9 * orig["fat_g"]
+            ratio = np.where(base_kcal > 0, orig["kcal"] / base_kcal.where(base_kcal > 0, 1), 1.0)
+            rep["kcal"] = np.round((4 * (rep["protein_g"] + rep["carb_g"]) + 9 * rep["fat_g"]) * ratio)
+        reps.append(rep)
+    foods = pd.concat(reps, ignore_index=True)
+
+    out_menus = []
+    for k in range(factor):
+        for m in menus:
+            items = []
+            for it in m["items"]:
+                # cada menú replicado mezcla alimentos de réplicas distintas
+                r = int(rnd.integers(factor)) if k else 0
+                fid = it["food_id"] if r == 0 else f"{it['food_id']}__{r}"
+                base_g = it["base_g"] if k == 0 else max(5, int(round(it["base_g"] * rnd.uniform(0.8, 1.2) / 5) * 5))
+                items.append({**it, "food_id": fid, "base_g": base_g})
+            menu_id = m["menu_id"] if k == 0 else f"{m['menu_id']}__{k}"
+            out_menus.append({**m, "menu_id": menu_id, "items": items})
+    return foods, out_menus
+
+def write_catalog(foods_df: pd.DataFrame, menus: list, directory: Path):
+    directory.mkdir(parents=True, exist_ok=True)
+    foods_path, menus_path = directory / "foods.csv", directory / "menus.json"
+    foods_df.to_csv(foods_path, index=False)
+    menus_path.write_text(json.dumps(menus, ensure_ascii=False), encoding="utf-8")
+    return foods_path, menus_path
+
+
+# ====== medición ======
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1, number: int = 1) -> Dict[str, float]:
+    """Tiempo por llamada (ms): cada muestra es la media de `number` llamadas seguidas."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t0) * 1000 / number)
+    return summarize(samples)
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    s = sorted(samples_ms)
+    return {
+        "n": len(s),
+        "min_ms": round(s[0], 4),
+        "median_ms": round(statistics.median(s), 4),
+        "p95_ms": round(s[min(len(s) - 1, int(0.95 * len(s)))], 4),
+        "mean_ms": round(statistics.fmean(s), 4),
+        "ops_s": round(1000 / statistics.median(s), 2) if statistics.median(s) > 0 else None,
+    }
+
+def random_totals(rnd: random.Random) -> Dict[str, float]:
+    kcal = rnd.uniform(1500, 3500)
+    p_pct, f_pct = rnd.uniform(0.2, 0.35), rnd.uniform(0.2, 0.35)
+    P, F = kcal * p_pct / 4, kcal * f_pct / 9
+    return {"kcal": kcal, "protein_g": P, "carb_g": (kcal - 4 * P - 9 * F) / 4, "fat_g": F}
+
+
+# ====== benchmarks del motor ======
+def bench_plan(catalog: Catalog, foods_path: Path, menus_path: Path, args) -> Dict[str, Dict]:
+    out = {}
+    rnd = random.Random(args.seed)
+    totals = random_totals(rnd)
+
+    targets = per_meal_targets(totals["kcal"], totals["protein_g"], totals["carb_g"], totals["fat_g"], "5_plus_snack")
+    menus = [catalog.menus_by_meal[meal][0] for meal in targets if catalog.menus_by_meal.get(meal)]
+    for mode in ("greedy", "solver"):
+        out[f"scale_menu_to_targets[{mode}]"] = measure(
+            lambda: [scale_menu_to_targets(m, catalog.foods_df, targets[m["meal_type"]], catalog.food_table, mode)
+                     for m in menus],
+            args.repeat, number=args.number)
+
+    for scheme in DISTS:
+        out[f"generate_all_options[{scheme}]"] = measure(
+            lambda: generate_all_options(foods_df=catalog.foods_df, menus=catalog.menus, totals=totals, scheme=scheme,
+                                         top_n=5, table=catalog.food_table, batches=catalog.meal_batches),
+            args.repeat)
+
+    def load():
+        Catalog.build(load_foods(foods_path), load_menus(menus_path), "bench")
+    out["catalog_load"] = measure(load, max(3, args.repeat // 4), warmup=0)
+
+    # sin la caché por versión de /plan/audit/foods: se mide el cálculo completo
+    out["audit_foods"] = measure(lambda: list(food_audit.run_audit(catalog, 5.0).iter_issues()), args.repeat)
+    return out
+
+
+# ====== benchmarks HTTP en proceso ======
+async def _http_load(client, method: str, url: str, make_kwargs: Callable[[int], Dict],
+                     requests: int, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            t0 = time.perf_counter()
+            r = await client.request(method, url, **make_kwargs(i))
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if r.status_code >= 400:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    wall = time.perf_counter() - t0
+    return {**summarize(latencies), "req_s": round(requests / wall, 2), "errors": errors, "concurrency": concurrency}
+
+async def _bench_http(args) -> Dict[str, Dict]:
+    import httpx
+    import main
+    from services.password_hasher import password_hasher
+    from services.plan_executor import plan_executor
+
+    # el catálogo sintético solo existe en este proceso: se genera en el threadpool
+    plan_executor.workers = 0
+    # todos los logins salen de la misma IP y con el mismo email
+    password_hasher.max_per_ip = password_hasher.max_per_email = 0
+    main.on_startup()
+    out = {}
+    rnd = random.Random(args.seed)
+    totals = [random_totals(rnd) for _ in range(args.requests)]
+    schemes = list(DISTS)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        out["http /plan/generate_all"] = await _http_load(
+            client, "POST", "/plan/generate_all",
+            lambda i: {"json": {"totals": totals[i], "scheme": schemes[i % len(schemes)]}},
+            args.requests, args.concurrency)
+
+        out["http /calcular-macros"] = await _http_load(
+            client, "POST", "/calcular-macros",
+            lambda i: {"json": {"edad": 20 + i % 50, "peso": 50 + i % 60, "altura": 150 + i % 50,
+                                "sexo": ("hombre", "mujer")[i % 2], "actividad": "moderado",
+                                "objetivo": ("deficit", "mantenimiento", "superavit")[i % 3]}},
+            args.requests, args.concurrency)
+
+        email = f"bench{time.time_ns()}@example.com"
+        r = await client.post("/auth/register", json={"email": email, "full_name": "Bench", "password": "bench-pass"})
+        r.raise_for_status()
+        # bcrypt es lento a propósito: menos peticiones
+        n_login = max(args.concurrency, args.requests // 10)
+        out["http /auth/login"] = await _http_load(
+            client, "POST", "/auth/login",
+            lambda i: {"data": {"username": email, "password": "bench-pass"}},
+            n_login, args.concurrency)
+    return out
+
+def bench_http(args) -> Dict[str, Dict]:
+    return asyncio.run(_bench_http(args))
+
+
+# ====== línea base ======
+def compare(results: Dict, baseline: Dict, tolerance: float, metric: str = "median_ms") -> List[str]:
+    """Imprime la comparación y devuelve los benchmarks que empeoran más de `tolerance`."""
+    regressions = []
+    print(f"\n{'benchmark':60} {'base':>10} {'actual':>10} {'cambio':>8}")
+    for name, res in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None or not base.get(metric) or res.get(metric) is None:
+            print(f"{name:60} {'-':>10} {res.get(metric, '-'):>10}   (nuevo)")
+            continue
+        ratio = res[metric] / base[metric]
+        mark = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            mark = "  REGRESIÓN"
+        elif ratio < 1 - tolerance:
+            mark = "  mejora"
+        print(f"{name:60} {base[metric]:>10.3f} {res[metric]:>10.3f} {100 * (ratio - 1):>+7.1f}%{mark}")
+    return regressions
+
+def _meta(args) -> Dict:
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmarks del motor de planes y de la API")
+    ap.add_argument("--scales", default="1,10,100", help="Multiplicadores del catálogo, p.ej. 1,10,100,1000")
+    ap.add_argument("--generator", choices=["replicate", "synthetic"], default="replicate",
+                    help="replicate: copias del catálogo real; synthetic: services/synthetic_catalog.py")
+    ap.add_argument("--only", default="plan,http", help="Grupos a ejecutar: plan, http")
+    ap.add_argument("--repeat", type=int, default=20, help="Muestras por benchmark")
+    ap.add_argument("--number", type=int, default=10, help="Llamadas por muestra en los benchmarks muy rápidos")
+    ap.add_argument("--requests", type=int, default=200, help="Peticiones por endpoint en los benchmarks HTTP")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", type=Path, help="Fichero JSON de resultados (por defecto benchmarks/results/<fecha>.json)")
+    ap.add_argument("--baseline", type=Path, help="Resultados anteriores con los que comparar")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento admitido (0.2 = 20%%)")
+    ap.add_argument("--save-baseline", type=Path, help="Guarda además los resultados como línea base")
+    args = ap.parse_args()
+
+    groups = {g.strip() for g in args.only.split(",") if g.strip()}
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    base_foods, base_menus = load_foods(FOODS_PATH), load_menus(MENUS_PATH)
+
+    workdir = Path(tempfile.mkdtemp(prefix="eatbalance-bench-"))
+    out_path = (args.out or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json").resolve()
+    baseline_path = args.baseline.resolve() if args.baseline else None
+    save_path = args.save_baseline.resolve() if args.save_baseline else None
+    # db.py abre ./eatbalance.db: la BD de los benchmarks queda en el directorio temporal
+    os.chdir(workdir)
+
+    from services.catalog import store as catalog_store
+    results: Dict[str, Dict] = {}
+    for scale in scales:
+        if args.generator == "synthetic":
+            foods_df, menus = generate_catalog(len(base_foods) * scale, len(base_menus) * scale, args.seed,
+                                               CatalogProfile(base_foods, base_menus))
+        else:
+            foods_df, menus = scale_catalog(base_foods, base_menus, scale, args.seed)
+        foods_path, menus_path = write_catalog(foods_df, menus, workdir / f"x{scale}")
+        # el resto de la aplicación (routers, endpoints) usa este catálogo
+        catalog_store.foods_path, catalog_store.menus_path = foods_path, menus_path
+        catalog = catalog_store.reload()
+        print(f"== x{scale}: {len(foods_df)} alimentos, {len(menus)} menús", flush=True)
+
+        group_results: Dict[str, Dict] = {}
+        if "plan" in groups:
+            group_results.update(bench_plan(catalog, foods_path, menus_path, args))
+        if "http" in groups:
+            group_results.update(bench_http(args))
+        for name, res in group_results.items():
+            res.update(foods=len(foods_df), menus=len(menus))
+            # clave distinta por generador: no se comparan catálogos distintos con la misma línea base
+            suffix = "" if args.generator == "replicate" else f" [{args.generator}]"
+            results[f"{name} @x{scale}{suffix}"] = res
+            extra = f" | {res['req_s']} req/s" if "req_s" in res else ""
+            print(f"  {name:45} mediana {res['median_ms']:9.3f} ms  p95 {res['p95_ms']:9.3f} ms{extra}", flush=True)
+
+    report = {"meta": _meta(args), "results": results}
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nResultados: {out_path}")
+    if save_path:
+        save_path.parent.mkdir(parents=True, exist_ok=True)
+        save_path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Línea base guardada en {save_path}")
+
+    if baseline_path:
+        regressions = compare(results, json.loads(baseline_path.read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) más lentos que la línea base (>{args.tolerance:.0%}):")
+            for name in regressions:
+                print(f"  - {name}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
+# Harris-Benedict revisada: base + a*peso + b*altura - c*edad
+COEFICIENTES_BMR = {
+    "hombre": (88.362, 13.397, 4.799, 5.677),
+    "mujer": (447.593, 9.247, 3.098, 4.330),
+}
+
 def calcular_bmr(sexo: str, peso: float, altura: float, edad: int) -> float:
-    if sexo.lower() == "hombre":
-        return 88.362 + (13.397 * peso) + (4.799 * altura) - (5.677 * edad)
-    elif sexo.lower() == "mujer":
-        return 447.593 + (9.247 * peso) + (3.098 * altura) - (4.330 * edad)
-    else:
+    coef = COEFICIENTES_BMR.get(sexo.lower())
+    if coef is None:
         raise ValueError("Sexo no válido: usa 'hombre' o 'mujer'")
+    base, a, b, c = coef
+    return base + (a * peso) + (b * altura) - (c * edad)
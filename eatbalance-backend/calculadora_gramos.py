@@ -0,0 +1,120 @@
+import re
+import unicodedata
+from collections import Counter
+
+# Respuesta local para preguntas del tipo "¿cuánta proteína hay en 150 g?":
+# regla de tres sobre macros_por_100g sin pasar por el LLM.
+
+NUTRIENTES = {
+    "calorias": ("Calorías", "kcal"),
+    "proteinas": ("Proteínas", "g"),
+    "grasas": ("Grasas", "g"),
+    "carbohidratos": ("Carbohidratos", "g"),
+    "azucares": ("Azúcares", "g"),
+}
+
+# palabra clave (sin tildes) -> nutriente
+PALABRAS = {
+    "proteina": "proteinas",
+    "caloria": "calorias",
+    "kcal": "calorias",
+    "energia": "calorias",
+    "grasa": "grasas",
+    "lipido": "grasas",
+    "carbohidrato": "carbohidratos",
+    "hidrato": "carbohidratos",
+    "carbo": "carbohidratos",
+    "azucar": "azucares",
+}
+
+# si aparece algo de esto la pregunta es abierta y va al LLM
+ABIERTAS = (
+    "por que", "porque", "sano", "saludable", "recomiend", "mejor", "peor", "compar",
+    "receta", "dieta", "puedo", "deberia", "engorda", "adelgaz", "sustitu", "alternativa",
+    "cuando", "como lo", "como se", "opinion", "consejo", "bueno", "malo",
+)
+
+# pregunta inversa u objetivo ("¿cuánto pollo necesito para llegar a 30 g de proteína?"): al LLM
+INVERSAS = ("necesit", "para llegar", "llegar a", "alcanzar", "quiero", "objetivo")
+_CUANTO_PARA = re.compile(r"\bcuant[oa]s?\b.*\bpara\b")
+
+_UNIDADES = r"kg|kilos?|kilogramos?|g|gr|grs|gramos?"
+# una cantidad seguida de "de <nutriente>" es del nutriente ("30 g de proteína"), no la ración
+_CANTIDAD = re.compile(
+    r"(\d+(?:[.,]\d+)?)\s*(" + _UNIDADES + r")\b"
+    r"(?!\s+de\s+(?:(?:la|las|el|los)\s+)?(?:" + "|".join(PALABRAS) + r"))"
+)
+# "2 pechugas de 150 g": la ración va multiplicada; se deja al LLM
+_MULTIPLICADOR = re.compile(
+    r"\b(\d+(?:[.,]\d+)?|dos|tres|cuatro|cinco|seis|siete|ocho|nueve|diez|media)\s+"
+    r"(?!(?:" + _UNIDADES + r")\b)[a-z]+\s+de\s+\d"
+)
+
+stats: Counter = Counter()
+
+
+def _sin_tildes(texto):
+    s = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(ch for ch in s if not unicodedata.combining(ch))
+
+def extraer_gramos(pregunta):
+    """Gramos de la ración en la pregunta, o None si no hay exactamente una cantidad."""
+    cantidades = _CANTIDAD.findall(_sin_tildes(pregunta))
+    if len(cantidades) != 1:
+        return None
+    valor, unidad = cantidades[0]
+    gramos = float(valor.replace(",", "."))
+    if unidad.startswith("k"):
+        gramos *= 1000
+    return gramos if gramos > 0 else None
+
+def nutrientes_pedidos(pregunta):
+    texto = _sin_tildes(pregunta)
+    pedidos = []
+    for palabra, clave in PALABRAS.items():
+        if palabra in texto and clave not in pedidos:
+            pedidos.append(clave)
+    # "macros", "valores nutricionales"... o sin nutriente concreto: todos
+    return pedidos or list(NUTRIENTES)
+
+def _valor(macros_100g, clave):
+    try:
+        return float(macros_100g.get(clave))
+    except (TypeError, ValueError):
+        return None
+
+def _fmt(x):
+    return f"{round(x, 1):g}"
+
+def responder_pregunta_gramos(nombre, macros_100g, pregunta):
+    """Texto de respuesta calculado en local, o None si la pregunta debe ir al LLM."""
+    texto = _sin_tildes(pregunta)
+    if any(p in texto for p in ABIERTAS):
+        return None
+    if any(p in texto for p in INVERSAS) or _CUANTO_PARA.search(texto):
+        return None
+    m = _MULTIPLICADOR.search(texto)
+    if m and m.group(1) not in ("1", "1.0", "1,0"):
+        return None
+    gramos = extraer_gramos(pregunta)
+    if gramos is None:
+        return None
+    pedidos = nutrientes_pedidos(pregunta)
+    if all(_valor(macros_100g, k) is None for k in pedidos):
+        return None
+
+    factor = gramos / 100
+    lineas = [f"En {_fmt(gramos)} g de {nombre} hay:"]
+    for clave in pedidos:
+        etiqueta, unidad = NUTRIENTES[clave]
+        v = _valor(macros_100g, clave)
+        if v is None:
+            lineas.append(f"- {etiqueta}: desconocido")
+        else:
+            lineas.append(f"- {etiqueta}: {_fmt(v * factor)} {unidad} ({_fmt(v)} {unidad} × {_fmt(gramos)} / 100)")
+    lineas.append(f"Cálculo: valores por 100 g multiplicados por {_fmt(gramos)}/100 = {factor:g}.")
+    return "\n".join(lineas)
+
+def snapshot():
+    total = stats["local"] + stats["llm"]
+    return {**stats, "offload_ratio": round(stats["local"] / total, 4) if total else 0.0}
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import os
+from collections import Counter
+
+import httpx
+
+from metrics import InstrumentedTransport
+
+# Pasarela asíncrona hacia los LLM (Ollama nativo y API tipo OpenAI/OpenRouter)
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "http://localhost:11434/v1/chat/completions")
+OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "llama3")
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+# peticiones simultáneas por backend, cuántas pueden esperar turno y cuánto
+LLM_CONCURRENCY = {
+    "ollama": int(os.getenv("LLM_OLLAMA_CONCURRENCY", "2")),
+    "openrouter": int(os.getenv("LLM_OPENROUTER_CONCURRENCY", "4")),
+}
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "8"))
+LLM_QUEUE_TIMEOUT_S = float(os.getenv("LLM_QUEUE_TIMEOUT_S", "10"))
+
+stats: dict = {name: Counter() for name in LLM_CONCURRENCY}
+
+
+class LLMSaturated(Exception):
+    """El backend tiene todas sus plazas ocupadas y la cola llena (o se agotó la espera)."""
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.backend = backend
+        self.retry_after = max(1, int(LLM_QUEUE_TIMEOUT_S))
+
+
+class _Limiter:
+    def __init__(self, name, concurrency):
+        self.name = name
+        self.concurrency = concurrency
+        self.sem = asyncio.Semaphore(concurrency)
+        self.waiting = 0
+        self.active = 0
+
+    async def acquire(self):
+        c = stats[self.name]
+        # backpressure: con la cola llena se rechaza al momento en vez de acumular
+        if self.sem.locked() and self.waiting >= LLM_MAX_QUEUE:
+            c["rejected"] += 1
+            raise LLMSaturated(self.name)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.sem.acquire(), LLM_QUEUE_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            c["rejected"] += 1
+            raise LLMSaturated(self.name)
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return _Slot(self)
+
+    def _release(self):
+        self.active -= 1
+        self.sem.release()
+
+
+class _Slot:
+    def __init__(self, limiter):
+        self._limiter = limiter
+        self._held = True
+
+    def release(self):
+        if self._held:
+            self._held = False
+            self._limiter._release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class TokenStream:
+    """Tokens de una respuesta en streaming que tiene reservada una plaza.
+
+    aclose() libera la plaza siempre, también si nunca se empezó a iterar (el
+    cliente se fue antes de que empezase la respuesta): el finally de un
+    generador que no ha arrancado no llega a ejecutarse.
+    """
+
+    def __init__(self, gen, slot):
+        self._gen = gen
+        self._slot = slot
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._gen.__anext__()
+
+    async def aclose(self):
+        try:
+            await self._gen.aclose()
+        finally:
+            self._slot.release()
+
+
+_client: httpx.AsyncClient | None = None
+_limiters: dict = {}
+_loop = None
+
+
+async def _close_quietly(client: httpx.AsyncClient) -> None:
+    try:
+        await client.aclose()
+    except RuntimeError:
+        # su loop ya está cerrado: los sockets se cierran igual, solo falla avisar al loop
+        pass
+
+async def _state():
+    global _client, _limiters, _loop
+    loop = asyncio.get_running_loop()
+    # cliente y semáforos pertenecen a un event loop concreto
+    if _client is None or _client.is_closed or _loop is not loop:
+        old, old_loop = _client, _loop
+        _loop = loop
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT_S, connect=5.0),
+            transport=InstrumentedTransport(limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                                                max_keepalive_connections=LLM_MAX_CONNECTIONS)),
+        )
+        _limiters = {name: _Limiter(name, n) for name, n in LLM_CONCURRENCY.items()}
+        if old is not None and not old.is_closed:
+            # el cliente anterior se cierra en su loop si sigue vivo; si no, desde este
+            if old_loop is not None and old_loop.is_running() and not old_loop.is_closed():
+                asyncio.run_coroutine_threadsafe(_close_quietly(old), old_loop)
+            else:
+                await _close_quietly(old)
+    return _client, _limiters
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _close_quietly(_client)
+        _client = None
+
+async def acquire(backend):
+    _, limiters = await _state()
+    return await limiters[backend].acquire()
+
+def snapshot():
+    out = {}
+    for name, c in stats.items():
+        lim = _limiters.get(name)
+        out[name] = {
+            "concurrency": LLM_CONCURRENCY[name],
+            "active": lim.active if lim else 0,
+            "waiting": lim.waiting if lim else 0,
+            **c,
+        }
+    return out
+
+
+# ====== Ollama (/api/generate) ======
+async def ollama_generate(prompt, model=None):
+    client, _ = await _state()
+    async with await acquire("ollama"):
+        stats["ollama"]["requests"] += 1
+        try:
+            resp = await client.post(f"{OLLAMA_URL}/api/generate",
+                                     json={"model": model or OLLAMA_MODEL, "prompt": prompt, "stream": False})
+            resp.raise_for_status()
+        except httpx.HTTPError:
+            stats["ollama"]["errors"] += 1
+            raise
+        return resp.json()["response"]
+
+async def ollama_stream(prompt, model=None):
+    """Reserva plaza (o lanza LLMSaturated) y devuelve un TokenStream.
+
+    La plaza se libera al terminar de iterar o al llamar a aclose(), que hay que
+    llamar siempre; al salir de client.stream se corta la conexión con Ollama y
+    deja de generar. Una línea que no es JSON corta el stream con
+    httpx.DecodingError (un httpx.HTTPError más para quien lo consume).
+    """
+    client, _ = await _state()
+    slot = await acquire("ollama")
+
+    async def tokens():
+        stats["ollama"]["requests"] += 1
+        stats["ollama"]["streams"] += 1
+        try:
+            body = {"model": model or OLLAMA_MODEL, "prompt": prompt, "stream": True}
+            async with client.stream("POST", f"{OLLAMA_URL}/api/generate", json=body) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise httpx.DecodingError(f"Respuesta de Ollama no válida: {line[:80]!r}",
+                                                  request=resp.request) from e
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
+        except (asyncio.CancelledError, GeneratorExit):
+            stats["ollama"]["cancelled"] += 1
+            raise
+        except httpx.HTTPError:
+            stats["ollama"]["errors"] += 1
+            raise
+        finally:
+            slot.release()
+
+    return TokenStream(tokens(), slot)
+
+
+# ====== API tipo OpenAI (/v1/chat/completions) ======
+async def chat_completion(messages, model=None):
+    client, _ = await _state()
+    headers = {"Content-Type": "application/json"}
+    if OPENROUTER_API_KEY:
+        headers["Authorization"] = f"Bearer {OPENROUTER_API_KEY}"
+    async with await acquire("openrouter"):
+        stats["openrouter"]["requests"] += 1
+        try:
+            resp = await client.post(OPENROUTER_URL, headers=headers,
+                                     json={"model": model or OPENROUTER_MODEL, "messages": messages, "stream": False})
+            resp.raise_for_status()
+        except httpx.HTTPError:
+            stats["openrouter"]["errors"] += 1
+            raise
+        return resp.json()["choices"][0]["message"]["content"]
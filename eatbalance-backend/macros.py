@@ -1,24 +1,25 @@
+# Ajuste calórico por objetivo
+AJUSTES_OBJETIVO = {
+    "deficit": 0.85,        # -15%
+    "mantenimiento": 1.0,   # igual
+    "superavit": 1.1        # +10%
+}
+
+# Repartos por objetivo (C, P, G)
+REPARTOS_OBJETIVO = {
+    "deficit": (0.40, 0.30, 0.30),
+    "mantenimiento": (0.50, 0.25, 0.25),
+    "superavit": (0.50, 0.25, 0.25),
+}
+
 def calcular_macros(tdee: float, objetivo: str):
     objetivo = objetivo.lower().strip()
 
-    # Ajuste calórico por objetivo
-    ajustes = {
-        "deficit": 0.85,        # -15%
-        "mantenimiento": 1.0,   # igual
-        "superavit": 1.1        # +10%
-    }
-    if objetivo not in ajustes:
+    if objetivo not in AJUSTES_OBJETIVO:
         raise ValueError("Objetivo no válido. Usa: deficit, mantenimiento o superavit")
 
-    kcal_obj = tdee * ajustes[objetivo]
-
-    # Repartos por objetivo (C, P, G)
-    splits = {
-        "deficit": (0.40, 0.30, 0.30),
-        "mantenimiento": (0.50, 0.25, 0.25),
-        "superavit": (0.50, 0.25, 0.25),
-    }
-    c, p, f = splits[objetivo]
+    kcal_obj = tdee * AJUSTES_OBJETIVO[objetivo]
+    c, p, f = REPARTOS_OBJETIVO[objetivo]
 
     return {
         "calorias_objetivo": round(kcal_obj, 2),
@@ -1,11 +1,17 @@
 # main.py
-from fastapi import FastAPI
+from fastapi import Body, FastAPI, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import json
 import re
 
 # Tu router existente de menús CSV/JSON
 from routers.plan import router as plan_router
+from services.catalog import CatalogError, store as catalog_store
+from services.plan_cache import plan_cache
+from services.plan_executor import plan_executor
+from services.password_hasher import password_hasher
 
 # Cálculos que ya tenías
 from bmr import calcular_bmr
@@ -14,13 +20,21 @@ from macros import calcular_macros
 from menu import generar_menu
 
 # OpenFoodFacts / LLM
-from openfoodfacts import buscar_productos, obtener_producto_por_id
-from openrouter_client import get_macros_from_openrouter
-from ollama_client import consultar_chat_ollama
+import httpx
+from openfoodfacts import close_client as close_off_client
+from services import product_store, macros_cache, bulk_macros
+from ollama_client import consultar_chat_ollama, consultar_chat_ollama_stream
+import llm_gateway
+import calculadora_gramos
+import metrics
 
 # NUEVO: BD y routers con seguridad / persistencia
-from db import create_db_and_tables
-from routers import auth, users, nutrition, menus
+from db import DB_ASYNC, close_async_engine, start_db
+if DB_ASYNC:
+    from routers import auth_async as auth, users_async as users, nutrition_async as nutrition, menus_async as menus
+else:
+    from routers import auth, users, nutrition, menus
+from security import auth_cache
 
 app = FastAPI(title="EatBalance API")
 
@@ -31,12 +45,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "X-Next-Cursor", "Link"],
 )
+# latencias, consultas a la BD y llamadas salientes por petición (/metrics y Server-Timing)
+app.add_middleware(metrics.MetricsMiddleware)
 
-# Crear tablas al arrancar
+# Migraciones de la BD (según DB_MIGRATE, sin bloquear el arranque) y catálogo de alimentos/menús
 @app.on_event("startup")
 def on_startup():
-    create_db_and_tables()
+    start_db(on_ready=[product_store.ensure_search_index])
+    try:
+        catalog_store.reload()
+    except CatalogError as e:
+        # no impedimos arrancar: /plan/* devolverá el error hasta que se corrija
+        print("Catálogo no cargado:", e)
+    plan_executor.start()
+    password_hasher.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await close_off_client()
+    await llm_gateway.close_client()
+    await close_async_engine()
+    macros_cache.flush_hits()
+    plan_executor.shutdown()
+    password_hasher.shutdown()
 
 # Routers con autenticación/persistencia
 app.include_router(auth.router)        # /auth/register, /auth/login
@@ -85,6 +118,7 @@ class PreguntaOllama(BaseModel):
     nombre: str
     macros_por_100g: dict
     pregunta: str
+    stream: bool = False  # True: respuesta en Server-Sent Events token a token
 
 # ---- Endpoints utilitarios que ya tenías
 @app.post("/bmr")
@@ -110,29 +144,162 @@ def obtener_menu(datos: DatosMenu):
     )
 
 # --- Búsqueda OFF (dos rutas equivalentes, usa la que quieras en el frontend)
+async def _consultar_off(coro):
+    try:
+        return await coro
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Error consultando OpenFoodFacts: {e}")
+    except product_store.ProductNotFound as e:
+        raise HTTPException(status_code=404, detail=f"Producto {e} no está en la caché local (modo sin conexión)")
+
 @app.post("/buscar-alimento")
-def buscar_alimento_api(data: AlimentoInput):
-    return buscar_productos(data.nombre)
+async def buscar_alimento_api(data: AlimentoInput):
+    return await _consultar_off(product_store.buscar_productos(data.nombre))
 
 class BusquedaInput(BaseModel):
     nombre: str
 
 @app.post("/buscar-productos")
-def buscar_varios(producto: BusquedaInput):
-    return buscar_productos(producto.nombre)
+async def buscar_varios(producto: BusquedaInput):
+    return await _consultar_off(product_store.buscar_productos(producto.nombre))
 
+# --- LLM: 429 si el backend está saturado, 502 si falla
+async def _consultar_llm(coro):
+    try:
+        return await coro
+    except llm_gateway.LLMSaturated as e:
+        raise HTTPException(status_code=429, detail=f"LLM ({e.backend}) saturado, inténtalo más tarde",
+                            headers={"Retry-After": str(e.retry_after)})
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Error consultando el LLM: {e}")
+
+# Catálogo -> caché persistente -> LLM (la respuesta indica el origen en "source")
 @app.get("/macros-alimento")
-def obtener_macros_alimento(alimento: str):
-    return {"macros": get_macros_from_openrouter(alimento)}
+async def obtener_macros_alimento(alimento: str):
+    return await _consultar_llm(macros_cache.macros_alimento(alimento))
+
+@app.get("/macros-alimento/stats")
+def macros_alimento_stats():
+    return macros_cache.cache_stats()
 
 @app.post("/producto-id")
-def obtener_producto_id(data: ProductoID):
-    return obtener_producto_por_id(data.code)
+async def obtener_producto_id(data: ProductoID):
+    return await _consultar_off(product_store.obtener_producto_por_id(data.code))
+
+@app.get("/off/cache/stats")
+def off_cache_stats():
+    return product_store.cache_stats()
+
+def _sse(data, event=None):
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class _LLMStreamingResponse(StreamingResponse):
+    """Cierra el stream del LLM (y libera su plaza) al acabar la respuesta, pase lo que pase:
+    si el cliente se desconecta antes de que se empiece a iterar el cuerpo, el finally de
+    eventos() no llega a ejecutarse."""
+
+    def __init__(self, content, tokens, **kwargs):
+        super().__init__(content, **kwargs)
+        self._tokens = tokens
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._tokens.aclose()
 
 @app.post("/ollama-chat")
-def usar_ollama_como_chat(data: PreguntaOllama):
-    respuesta = consultar_chat_ollama(data.nombre, data.macros_por_100g, data.pregunta)
-    return {"respuesta": respuesta}
+async def usar_ollama_como_chat(data: PreguntaOllama, request: Request):
+    quiere_stream = data.stream or "text/event-stream" in request.headers.get("accept", "")
+
+    # preguntas de "¿cuánto X en N g?": regla de tres en local, sin LLM
+    local = calculadora_gramos.responder_pregunta_gramos(data.nombre, data.macros_por_100g, data.pregunta)
+    if local is not None:
+        calculadora_gramos.stats["local"] += 1
+        if quiere_stream:
+            return StreamingResponse(iter([_sse({"token": local}), _sse({"source": "local"}, event="done")]),
+                                     media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+        return {"respuesta": local, "source": "local"}
+    calculadora_gramos.stats["llm"] += 1
+
+    if not quiere_stream:
+        respuesta = await _consultar_llm(consultar_chat_ollama(data.nombre, data.macros_por_100g, data.pregunta))
+        return {"respuesta": respuesta, "source": "llm"}
+
+    # la plaza se reserva antes de empezar a responder para poder devolver 429
+    tokens = await _consultar_llm(consultar_chat_ollama_stream(data.nombre, data.macros_por_100g, data.pregunta))
+
+    async def eventos():
+        try:
+            async for token in tokens:
+                if await request.is_disconnected():
+                    break
+                yield _sse({"token": token})
+            yield _sse({"source": "llm"}, event="done")
+        except httpx.HTTPError as e:
+            yield _sse({"detail": f"Error consultando el LLM: {e}"}, event="error")
+        finally:
+            # cierra la conexión con Ollama (deja de generar) y libera la plaza
+            await tokens.aclose()
+
+    return _LLMStreamingResponse(eventos(), tokens, media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/llm/stats")
+def llm_stats():
+    return {**llm_gateway.snapshot(), "ollama_chat": calculadora_gramos.snapshot()}
+
+# ---- Métricas Prometheus
+def _ratio(hits, total):
+    return hits / total if total else 0.0
+
+def _stats_metrics():
+    # solo contadores en memoria: /metrics no consulta la BD
+    off, mac, gramos = product_store.stats, macros_cache.stats, calculadora_gramos.stats
+    off_hits = sum(off[k] for k in ("search_hit", "search_stale", "search_local", "product_hit", "product_stale"))
+    off_total = off_hits + off["search_miss"] + off["product_miss"]
+    plan = plan_cache.stats()
+    executor = plan_executor.stats()
+    llm = llm_gateway.snapshot()
+    auth_stats = auth_cache.stats()
+    hasher = password_hasher.stats()
+
+    events = [({"subsystem": name, "event": k}, v)
+              for name, c in (("off", off), ("macros", mac), ("ollama_chat", gramos)) for k, v in sorted(c.items())]
+    events += [({"subsystem": "plan_cache", "event": k}, plan[k]) for k in ("hits", "misses", "evictions", "expirations")]
+    events += [({"subsystem": "plan_executor", "event": k}, executor.get(k, 0))
+               for k in ("completed", "rejected", "timeouts", "broken_pool")]
+    events += [({"subsystem": "auth_cache", "event": k}, auth_stats[k]) for k in ("hits", "misses")]
+    events += [({"subsystem": "password_hasher", "event": k}, hasher.get(k, 0))
+               for k in ("completed", "rejected", "rate_limited", "rehashed", "broken_pool")]
+    events += [({"subsystem": f"llm_{name}", "event": k}, v)
+               for name, b in llm.items() for k, v in b.items() if k not in ("concurrency", "active", "waiting")]
+    lines = metrics.family("eatbalance_events_total", "counter", "Contadores internos por subsistema", events)
+    lines += metrics.family("eatbalance_cache_hit_ratio", "gauge", "Proporción de aciertos de cada caché", [
+        ({"cache": "off"}, _ratio(off_hits, off_total)),
+        ({"cache": "macros"}, _ratio(mac["catalog"] + mac["cache"], mac["requests"])),
+        ({"cache": "plan"}, plan["hit_ratio"]),
+        ({"cache": "auth"}, auth_stats["hit_ratio"]),
+        ({"cache": "ollama_chat_local"}, _ratio(gramos["local"], gramos["local"] + gramos["llm"])),
+    ])
+    lines += metrics.family("eatbalance_plan_executor_tasks", "gauge", "Tareas del pool de planes", [
+        ({"state": "inflight"}, executor["inflight"]),
+        ({"state": "queued"}, executor["queue_depth"]),
+        ({"state": "waiting_admission"}, executor["waiting_admission"]),
+    ])
+    lines += metrics.family("eatbalance_password_hasher_tasks", "gauge", "Operaciones de bcrypt en curso", [
+        ({"state": "inflight"}, hasher["inflight"]),
+        ({"state": "waiting_admission"}, hasher["waiting_admission"]),
+    ])
+    lines += metrics.family("eatbalance_llm_slots", "gauge", "Peticiones al LLM activas y en espera", [
+        ({"backend": name, "state": state}, b[state]) for name, b in llm.items() for state in ("active", "waiting")
+    ])
+    return lines
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(_stats_metrics()), media_type="text/plain; version=0.0.4")
 
 # ---- Cálculo completo vía JSON
 class DatosCompleto(BaseModel):
@@ -146,7 +313,7 @@ class DatosCompleto(BaseModel):
 @app.post("/calcular-macros")
 def calcular_plan(datos: DatosCompleto):
     bmr = calcular_bmr(datos.sexo, datos.peso, datos.altura, datos.edad)
-    tdee = calcular_tdee(datos.sexo, datos.peso, datos.altura, datos.edad, datos.actividad)
+    tdee = calcular_tdee(datos.sexo, datos.peso, datos.altura, datos.edad, datos.actividad, bmr=bmr)
     macros = calcular_macros(tdee, datos.objetivo)
     return {
         "bmr": round(bmr, 2),
@@ -158,6 +325,41 @@ def calcular_plan(datos: DatosCompleto):
         "porcentajes": macros.get("porcentajes"),
     }
 
+# ---- Cálculo masivo (recalcular muchos perfiles de golpe)
+def _respuesta_lote(df, formato):
+    try:
+        result = bulk_macros.compute_bulk(df)
+    except bulk_macros.BulkInputError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if formato == "csv":
+        return PlainTextResponse(bulk_macros.to_csv(result), media_type="text/csv")
+    return bulk_macros.to_jsonable(result)
+
+# Lista de perfiles [{edad, peso, altura, sexo, actividad, objetivo}, ...] o columnas {"edad": [...], ...}
+@app.post("/calcular-macros/lote")
+def calcular_plan_lote(
+    perfiles: list[dict] | dict[str, list] = Body(...),
+    formato: str = Query("json", pattern="^(json|csv)$"),
+):
+    try:
+        df = bulk_macros.frame_from_json(perfiles)
+    except bulk_macros.BulkInputError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return _respuesta_lote(df, formato)
+
+# Mismo cálculo a partir de un CSV (o Parquet si está instalado pyarrow)
+@app.post("/calcular-macros/lote/archivo")
+async def calcular_plan_lote_archivo(
+    archivo: UploadFile = File(...),
+    formato: str = Query("json", pattern="^(json|csv)$"),
+):
+    raw = await archivo.read()
+    try:
+        df = bulk_macros.frame_from_file(raw, archivo.filename)
+    except bulk_macros.BulkInputError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return _respuesta_lote(df, formato)
+
 # ---- /plan desde texto libre (tu endpoint antiguo)
 class PromptRequest(BaseModel):
     prompt: str
@@ -208,7 +410,7 @@ def generar_plan(request: PromptRequest):
                 break
 
         bmr = calcular_bmr(sexo, peso, altura, edad)
-        tdee = calcular_tdee(sexo, peso, altura, edad, actividad_nivel)
+        tdee = calcular_tdee(sexo, peso, altura, edad, actividad_nivel, bmr=bmr)
         macros = calcular_macros(tdee, objetivo)
 
         return {
@@ -0,0 +1,281 @@
+# metrics.py
+"""
+Métricas de rendimiento en formato Prometheus (/metrics) y cabecera Server-Timing.
+
+- MetricsMiddleware mide cada petición (latencia por ruta, consultas a la BD,
+  llamadas salientes y etapas) y añade Server-Timing a la respuesta.
+- stage("nombre") mide una etapa dentro de la petición en curso (contextvar);
+  fuera de una petición no hace nada.
+- instrument_engine(engine) cuenta las consultas de SQLAlchemy e
+  InstrumentedTransport mide las llamadas de los clientes httpx
+  (OpenFoodFacts, Ollama, OpenRouter).
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+from sqlalchemy import event
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "1") != "0"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+# ====== tipos de métrica ======
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List] = {}   # labels -> [cuentas por bucket..., suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for labels, s in sorted(series.items()):
+            acc = 0
+            for le, n in zip(self.buckets + (float("inf"),), s):
+                acc += n
+                le_label = 'le="' + _num(le) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le_label)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(s[-2])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {s[-1]}")
+        return out
+
+
+class CounterMetric:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return family(self.name, "counter", self.help,
+                      [(dict(zip(self.labelnames, k)), v) for k, v in sorted(values.items())])
+
+
+def family(name: str, kind: str, help: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """Líneas de una métrica (counter/gauge) a partir de pares (etiquetas, valor)."""
+    out = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        out.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_num(value)}")
+    return out
+
+
+REQUEST_SECONDS = Histogram("eatbalance_http_request_duration_seconds",
+                            "Latencia de las peticiones por ruta", ("method", "route", "status"))
+REQUEST_DB_QUERIES = Histogram("eatbalance_http_request_db_queries",
+                               "Consultas a la BD por petición", ("route",), COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("eatbalance_http_request_db_seconds",
+                               "Tiempo en la BD por petición", ("route",))
+DB_QUERY_SECONDS = Histogram("eatbalance_db_query_duration_seconds",
+                             "Duración de cada consulta SQL", ("operation",))
+OUTBOUND_SECONDS = Histogram("eatbalance_outbound_request_duration_seconds",
+                             "Latencia de las llamadas HTTP salientes (hasta las cabeceras)", ("host", "status"))
+OUTBOUND_ERRORS = CounterMetric("eatbalance_outbound_request_errors_total",
+                                "Llamadas salientes sin respuesta (timeout, conexión...)", ("host",))
+STAGE_SECONDS = Histogram("eatbalance_stage_duration_seconds",
+                          "Duración de las etapas por ruta (load, validate, scale, rank...)", ("route", "stage"))
+
+_HISTOGRAMS = (REQUEST_SECONDS, REQUEST_DB_QUERIES, REQUEST_DB_SECONDS, DB_QUERY_SECONDS,
+               OUTBOUND_SECONDS, STAGE_SECONDS)
+
+
+# ====== tiempos de la petición en curso ======
+class RequestTimings:
+    __slots__ = ("stages", "db_count", "db_s", "out_count", "out_s")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.db_count = 0
+        self.db_s = 0.0
+        self.out_count = 0
+        self.out_s = 0.0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self, total_s: float) -> str:
+        parts = [f"app;dur={total_s * 1000:.1f}"]
+        if self.db_count:
+            parts.append(f'db;dur={self.db_s * 1000:.1f};desc="{self.db_count} queries"')
+        if self.out_count:
+            parts.append(f'out;dur={self.out_s * 1000:.1f};desc="{self.out_count} calls"')
+        parts += [f"{name};dur={s * 1000:.1f}" for name, s in self.stages.items()]
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("eatbalance_timings", default=None)
+
+@contextmanager
+def stage(name: str):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - t0)
+
+@contextmanager
+def collect():
+    """Recoge las etapas en un RequestTimings nuevo (p.ej. en un proceso del pool)."""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+def merge(stages: Dict[str, float]) -> None:
+    """Suma a la petición en curso las etapas medidas en otro proceso/hilo."""
+    timings = _current.get()
+    if timings is not None:
+        for name, s in stages.items():
+            timings.add(name, s)
+
+
+# ====== BD ======
+def instrument_engine(engine) -> None:
+    if not METRICS_ENABLED:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("eatbalance_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("eatbalance_t0")
+        if not starts:
+            return
+        dt = time.perf_counter() - starts.pop()
+        DB_QUERY_SECONDS.observe(dt, statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?")
+        timings = _current.get()
+        if timings is not None:
+            timings.db_count += 1
+            timings.db_s += dt
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("eatbalance_t0") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+# ====== HTTP saliente ======
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """Transporte de httpx que mide cada llamada (hasta las cabeceras) y cuenta los fallos de red."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not METRICS_ENABLED:
+            return await super().handle_async_request(request)
+        t0 = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except httpx.TransportError:
+            OUTBOUND_ERRORS.inc(request.url.host)
+            raise
+        dt = time.perf_counter() - t0
+        OUTBOUND_SECONDS.observe(dt, request.url.host, str(response.status_code))
+        timings = _current.get()
+        if timings is not None:
+            timings.out_count += 1
+            timings.out_s += dt
+        return response
+
+
+# ====== middleware ======
+def _route(scope) -> str:
+    # plantilla de la ruta (/users/{user_id}), no la URL: cardinalidad acotada
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+        t0 = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    # en respuestas en streaming solo incluye lo ocurrido hasta las cabeceras
+                    header = timings.server_timing(time.perf_counter() - t0).encode("latin-1")
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = _route(scope)
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, scope["method"], route, str(status))
+            REQUEST_DB_QUERIES.observe(timings.db_count, route)
+            REQUEST_DB_SECONDS.observe(timings.db_s, route)
+            for name, s in timings.stages.items():
+                STAGE_SECONDS.observe(s, route, name)
+
+
+def render(extra: Iterable[str] = ()) -> str:
+    lines: List[str] = []
+    for h in _HISTOGRAMS:
+        lines += h.render()
+    lines += OUTBOUND_ERRORS.render()
+    lines += list(extra)
+    return "\n".join(lines) + "\n"
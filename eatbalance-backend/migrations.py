@@ -0,0 +1,237 @@
+# migrations.py
+"""
+Migraciones versionadas del esquema (sustituyen a create_all al arrancar).
+
+- La tabla schema_migrations guarda las versiones aplicadas; upgrade() aplica
+  en orden las que falten, cada una en su transacción.
+- 0001 crea el esquema base, congelado aquí (no sale de models.py): una BD
+  nueva y una migrada pasan por los mismos pasos y acaban igual. Las BDs
+  creadas antes de las migraciones (con create_all) ya tienen parte del
+  esquema, así que las migraciones comprueban lo que existe antes de cambiarlo.
+- Para un cambio nuevo: cambiar models.py y añadir una función al final de
+  MIGRATIONS con el siguiente número que lo aplique con DDL explícito; nunca
+  cambiar una que ya esté aplicada.
+- En PostgreSQL, un advisory lock evita que dos procesos migren a la vez.
+
+Uso (desde eatbalance-backend):
+    python -m migrations            # aplica las pendientes
+    python -m migrations --status   # versión actual y pendientes
+"""
+import argparse
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import (JSON, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String,
+                        Table, inspect, text)
+from sqlalchemy.engine import Connection, Engine
+
+VERSION_TABLE = "schema_migrations"
+# clave del pg_advisory_lock de las migraciones
+PG_LOCK_KEY = 4_151_001
+
+
+# ====== helpers ======
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    insp = inspect(conn)
+    return insp.has_table(table) and column in {c["name"] for c in insp.get_columns(table)}
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str) -> None:
+    if not _has_column(conn, table, column):
+        conn.exec_driver_sql(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}')
+
+def _create_index(conn: Connection, table: str, name: str, columns: str) -> None:
+    conn.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({columns})')
+
+
+# ====== esquema base (0001) ======
+def _baseline_metadata() -> MetaData:
+    """Tablas tal como estaban al introducir las migraciones. No se toca: lo
+    posterior (token_version, índices por fecha, ...) va en sus migraciones."""
+    md = MetaData()
+    Table("user", md,
+          Column("id", Integer, primary_key=True),
+          Column("email", String, nullable=False),
+          Column("hashed_password", String, nullable=False),
+          Column("full_name", String),
+          Column("is_active", Boolean, nullable=False),
+          Index("ix_user_email", "email", unique=True))
+    Table("userprofile", md,
+          Column("id", Integer, primary_key=True),
+          Column("user_id", Integer, ForeignKey("user.id"), nullable=False),
+          Column("sex", String, nullable=False),
+          Column("age", Integer, nullable=False),
+          Column("height_cm", Float, nullable=False),
+          Column("weight_kg", Float, nullable=False),
+          Column("activity_level", String, nullable=False),
+          Column("goal", String, nullable=False),
+          Column("dietary_prefs", String),
+          Index("ix_userprofile_user_id", "user_id"))
+    Table("nutritionplan", md,
+          Column("id", Integer, primary_key=True),
+          Column("user_id", Integer, ForeignKey("user.id"), nullable=False),
+          Column("created_at", DateTime, nullable=False),
+          Column("bmr", Float, nullable=False),
+          Column("tdee", Float, nullable=False),
+          Column("protein_g", Float, nullable=False),
+          Column("carbs_g", Float, nullable=False),
+          Column("fat_g", Float, nullable=False),
+          Index("ix_nutritionplan_user_id", "user_id"))
+    Table("menu", md,
+          Column("id", Integer, primary_key=True),
+          Column("user_id", Integer, ForeignKey("user.id"), nullable=False),
+          Column("plan_id", Integer, ForeignKey("nutritionplan.id")),
+          Column("created_at", DateTime, nullable=False),
+          Column("json_payload", JSON),
+          Index("ix_menu_user_id", "user_id"))
+    Table("recentsearch", md,
+          Column("id", Integer, primary_key=True),
+          Column("user_id", Integer, ForeignKey("user.id"), nullable=False),
+          Column("term", String, nullable=False),
+          Column("source", String, nullable=False),
+          Column("created_at", DateTime, nullable=False),
+          Index("ix_recentsearch_user_id", "user_id"),
+          Index("ix_recentsearch_term", "term"))
+    Table("offproduct", md,
+          Column("code", String, primary_key=True),
+          Column("name", String, nullable=False),
+          Column("brands", String, nullable=False),
+          Column("kcal_100g", Float),
+          Column("protein_100g", Float),
+          Column("fat_100g", Float),
+          Column("carbs_100g", Float),
+          Column("sugars_100g", Float),
+          Column("source", String, nullable=False),
+          Column("fetched_at", DateTime, nullable=False))
+    Table("offsearch", md,
+          Column("term", String, primary_key=True),
+          Column("max_results", Integer, primary_key=True, autoincrement=False),
+          Column("results", JSON),
+          Column("fetched_at", DateTime, nullable=False))
+    Table("foodmacroscache", md,
+          Column("key", String, primary_key=True),
+          Column("query", String, nullable=False),
+          Column("protein_g", Float, nullable=False),
+          Column("carb_g", Float, nullable=False),
+          Column("fat_g", Float, nullable=False),
+          Column("raw", String),
+          Column("hits", Integer, nullable=False),
+          Column("created_at", DateTime, nullable=False))
+    return md
+
+
+# ====== migraciones ======
+def m0001_initial(conn: Connection) -> None:
+    _baseline_metadata().create_all(conn, checkfirst=True)
+
+def m0002_user_token_version(conn: Connection) -> None:
+    _add_column(conn, "user", "token_version", "INTEGER NOT NULL DEFAULT 0")
+
+def m0003_user_created_indexes(conn: Connection) -> None:
+    _create_index(conn, "menu", "ix_menu_user_created", "user_id, created_at, id")
+    _create_index(conn, "nutritionplan", "ix_nutritionplan_user_created", "user_id, created_at, id")
+    _create_index(conn, "recentsearch", "ix_recentsearch_user_created", "user_id, created_at, id")
+
+def _normalizar(texto: str) -> str:
+    # igual que product_store.normalizar_termino al escribir esta migración (copia: no debe cambiar)
+    s = unicodedata.normalize("NFKD", texto.lower())
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return " ".join(s.split())
+
+def m0004_offproduct_search_name(conn: Connection) -> None:
+    # nombre sin tildes ni mayúsculas para la búsqueda con LIKE (sin FTS5)
+    _add_column(conn, "offproduct", "search_name", "VARCHAR NOT NULL DEFAULT ''")
+    after = ""
+    while True:
+        rows = conn.execute(text("SELECT code, name FROM offproduct WHERE code > :after ORDER BY code LIMIT 1000"),
+                            {"after": after}).all()
+        if not rows:
+            return
+        conn.execute(text("UPDATE offproduct SET search_name = :search_name WHERE code = :code"),
+                     [{"code": code, "search_name": _normalizar(name or "")} for code, name in rows])
+        after = rows[-1][0]
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "initial", m0001_initial),
+    (2, "user_token_version", m0002_user_token_version),
+    (3, "user_created_indexes", m0003_user_created_indexes),
+    (4, "offproduct_search_name", m0004_offproduct_search_name),
+]
+
+
+# ====== ejecución ======
+def _ensure_version_table(conn: Connection) -> None:
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at VARCHAR(32) NOT NULL)"
+    )
+
+def applied_versions(engine: Engine) -> List[int]:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(VERSION_TABLE):
+            return []
+        return [row[0] for row in conn.execute(text(f"SELECT version FROM {VERSION_TABLE} ORDER BY version"))]
+
+def pending(engine: Engine) -> List[int]:
+    done = set(applied_versions(engine))
+    return [v for v, _, _ in MIGRATIONS if v not in done]
+
+@contextmanager
+def _migration_lock(engine: Engine):
+    if engine.dialect.name != "postgresql":
+        # SQLite: las escrituras ya se serializan (busy_timeout) y cada migración se vuelve a comprobar
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": PG_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": PG_LOCK_KEY})
+            conn.commit()
+
+def upgrade(engine: Engine) -> List[int]:
+    """Aplica las migraciones pendientes y devuelve las versiones aplicadas."""
+    if not pending(engine):
+        # caso normal al arrancar: una consulta y ningún DDL
+        return []
+    applied = []
+    with _migration_lock(engine):
+        with engine.begin() as conn:
+            _ensure_version_table(conn)
+        for version, name, fn in MIGRATIONS:
+            with engine.begin() as conn:
+                # otro proceso pudo aplicarla mientras esperábamos el lock
+                done = conn.execute(text(f"SELECT 1 FROM {VERSION_TABLE} WHERE version = :v"), {"v": version}).first()
+                if done:
+                    continue
+                fn(conn)
+                conn.execute(text(f"INSERT INTO {VERSION_TABLE} (version, name, applied_at) VALUES (:v, :n, :t)"),
+                             {"v": version, "n": name, "t": datetime.utcnow().isoformat(timespec="seconds")})
+            applied.append(version)
+            print(f"Migración {version:04d} {name} aplicada")
+    return applied
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Migraciones del esquema de la BD")
+    ap.add_argument("--status", action="store_true", help="solo muestra la versión actual y las pendientes")
+    args = ap.parse_args()
+
+    from db import engine
+
+    done = applied_versions(engine)
+    print(f"{engine.url.render_as_string(hide_password=True)}: versión {max(done) if done else 0}")
+    if args.status:
+        names = {v: n for v, n, _ in MIGRATIONS}
+        for v in pending(engine):
+            print(f"  pendiente {v:04d} {names[v]}")
+        return
+    applied = upgrade(engine)
+    print(f"{len(applied)} migraciones aplicadas" if applied else "Sin migraciones pendientes")
+
+
+if __name__ == "__main__":
+    main()
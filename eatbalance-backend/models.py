@@ -1,7 +1,7 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 from sqlmodel import SQLModel, Field
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column, Index, JSON
 
 # Usuario
 class User(SQLModel, table=True):
@@ -10,6 +10,8 @@ class User(SQLModel, table=True):
     hashed_password: str
     full_name: Optional[str] = None
     is_active: bool = True
+    # se incrementa al desactivar o cambiar la contraseña: invalida los tokens emitidos
+    token_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
 # Perfil del usuario
 class UserProfile(SQLModel, table=True):
@@ -26,6 +28,8 @@ class UserProfile(SQLModel, table=True):
 
 # Plan nutricional guardado
 class NutritionPlan(SQLModel, table=True):
+    # listados por usuario paginados por (created_at, id): ver pagination.py
+    __table_args__ = (Index("ix_nutritionplan_user_created", "user_id", "created_at", "id"),)
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id", index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -38,6 +42,7 @@ class NutritionPlan(SQLModel, table=True):
 
 # Menú del día guardado (JSON)
 class Menu(SQLModel, table=True):
+    __table_args__ = (Index("ix_menu_user_created", "user_id", "created_at", "id"),)
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id", index=True)
     plan_id: Optional[int] = Field(default=None, foreign_key="nutritionplan.id")
@@ -48,8 +53,43 @@ class Menu(SQLModel, table=True):
 
 # --- Búsquedas recientes por usuario ---
 class RecentSearch(SQLModel, table=True):
+    __table_args__ = (Index("ix_recentsearch_user_created", "user_id", "created_at", "id"),)
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id", index=True)
     term: str = Field(index=True)
     source: str  # "openfoodfacts" | "usda" | "local"
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# --- Caché local de productos de OpenFoodFacts ---
+class OFFProduct(SQLModel, table=True):
+    code: str = Field(primary_key=True)
+    name: str = "Desconocido"
+    # name normalizado (sin tildes, en minúsculas) para buscar con LIKE cuando no hay FTS5
+    search_name: str = ""
+    brands: str = "N/A"
+    kcal_100g: Optional[float] = None
+    protein_100g: Optional[float] = None
+    fat_100g: Optional[float] = None
+    carbs_100g: Optional[float] = None
+    sugars_100g: Optional[float] = None
+    source: str = "api"  # "api" | "dump"
+    fetched_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Resultados de búsqueda ya normalizados, por término normalizado
+class OFFSearch(SQLModel, table=True):
+    term: str = Field(primary_key=True)
+    max_results: int = Field(primary_key=True)
+    results: List[Dict[str, Any]] = Field(sa_column=Column(JSON))
+    fetched_at: datetime = Field(default_factory=datetime.utcnow)
+
+# --- Macros por 100 g obtenidos del LLM, por nombre de alimento normalizado ---
+class FoodMacrosCache(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    query: str  # primer texto con el que se preguntó
+    protein_g: float
+    carb_g: float
+    fat_g: float
+    raw: Optional[str] = None  # respuesta original del LLM
+    hits: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,7 +1,7 @@
-import requests
+import llm_gateway
 
-def consultar_chat_ollama(nombre, macros_100g, pregunta_usuario):
-    prompt = f"""
+def construir_prompt(nombre, macros_100g, pregunta_usuario):
+    return f"""
 Estoy trabajando con nutrición. Tengo estos datos por 100g del alimento "{nombre}":
 
 - Calorías: {macros_100g.get("calorias", "desconocido")}
@@ -22,13 +22,9 @@ Pregunta del usuario:
 {pregunta_usuario}
 """
 
-    body = {
-        "model": "mistral",  # o el modelo que tengas instalado en Ollama
-        "prompt": prompt,
-        "stream": False
-    }
+async def consultar_chat_ollama(nombre, macros_100g, pregunta_usuario):
+    return await llm_gateway.ollama_generate(construir_prompt(nombre, macros_100g, pregunta_usuario))
 
-    response = requests.post("http://localhost:11434/api/generate", json=body)
-    response.raise_for_status()
-
-    return response.json()["response"]
+# Igual que consultar_chat_ollama pero devuelve los tokens según llegan
+async def consultar_chat_ollama_stream(nombre, macros_100g, pregunta_usuario):
+    return await llm_gateway.ollama_stream(construir_prompt(nombre, macros_100g, pregunta_usuario))
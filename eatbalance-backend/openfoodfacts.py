@@ -1,8 +1,101 @@
-import requests
+import asyncio
+import os
+import weakref
+
+import httpx
+
+from metrics import InstrumentedTransport
+
+# Cliente asíncrono compartido (pool de conexiones) para OpenFoodFacts
+OFF_BASE_URL = os.getenv("OFF_BASE_URL", "https://world.openfoodfacts.org")
+OFF_TIMEOUT_S = float(os.getenv("OFF_TIMEOUT_S", "10"))
+OFF_MAX_RETRIES = int(os.getenv("OFF_MAX_RETRIES", "2"))
+OFF_BACKOFF_S = float(os.getenv("OFF_BACKOFF_S", "0.3"))
+OFF_MAX_CONNECTIONS = int(os.getenv("OFF_MAX_CONNECTIONS", "20"))
+
+_client: httpx.AsyncClient | None = None
+_client_loop = None
+# peticiones idénticas en curso, por event loop: la segunda espera a la primera en vez de
+# repetirla (una tarea solo se puede esperar desde su propio loop)
+_inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+async def _close_quietly(client: httpx.AsyncClient) -> None:
+    try:
+        await client.aclose()
+    except RuntimeError:
+        # su loop ya está cerrado: los sockets se cierran igual, solo falla avisar al loop
+        pass
+
+async def _get_client() -> httpx.AsyncClient:
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    # el pool pertenece a un event loop concreto (p.ej. cada TestClient arranca el suyo)
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        old, old_loop = _client, _client_loop
+        _client_loop = loop
+        _client = httpx.AsyncClient(
+            base_url=OFF_BASE_URL,
+            timeout=httpx.Timeout(OFF_TIMEOUT_S, connect=min(3.0, OFF_TIMEOUT_S)),
+            transport=InstrumentedTransport(limits=httpx.Limits(max_connections=OFF_MAX_CONNECTIONS,
+                                                                max_keepalive_connections=OFF_MAX_CONNECTIONS)),
+            headers={"User-Agent": "EatBalance/1.0"},
+        )
+        if old is not None and not old.is_closed:
+            # el cliente anterior se cierra en su loop si sigue vivo; si no, desde este
+            if old_loop is not None and old_loop.is_running() and not old_loop.is_closed():
+                asyncio.run_coroutine_threadsafe(_close_quietly(old), old_loop)
+            else:
+                await _close_quietly(old)
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _close_quietly(_client)
+        _client = None
+
+
+async def _get_json(path, params=None):
+    # reintentos con backoff exponencial en errores de red, 429 y 5xx
+    for intento in range(OFF_MAX_RETRIES + 1):
+        try:
+            response = await (await _get_client()).get(path, params=params)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            if (status != 429 and status < 500) or intento == OFF_MAX_RETRIES:
+                raise
+        except httpx.TransportError:
+            if intento == OFF_MAX_RETRIES:
+                raise
+        await asyncio.sleep(OFF_BACKOFF_S * (2 ** intento))
+
+async def _single_flight(key, factory):
+    inflight = _inflight.setdefault(asyncio.get_running_loop(), {})
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        inflight[key] = task
+        task.add_done_callback(lambda _t: inflight.pop(key, None))
+    # shield: si un cliente cancela, la petición compartida sigue para los demás
+    return await asyncio.shield(task)
+
+
+def _nutrientes(producto):
+    nutriments = producto.get("nutriments", {})
+    return {
+        "calorias": nutriments.get("energy-kcal_100g"),
+        "proteinas": nutriments.get("proteins_100g"),
+        "grasas": nutriments.get("fat_100g"),
+        "carbohidratos": nutriments.get("carbohydrates_100g"),
+        "azucares": nutriments.get("sugars_100g")
+    }
+
 
 # 🔍 Buscar hasta 15 productos por nombre
-def buscar_productos(nombre, max_resultados=15):
-    url = "https://world.openfoodfacts.org/cgi/search.pl"
+async def buscar_productos(nombre, max_resultados=15):
     params = {
         "search_terms": nombre,
         "search_simple": 1,
@@ -11,9 +104,8 @@ def buscar_productos(nombre, max_resultados=15):
         "page_size": max_resultados
     }
 
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    resultados = response.json().get("products", [])
+    data = await _single_flight(("search", nombre, max_resultados), lambda: _get_json("/cgi/search.pl", params))
+    resultados = data.get("products", [])
 
     alimentos = []
     for producto in resultados:
@@ -21,35 +113,18 @@ def buscar_productos(nombre, max_resultados=15):
             "id": producto.get("code", ""),
             "nombre": producto.get("product_name", "Desconocido"),
             "marca": producto.get("brands", "N/A"),
-            "nutrientes_por_100g": {
-                "calorias": producto.get("nutriments", {}).get("energy-kcal_100g"),
-                "proteinas": producto.get("nutriments", {}).get("proteins_100g"),
-                "grasas": producto.get("nutriments", {}).get("fat_100g"),
-                "carbohidratos": producto.get("nutriments", {}).get("carbohydrates_100g"),
-                "azucares": producto.get("nutriments", {}).get("sugars_100g")
-            }
+            "nutrientes_por_100g": _nutrientes(producto)
         })
 
     return alimentos
 
 # 🎯 Obtener un producto específico por su code (id)
-def obtener_producto_por_id(code):
-    url = f"https://world.openfoodfacts.org/api/v0/product/{code}.json"
-
-    response = requests.get(url)
-    response.raise_for_status()
-
-    data = response.json()
+async def obtener_producto_por_id(code):
+    data = await _single_flight(("product", code), lambda: _get_json(f"/api/v0/product/{code}.json"))
     producto = data.get("product", {})
 
     return {
         "nombre": producto.get("product_name", "Desconocido"),
         "marca": producto.get("brands", "N/A"),
-        "nutrientes_por_100g": {
-            "calorias": producto.get("nutriments", {}).get("energy-kcal_100g"),
-            "proteinas": producto.get("nutriments", {}).get("proteins_100g"),
-            "grasas": producto.get("nutriments", {}).get("fat_100g"),
-            "carbohidratos": producto.get("nutriments", {}).get("carbohydrates_100g"),
-            "azucares": producto.get("nutriments", {}).get("sugars_100g")
-        }
+        "nutrientes_por_100g": _nutrientes(producto)
     }
@@ -0,0 +1,89 @@
+# pagination.py
+"""
+Paginación por cursor (keyset) y ETag de los listados por usuario
+(/menus, /nutrition/plans, /users/recent-searches).
+
+- Orden: created_at DESC, id DESC, servido por los índices (user_id, created_at, id).
+  El cursor es opaco (created_at + id de la última fila de la página); la página
+  siguiente empieza justo después, sin OFFSET, cueste lo mismo la página 1 que la 100.
+- El cuerpo sigue siendo una lista; la página siguiente va en las cabeceras
+  X-Next-Cursor y Link (rel="next"). Sin cursor siguiente no hay más páginas.
+- ETag: huella de (número de filas, suma de ids, created_at más reciente) del
+  usuario más los parámetros de la petición. Se calcula con una consulta sobre
+  el índice antes de leer las filas; con If-None-Match coincidente se responde
+  304 sin leerlas.
+"""
+import base64
+import hashlib
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import and_, func, or_
+from sqlmodel import select
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+# ====== cursor ======
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def keyset(stmt, model, cursor: Optional[str], limit: int):
+    """Añade el orden y la condición de la página; pide limit + 1 filas para saber si hay más."""
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        # equivalente a (created_at, id) < (:created_at, :id), que no todos los motores usan con el índice
+        stmt = stmt.where(or_(model.created_at < created_at,
+                              and_(model.created_at == created_at, model.id < row_id)))
+    return stmt.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+
+# ====== ETag ======
+def version_stmt(model, user_id: int):
+    """(filas, suma de ids, último created_at) del usuario: cambia con cada inserción o borrado.
+
+    No basta con el id máximo: SQLite reutiliza el id de la última fila si se
+    borra, y borrar el menú más nuevo y guardar otro dejaba (filas, id máximo)
+    igual. El created_at del nuevo sí cambia.
+    """
+    return select(func.count(model.id), func.sum(model.id), func.max(model.created_at)) \
+        .where(model.user_id == user_id)
+
+def make_etag(kind: str, user_id: int, version: Sequence[Any], *params: Any) -> str:
+    key = "|".join(str(p) for p in (kind, user_id, *version, *params))
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Respuesta 304 si el cliente ya tiene esta versión (If-None-Match)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+# ====== respuesta ======
+def finish_page(rows: List[Any], limit: int, request: Request, response: Response, etag: str) -> List[Any]:
+    """Recorta las limit + 1 filas a la página y pone ETag, X-Next-Cursor y Link."""
+    response.headers["ETag"] = etag
+    if len(rows) <= limit:
+        return rows
+    rows = rows[:limit]
+    cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    response.headers["X-Next-Cursor"] = cursor
+    next_url = request.url.include_query_params(cursor=cursor, limit=limit)
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return rows
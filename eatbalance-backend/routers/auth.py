@@ -1,30 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
 
 from db import get_session
 from models import User
 from schemas import UserCreate, Token, UserOut
-from security import get_password_hash, verify_password, create_access_token
+from security import create_user_token
+from services.password_hasher import HashOverloaded, HashRateLimited, password_hasher
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-@router.post("/register", response_model=UserOut)
-def register(data: UserCreate, session: Session = Depends(get_session)):
-    exists = session.exec(select(User).where(User.email == data.email)).first()
-    if exists:
-        raise HTTPException(status_code=400, detail="Email ya registrado")
-    user = User(email=data.email, full_name=data.full_name,
-                hashed_password=get_password_hash(data.password))
+# bcrypt va al pool de password_hasher; las consultas, al threadpool (son rápidas)
+def _find_user(session: Session, email: str):
+    return session.exec(select(User).where(User.email == email)).first()
+
+def _save(session: Session, user: User) -> User:
     session.add(user)
     session.commit()
     session.refresh(user)
     return user
 
+def _client_ip(request: Request):
+    return request.client.host if request.client else None
+
+async def _hashing(coro):
+    try:
+        return await coro
+    except HashRateLimited:
+        raise HTTPException(status_code=429, detail="Demasiados intentos simultáneos, inténtalo en unos segundos",
+                            headers={"Retry-After": "1"})
+    except HashOverloaded:
+        raise HTTPException(status_code=503, detail="Servidor ocupado, inténtalo en unos segundos",
+                            headers={"Retry-After": "1"})
+
+@router.post("/register", response_model=UserOut)
+async def register(data: UserCreate, request: Request, session: Session = Depends(get_session)):
+    exists = await run_in_threadpool(_find_user, session, data.email)
+    if exists:
+        raise HTTPException(status_code=400, detail="Email ya registrado")
+    hashed = await _hashing(password_hasher.hash(data.password, ip=_client_ip(request), email=data.email))
+    user = User(email=data.email, full_name=data.full_name, hashed_password=hashed)
+    return await run_in_threadpool(_save, session, user)
+
 @router.post("/login", response_model=Token)
-def login(form: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)):
-    user = session.exec(select(User).where(User.email == form.username)).first()
-    if not user or not verify_password(form.password, user.hashed_password):
+async def login(request: Request, form: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)):
+    user = await run_in_threadpool(_find_user, session, form.username)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Login inválido")
+    ok, new_hash = await _hashing(password_hasher.verify(form.password, user.hashed_password,
+                                                         ip=_client_ip(request), email=form.username))
+    if not ok:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Login inválido")
-    token = create_access_token({"sub": str(user.id)})
+    if new_hash:
+        # hecho con otro coste de bcrypt (BCRYPT_ROUNDS): se guarda el hash actualizado
+        user.hashed_password = new_hash
+        user = await run_in_threadpool(_save, session, user)
+    token = create_user_token(user)
     return Token(access_token=token)
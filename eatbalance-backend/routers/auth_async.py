@@ -0,0 +1,48 @@
+# Versión async de routers/auth.py (DB_ASYNC=1): mismas rutas, AsyncSession en vez del threadpool
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db import get_async_session
+from models import User
+from routers.auth import _client_ip, _hashing
+from schemas import UserCreate, Token, UserOut
+from security import create_user_token
+from services.password_hasher import password_hasher
+
+router = APIRouter(prefix="/auth", tags=["auth"])
+
+async def _find_user(session: AsyncSession, email: str):
+    return (await session.exec(select(User).where(User.email == email))).first()
+
+async def _save(session: AsyncSession, user: User) -> User:
+    session.add(user)
+    await session.commit()
+    await session.refresh(user)
+    return user
+
+@router.post("/register", response_model=UserOut)
+async def register(data: UserCreate, request: Request, session: AsyncSession = Depends(get_async_session)):
+    if await _find_user(session, data.email):
+        raise HTTPException(status_code=400, detail="Email ya registrado")
+    hashed = await _hashing(password_hasher.hash(data.password, ip=_client_ip(request), email=data.email))
+    user = User(email=data.email, full_name=data.full_name, hashed_password=hashed)
+    return await _save(session, user)
+
+@router.post("/login", response_model=Token)
+async def login(request: Request, form: OAuth2PasswordRequestForm = Depends(),
+                session: AsyncSession = Depends(get_async_session)):
+    user = await _find_user(session, form.username)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Login inválido")
+    ok, new_hash = await _hashing(password_hasher.verify(form.password, user.hashed_password,
+                                                         ip=_client_ip(request), email=form.username))
+    if not ok:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Login inválido")
+    if new_hash:
+        # hecho con otro coste de bcrypt (BCRYPT_ROUNDS): se guarda el hash actualizado
+        user.hashed_password = new_hash
+        user = await _save(session, user)
+    token = create_user_token(user)
+    return Token(access_token=token)
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlmodel import Session, select, delete
 from db import get_session
-from security import get_current_user
-from models import User, Menu
-from schemas import MenuIn, MenuOut
+from security import AuthUser, get_current_user, get_current_user_read
+from models import Menu
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, finish_page, keyset, make_etag, not_modified, version_stmt
+from schemas import MenuIn, MenuOut, MenuSummaryOut
 
 router = APIRouter(prefix="/menus", tags=["menus"])
 
@@ -11,7 +14,7 @@ router = APIRouter(prefix="/menus", tags=["menus"])
 def save_menu(
     data: MenuIn,
     session: Session = Depends(get_session),
-    user: User = Depends(get_current_user),
+    user: AuthUser = Depends(get_current_user),
 ):
     m = Menu(user_id=user.id, plan_id=data.plan_id, json_payload=data.json_payload)
     session.add(m)
@@ -19,19 +22,37 @@ def save_menu(
     session.refresh(m)
     return m
 
-@router.get("", response_model=list[MenuOut])
+def list_stmt(user_id: int, cursor: Optional[str], limit: int, include_payload: bool):
+    # json_payload es lo que más pesa: solo se lee si se pide
+    cols = (Menu,) if include_payload else (Menu.id, Menu.plan_id, Menu.created_at)
+    return keyset(select(*cols).where(Menu.user_id == user_id), Menu, cursor, limit)
+
+def to_out(rows, include_payload: bool):
+    model = MenuOut if include_payload else MenuSummaryOut
+    return [model.model_validate(r) for r in rows]
+
+@router.get("", response_model=list[MenuOut | MenuSummaryOut])
 def list_menus(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    include_payload: bool = False,
     session: Session = Depends(get_session),
-    user: User = Depends(get_current_user),
+    user: AuthUser = Depends(get_current_user_read),
 ):
-    q = select(Menu).where(Menu.user_id == user.id).order_by(Menu.id.desc())
-    return session.exec(q).all()
+    etag = make_etag("menus", user.id, session.exec(version_stmt(Menu, user.id)).one(), cursor, limit, include_payload)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    rows = session.exec(list_stmt(user.id, cursor, limit, include_payload)).all()
+    return to_out(finish_page(rows, limit, request, response, etag), include_payload)
 
 @router.delete("/{menu_id}", status_code=204)
 def delete_menu(
     menu_id: int,
     session: Session = Depends(get_session),
-    user: User = Depends(get_current_user),
+    user: AuthUser = Depends(get_current_user),
 ):
     q = select(Menu).where(Menu.id == menu_id, Menu.user_id == user.id)
     m = session.exec(q).first()
@@ -0,0 +1,59 @@
+# Versión async de routers/menus.py (DB_ASYNC=1)
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db import get_async_session
+from security import AuthUser, get_current_user_async, get_current_user_read_async
+from models import Menu
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, finish_page, make_etag, not_modified, version_stmt
+from routers.menus import list_stmt, to_out
+from schemas import MenuIn, MenuOut, MenuSummaryOut
+
+router = APIRouter(prefix="/menus", tags=["menus"])
+
+@router.post("", response_model=MenuOut)
+async def save_menu(
+    data: MenuIn,
+    session: AsyncSession = Depends(get_async_session),
+    user: AuthUser = Depends(get_current_user_async),
+):
+    m = Menu(user_id=user.id, plan_id=data.plan_id, json_payload=data.json_payload)
+    session.add(m)
+    await session.commit()
+    await session.refresh(m)
+    return m
+
+@router.get("", response_model=list[MenuOut | MenuSummaryOut])
+async def list_menus(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    include_payload: bool = False,
+    session: AsyncSession = Depends(get_async_session),
+    user: AuthUser = Depends(get_current_user_read_async),
+):
+    version = (await session.exec(version_stmt(Menu, user.id))).one()
+    etag = make_etag("menus", user.id, version, cursor, limit, include_payload)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    rows = (await session.exec(list_stmt(user.id, cursor, limit, include_payload))).all()
+    return to_out(finish_page(rows, limit, request, response, etag), include_payload)
+
+@router.delete("/{menu_id}", status_code=204)
+async def delete_menu(
+    menu_id: int,
+    session: AsyncSession = Depends(get_async_session),
+    user: AuthUser = Depends(get_current_user_async),
+):
+    q = select(Menu).where(Menu.id == menu_id, Menu.user_id == user.id)
+    m = (await session.exec(q)).first()
+    if not m:
+        raise HTTPException(status_code=404, detail="No encontrado")
+    await session.delete(m)
+    await session.commit()
+    return
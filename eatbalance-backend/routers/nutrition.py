@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Request, Response
 from pydantic import BaseModel
 from sqlmodel import Session, select
 
 from db import get_session
-from models import User, NutritionPlan
+from models import NutritionPlan
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, finish_page, keyset, make_etag, not_modified, version_stmt
 from schemas import PlanOut
-from security import get_current_user
+from security import AuthUser, get_current_user, get_current_user_read
 
 # tus funciones existentes
 from bmr import calcular_bmr
@@ -22,41 +25,56 @@ class PlanIn(BaseModel):
     activity_level: str   # sedentario | ligero | moderado | activo | muy activo
     goal: str             # deficit | mantenimiento | superavit
 
-@router.post("/plan/generate", response_model=PlanOut)
-def generate_plan(
-    data: PlanIn,
-    session: Session = Depends(get_session),
-    user: User = Depends(get_current_user),
-):
+def build_plan(user_id: int, data: PlanIn) -> NutritionPlan:
     bmr = calcular_bmr(data.sex, data.weight_kg, data.height_cm, data.age)
-    tdee = calcular_tdee(data.sex, data.weight_kg, data.height_cm, data.age, data.activity_level)
+    tdee = calcular_tdee(data.sex, data.weight_kg, data.height_cm, data.age, data.activity_level, bmr=bmr)
     m = calcular_macros(tdee, data.goal)
 
-    plan = NutritionPlan(
-        user_id=user.id,
+    return NutritionPlan(
+        user_id=user_id,
         bmr=float(bmr),
         tdee=float(tdee),
         protein_g=float(m["proteinas_g"]),
         carbs_g=float(m["carbohidratos_g"]),
         fat_g=float(m["grasas_g"]),
     )
+
+@router.post("/plan/generate", response_model=PlanOut)
+def generate_plan(
+    data: PlanIn,
+    session: Session = Depends(get_session),
+    user: AuthUser = Depends(get_current_user),
+):
+    plan = build_plan(user.id, data)
     session.add(plan)
     session.commit()
     session.refresh(plan)
     return plan
 
 @router.get("/plans", response_model=list[PlanOut])
-def list_plans(session: Session = Depends(get_session), user: User = Depends(get_current_user)):
-    return session.exec(select(NutritionPlan).where(NutritionPlan.user_id == user.id).order_by(NutritionPlan.id.desc())).all()
+def list_plans(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    session: Session = Depends(get_session),
+    user: AuthUser = Depends(get_current_user_read),
+):
+    etag = make_etag("plans", user.id, session.exec(version_stmt(NutritionPlan, user.id)).one(), cursor, limit)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    q = keyset(select(NutritionPlan).where(NutritionPlan.user_id == user.id), NutritionPlan, cursor, limit)
+    return finish_page(session.exec(q).all(), limit, request, response, etag)
 
 
 @router.get("/plans/latest", response_model=PlanOut)
 def latest_plan(
     session: Session = Depends(get_session),
-    user: User = Depends(get_current_user)
+    user: AuthUser = Depends(get_current_user_read)
 ):
     q = select(NutritionPlan).where(NutritionPlan.user_id == user.id) \
-                             .order_by(NutritionPlan.id.desc())
+                             .order_by(NutritionPlan.created_at.desc(), NutritionPlan.id.desc())
     plan = session.exec(q).first()
     if not plan:
         from fastapi import HTTPException
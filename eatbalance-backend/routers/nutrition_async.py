@@ -0,0 +1,57 @@
+# Versión async de routers/nutrition.py (DB_ASYNC=1)
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db import get_async_session
+from models import NutritionPlan
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, finish_page, keyset, make_etag, not_modified, version_stmt
+from routers.nutrition import PlanIn, build_plan
+from schemas import PlanOut
+from security import AuthUser, get_current_user_async, get_current_user_read_async
+
+router = APIRouter(prefix="/nutrition", tags=["nutrition"])
+
+@router.post("/plan/generate", response_model=PlanOut)
+async def generate_plan(
+    data: PlanIn,
+    session: AsyncSession = Depends(get_async_session),
+    user: AuthUser = Depends(get_current_user_async),
+):
+    plan = build_plan(user.id, data)
+    session.add(plan)
+    await session.commit()
+    await session.refresh(plan)
+    return plan
+
+@router.get("/plans", response_model=list[PlanOut])
+async def list_plans(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_async_session),
+    user: AuthUser = Depends(get_current_user_read_async),
+):
+    version = (await session.exec(version_stmt(NutritionPlan, user.id))).one()
+    etag = make_etag("plans", user.id, version, cursor, limit)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    q = keyset(select(NutritionPlan).where(NutritionPlan.user_id == user.id), NutritionPlan, cursor, limit)
+    return finish_page((await session.exec(q)).all(), limit, request, response, etag)
+
+
+@router.get("/plans/latest", response_model=PlanOut)
+async def latest_plan(
+    session: AsyncSession = Depends(get_async_session),
+    user: AuthUser = Depends(get_current_user_read_async)
+):
+    q = select(NutritionPlan).where(NutritionPlan.user_id == user.id) \
+                             .order_by(NutritionPlan.created_at.desc(), NutritionPlan.id.desc())
+    plan = (await session.exec(q)).first()
+    if not plan:
+        raise HTTPException(status_code=404, detail="No hay planes guardados")
+    return plan
@@ -1,55 +1,69 @@
 # routers/plan.py
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
-from typing import Dict, Optional
-import pandas as pd
 import json
-from pathlib import Path
-from services.menu_generator import generate_day_plan, generate_all_options
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, Literal, Optional
+from metrics import stage
+from services import food_audit
+from services.catalog import Catalog, CatalogError, get_catalog, store as catalog_store
+from services.plan_cache import plan_cache, quantize_totals, totals_key
+from services.plan_executor import (PlanOverloaded, PlanTimeout, plan_executor,
+                                    task_best_day, task_generate, task_generate_all)
 
 router = APIRouter(prefix="/plan", tags=["plan"])
 
-# Rutas absolutas desde la raíz del backend
-BASE_DIR = Path(__file__).resolve().parents[1]
-FOODS_PATH = BASE_DIR / "data" / "foods.csv"
-MENUS_PATH = BASE_DIR / "data" / "menus.json"
+# los resultados cacheados dejan de valer cuando cambia foods.csv/menus.json
+catalog_store.subscribe(lambda _catalog: plan_cache.clear())
 
-# ====== utilidades de carga/validación ======
-def _load_foods(path: Path) -> pd.DataFrame:
+# ====== catálogo en memoria ======
+def _get_catalog() -> Catalog:
     try:
-        df = pd.read_csv(path, dtype={"food_id": "string"}, sep=",", engine="python")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"No se pudo leer {path}: {e}")
-    df.columns = [c.replace("\ufeff", "").strip() for c in df.columns]
-    if "food_id" not in df.columns:
-        raise HTTPException(status_code=500, detail=f"El CSV {path} no tiene columna 'food_id'")
-    df["food_id"] = df["food_id"].astype("string").str.replace("\ufeff", "", regex=False).str.strip()
-    return df
-
-def _validate_selection(selection, menus, foods_df):
-    menu_map = {m["menu_id"]: m for m in menus}
-    food_ids = set(foods_df["food_id"].astype(str))
+        with stage("load"):
+            return get_catalog()
+    except CatalogError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _validate_selection(selection, catalog: Catalog):
     missing = []
     for meal, menu_id in selection.items():
-        if menu_id not in menu_map:
+        menu = catalog.menus_by_id.get(menu_id)
+        if menu is None:
             missing.append(f"menu_id '{menu_id}' (no existe en menus.json)")
             continue
-        for it in menu_map[menu_id]["items"]:
+        for it in menu["items"]:
             fid = it["food_id"]
-            if fid not in food_ids:
+            if fid not in catalog.foods_by_id:
                 missing.append(f"food_id '{fid}' en {meal}/{menu_id}")
     if missing:
         raise HTTPException(status_code=400, detail=f"Faltan en foods.csv: {missing}")
 
-def _validate_menus_foods(menus, foods_df):
-    food_ids = set(foods_df["food_id"].astype(str))
-    missing = []
-    for m in menus:
-        for it in m["items"]:
-            if it["food_id"] not in food_ids:
-                missing.append(f"{m['menu_id']}/{it['food_id']}")
-    if missing:
-        raise HTTPException(status_code=400, detail=f"Faltan en foods.csv: {missing}")
+def _validate_menus_foods(catalog: Catalog):
+    # la comprobación completa se hizo al cargar el catálogo
+    if catalog.missing:
+        raise HTTPException(status_code=400, detail=f"Faltan en foods.csv: {list(catalog.missing)}")
+
+# ====== ejecución en el pool de procesos ======
+async def _execute(key, fn, *args):
+    """(versión, resultado) desde la caché o calculado en el pool; key=None para no cachear."""
+    if key is not None:
+        found, value = plan_cache.get(key)
+        if found:
+            return value
+    try:
+        version, result = await plan_executor.run(fn, *args)
+    except PlanOverloaded:
+        raise HTTPException(status_code=503, detail="Servidor ocupado generando planes, inténtalo en unos segundos",
+                            headers={"Retry-After": "1"})
+    except PlanTimeout:
+        raise HTTPException(status_code=504, detail="La generación del plan tardó demasiado")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # si el proceso tenía otra versión del catálogo (recarga a mitad) no se cachea con esta clave
+    if key is not None and version == key[1]:
+        plan_cache.put(key, (version, result))
+    return version, result
 
 # ====== modelos ======
 class Totals(BaseModel):
@@ -62,23 +76,57 @@ class GenerateRequest(BaseModel):
     totals: Totals
     scheme: str = Field(..., description="3 | 4 | 5 | 5_plus_snack")
     selection: Dict[str, str] = Field(..., description="{'desayuno':'...', 'comida':'...', ...}")
+    mode: Literal["greedy", "solver"] = Field(default="greedy", description="greedy (ajuste secuencial) | solver (optimizador de porciones)")
 
 class GenerateAllRequest(BaseModel):
     totals: Totals
     scheme: str = Field(..., description="3 | 4 | 5 | 5_plus_snack")
     top_n: Optional[int] = Field(default=5, ge=1, description="Top N opciones por comida (None para todas)")
+    mode: Literal["greedy", "solver"] = Field(default="greedy", description="greedy (ajuste secuencial) | solver (optimizador de porciones)")
+
+class BestDayRequest(BaseModel):
+    totals: Totals
+    scheme: str = Field(..., description="3 | 4 | 5 | 5_plus_snack")
+    mode: Literal["greedy", "solver"] = Field(default="greedy", description="greedy (ajuste secuencial) | solver (optimizador de porciones)")
+    beam_width: int = Field(default=50, ge=1, le=5000, description="Anchura del beam search inicial")
+    time_budget_ms: float = Field(default=200.0, gt=0, le=10000, description="Tiempo máximo de búsqueda")
 
 # ====== endpoints ======
 @router.post("/generate")
-def generate(req: GenerateRequest):
-    try:
-        foods = _load_foods(FOODS_PATH)
-        with open(MENUS_PATH, "r", encoding="utf-8") as f:
-            menus = json.load(f)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error cargando bases: {e}")
+async def generate(req: GenerateRequest):
+    catalog = _get_catalog()
+    with stage("validate"):
+        _validate_selection(req.selection, catalog)
+        totals = quantize_totals({
+            "kcal": req.totals.kcal,
+            "protein_g": req.totals.protein_g,
+            "carb_g": req.totals.carb_g,
+            "fat_g": req.totals.fat_g
+        })
+    key = ("day", catalog.version, req.scheme, req.mode, totals_key(totals), tuple(sorted(req.selection.items())))
+    version, plan = await _execute(key, task_generate, catalog.version, totals, req.scheme, req.selection, req.mode)
+    return {"ok": True, "catalog_version": version, "plan": plan}
 
-    _validate_selection(req.selection, menus, foods)
+@router.post("/generate_all")
+async def generate_all(req: GenerateAllRequest):
+    catalog = _get_catalog()
+    with stage("validate"):
+        _validate_menus_foods(catalog)
+        totals = quantize_totals({
+            "kcal": req.totals.kcal,
+            "protein_g": req.totals.protein_g,
+            "carb_g": req.totals.carb_g,
+            "fat_g": req.totals.fat_g
+        })
+    key = ("all", catalog.version, req.scheme, req.mode, totals_key(totals), req.top_n)
+    version, plan = await _execute(key, task_generate_all, catalog.version, totals, req.scheme, req.top_n, req.mode)
+    return {"ok": True, "catalog_version": version, "plan": plan}
+
+@router.post("/best_day")
+async def best_day(req: BestDayRequest):
+    catalog = _get_catalog()
+    with stage("validate"):
+        _validate_menus_foods(catalog)
 
     totals = {
         "kcal": req.totals.kcal,
@@ -87,72 +135,56 @@ def generate(req: GenerateRequest):
         "fat_g": req.totals.fat_g
     }
 
-    try:
-        plan = generate_day_plan(foods_df=foods, menus=menus, totals=totals, scheme=req.scheme, selection=req.selection)
-        return {"ok": True, "plan": plan}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    version, result = await _execute(None, task_best_day, catalog.version, totals, req.scheme,
+                                     req.mode, req.beam_width, req.time_budget_ms)
+    return {"ok": True, "catalog_version": version, **result}
 
-@router.post("/generate_all")
-def generate_all(req: GenerateAllRequest):
-    try:
-        foods = _load_foods(FOODS_PATH)
-        with open(MENUS_PATH, "r", encoding="utf-8") as f:
-            menus = json.load(f)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error cargando bases: {e}")
+@router.get("/cache/stats")
+def cache_stats():
+    return plan_cache.stats()
 
-    _validate_menus_foods(menus, foods)
-
-    totals = {
-        "kcal": req.totals.kcal,
-        "protein_g": req.totals.protein_g,
-        "carb_g": req.totals.carb_g,
-        "fat_g": req.totals.fat_g
-    }
-
-    try:
-        plan = generate_all_options(foods_df=foods, menus=menus, totals=totals, scheme=req.scheme, top_n=req.top_n)
-        return {"ok": True, "plan": plan}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+@router.get("/executor/stats")
+def executor_stats():
+    return plan_executor.stats()
 
 @router.get("/audit/foods")
-def audit_foods(threshold_pct: float = 5.0):
-    df = _load_foods(FOODS_PATH)
-    issues = []
-    for _, r in df.iterrows():
-        try:
-            p = float(r.get("protein_g", 0) or 0)
-            c = float(r.get("carb_g", 0) or 0)
-            f = float(r.get("fat_g", 0) or 0)
-            kcal = float(r.get("kcal", 0) or 0)
-        except Exception:
-            continue
-        kcal_calc = 4*(p + c) + 9*f
-        if kcal_calc > 0:
-            pct = 100.0 * (kcal - kcal_calc) / kcal_calc
-            if abs(pct) >= threshold_pct:
-                issues.append({
-                    "food_id": str(r["food_id"]),
-                    "name": str(r.get("name", "")),
-                    "kcal_declared": round(kcal, 1),
-                    "kcal_from_macros": round(kcal_calc, 1),
-                    "delta_kcal": round(kcal - kcal_calc, 1),
-                    "delta_pct": round(pct, 1)
-                })
-    return {"count": int(df.shape[0]), "issues": issues, "threshold_pct": threshold_pct}
+def audit_foods(threshold_pct: float = 5.0, formato: str = Query("json", pattern="^(json|ndjson)$")):
+    catalog = _get_catalog()
+    result = food_audit.audit_cache.get(catalog, threshold_pct)
+    meta = {"count": result.foods_count, "menus_count": result.menus_count, "threshold_pct": threshold_pct,
+            "catalog_version": result.catalog_version, "summary": result.summary()}
+    if formato == "ndjson":
+        # una línea por incidencia; la primera lleva el resumen
+        def lines():
+            yield json.dumps(meta, ensure_ascii=False) + "\n"
+            for issue in result.iter_issues():
+                yield json.dumps(issue, ensure_ascii=False) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    return {**meta, "issues": list(result.iter_issues())}
 
 @router.get("/debug")
 def debug():
-    foods = _load_foods(FOODS_PATH)
-    with open(MENUS_PATH, "r", encoding="utf-8") as f:
-        menus = json.load(f)
+    catalog = _get_catalog()
+    return {
+        "catalog_version": catalog.version,
+        "foods_path": str(catalog_store.foods_path),
+        "foods_count": int(catalog.foods_df.shape[0]),
+        "foods_first_ids": catalog.foods_df["food_id"].head(10).tolist(),
+        "menus_path": str(catalog_store.menus_path),
+        "menus_count": len(catalog.menus),
+        "menus_first_ids": [m["menu_id"] for m in catalog.menus[:10]]
+    }
+
+@router.post("/catalog/reload")
+def reload_catalog():
+    try:
+        catalog = catalog_store.reload()
+    except CatalogError as e:
+        raise HTTPException(status_code=500, detail=str(e))
     return {
-        "foods_path": str(FOODS_PATH),
-        "foods_count": int(foods.shape[0]),
-        "foods_first_ids": foods["food_id"].head(10).tolist(),
-        "menus_path": str(MENUS_PATH),
-        "menus_count": len(menus),
-        "menus_first_ids": [m["menu_id"] for m in menus[:10]]
+        "ok": True,
+        "catalog_version": catalog.version,
+        "foods_count": int(catalog.foods_df.shape[0]),
+        "menus_count": len(catalog.menus),
+        "missing": list(catalog.missing),
     }
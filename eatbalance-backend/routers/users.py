@@ -1,23 +1,26 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Request, Response
 from sqlmodel import Session, select, delete
 
 from db import get_session
-from models import User, UserProfile, RecentSearch
+from models import UserProfile, RecentSearch
+from pagination import MAX_PAGE_SIZE, finish_page, keyset, make_etag, not_modified, version_stmt
 from schemas import UserOut, ProfileIn, ProfileOut, RecentSearchOut, RecentSearchIn
-from security import get_current_user
+from security import AuthUser, get_current_user, get_current_user_read
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/me", response_model=UserOut)
-def me(user: User = Depends(get_current_user)):
+def me(user: AuthUser = Depends(get_current_user)):
     return user
 
 @router.get("/preferences", response_model=ProfileOut | None)
-def get_prefs(session: Session = Depends(get_session), user: User = Depends(get_current_user)):
+def get_prefs(session: Session = Depends(get_session), user: AuthUser = Depends(get_current_user_read)):
     return session.exec(select(UserProfile).where(UserProfile.user_id == user.id)).first()
 
 @router.put("/preferences", response_model=ProfileOut)
-def set_prefs(data: ProfileIn, session: Session = Depends(get_session), user: User = Depends(get_current_user)):
+def set_prefs(data: ProfileIn, session: Session = Depends(get_session), user: AuthUser = Depends(get_current_user)):
     prof = session.exec(select(UserProfile).where(UserProfile.user_id == user.id)).first()
     if prof:
         for k, v in data.model_dump().items():
@@ -34,7 +37,7 @@ def set_prefs(data: ProfileIn, session: Session = Depends(get_session), user: Us
 def add_recent_search(
     data: RecentSearchIn,
     session: Session = Depends(get_session),
-    user: User = Depends(get_current_user),
+    user: AuthUser = Depends(get_current_user),
 ):
     rs = RecentSearch(user_id=user.id, term=data.term.strip()[:255], source=data.source)
     session.add(rs)
@@ -54,12 +57,17 @@ def add_recent_search(
 
 @router.get("/recent-searches", response_model=list[RecentSearchOut])
 def list_recent_searches(
-    limit: int = 15,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(15, ge=1, le=MAX_PAGE_SIZE),
     session: Session = Depends(get_session),
-    user: User = Depends(get_current_user),
+    user: AuthUser = Depends(get_current_user_read),
 ):
-    q = select(RecentSearch).where(RecentSearch.user_id == user.id) \
-                            .order_by(RecentSearch.id.desc()) \
-                            .limit(limit)
-    return session.exec(q).all()
+    etag = make_etag("recent", user.id, session.exec(version_stmt(RecentSearch, user.id)).one(), cursor, limit)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    q = keyset(select(RecentSearch).where(RecentSearch.user_id == user.id), RecentSearch, cursor, limit)
+    return finish_page(session.exec(q).all(), limit, request, response, etag)
 
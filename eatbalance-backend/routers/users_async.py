@@ -0,0 +1,77 @@
+# Versión async de routers/users.py (DB_ASYNC=1)
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlmodel import select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db import get_async_session
+from models import UserProfile, RecentSearch
+from pagination import MAX_PAGE_SIZE, finish_page, keyset, make_etag, not_modified, version_stmt
+from schemas import UserOut, ProfileIn, ProfileOut, RecentSearchOut, RecentSearchIn
+from security import AuthUser, get_current_user_async, get_current_user_read_async
+
+router = APIRouter(prefix="/users", tags=["users"])
+
+@router.get("/me", response_model=UserOut)
+async def me(user: AuthUser = Depends(get_current_user_async)):
+    return user
+
+@router.get("/preferences", response_model=ProfileOut | None)
+async def get_prefs(session: AsyncSession = Depends(get_async_session),
+                    user: AuthUser = Depends(get_current_user_read_async)):
+    return (await session.exec(select(UserProfile).where(UserProfile.user_id == user.id))).first()
+
+@router.put("/preferences", response_model=ProfileOut)
+async def set_prefs(data: ProfileIn, session: AsyncSession = Depends(get_async_session),
+                    user: AuthUser = Depends(get_current_user_async)):
+    prof = (await session.exec(select(UserProfile).where(UserProfile.user_id == user.id))).first()
+    if prof:
+        for k, v in data.model_dump().items():
+            setattr(prof, k, v)
+    else:
+        prof = UserProfile(user_id=user.id, **data.model_dump())
+        session.add(prof)
+    await session.commit()
+    await session.refresh(prof)
+    return prof
+
+# ---- BÚSQUEDAS RECIENTES ----
+@router.post("/recent-searches", status_code=204)
+async def add_recent_search(
+    data: RecentSearchIn,
+    session: AsyncSession = Depends(get_async_session),
+    user: AuthUser = Depends(get_current_user_async),
+):
+    rs = RecentSearch(user_id=user.id, term=data.term.strip()[:255], source=data.source)
+    session.add(rs)
+    await session.commit()
+
+    # Mantener solo 25 últimas
+    ids = (await session.exec(
+        select(RecentSearch.id)
+        .where(RecentSearch.user_id == user.id)
+        .order_by(RecentSearch.id.desc())
+        .offset(25)
+    )).all()
+    if ids:
+        await session.exec(delete(RecentSearch).where(RecentSearch.id.in_(ids)))
+        await session.commit()
+    return
+
+@router.get("/recent-searches", response_model=list[RecentSearchOut])
+async def list_recent_searches(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(15, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_async_session),
+    user: AuthUser = Depends(get_current_user_read_async),
+):
+    version = (await session.exec(version_stmt(RecentSearch, user.id))).one()
+    etag = make_etag("recent", user.id, version, cursor, limit)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    q = keyset(select(RecentSearch).where(RecentSearch.user_id == user.id), RecentSearch, cursor, limit)
+    return finish_page((await session.exec(q)).all(), limit, request, response, etag)
@@ -44,13 +44,15 @@ class PlanOut(BaseModel):
     fat_g: float
     model_config = ConfigDict(from_attributes=True)
 
-class MenuOut(BaseModel):
+class MenuSummaryOut(BaseModel):
     id: int
     plan_id: Optional[int] = None
     created_at: datetime          # <- antes str
-    json_payload: Dict[str, Any]
     model_config = ConfigDict(from_attributes=True)
 
+class MenuOut(MenuSummaryOut):
+    json_payload: Dict[str, Any]
+
 # ---- Recent Searches ----
 class RecentSearchIn(BaseModel):
     term: str
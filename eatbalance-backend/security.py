@@ -1,19 +1,34 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from db import get_session
+from db import get_async_session, get_session
 from models import User
 
 SECRET_KEY = "cambia-esto-en-produccion"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Caché de tokens ya verificados -> usuario (0 para desactivarla)
+AUTH_CACHE_TTL_S = float(os.getenv("AUTH_CACHE_TTL_S", "30"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+# Endpoints de lectura sin consultar la BD: solo firma y caducidad del token
+AUTH_READ_CLAIMS_ONLY = os.getenv("AUTH_READ_CLAIMS_ONLY", "0") == "1"
+# Coste de bcrypt: los hashes con otro coste se rehacen en el siguiente login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=BCRYPT_ROUNDS,
+                           bcrypt__min_rounds=BCRYPT_ROUNDS, bcrypt__max_rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 def get_password_hash(password: str) -> str:
@@ -27,23 +42,153 @@ def create_access_token(data: dict, minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES):
     to_encode.update({"exp": datetime.utcnow() + timedelta(minutes=minutes)})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    session: Session = Depends(get_session),
-) -> User:
-    cred_exc = HTTPException(
+def create_user_token(user: User) -> str:
+    # "tv": versión de token del usuario; al subirla dejan de valer los tokens anteriores
+    return create_access_token({"sub": str(user.id), "tv": user.token_version})
+
+
+# ====== usuario autenticado ======
+@dataclass(frozen=True)
+class AuthUser:
+    """Copia inmutable del usuario (la instancia de User pertenece a la sesión de una petición)."""
+    id: int
+    email: Optional[str]
+    full_name: Optional[str]
+    is_active: bool
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user: User) -> "AuthUser":
+        return cls(user.id, user.email, user.full_name, user.is_active, user.token_version)
+
+
+class AuthCache:
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl_s: float = AUTH_CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[str, Tuple[float, AuthUser]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[AuthUser]:
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(token)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._data[token]
+                self.misses += 1
+                return None
+            self._data.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token: str, user: AuthUser, token_exp: float) -> None:
+        if self.maxsize <= 0 or self.ttl_s <= 0:
+            return
+        with self._lock:
+            # nunca más allá de la caducidad del propio token
+            self._data[token] = (min(time.time() + self.ttl_s, token_exp), user)
+            self._data.move_to_end(token)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in [t for t, (_, u) in self._data.items() if u.id == user_id]:
+                del self._data[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": len(self._data), "maxsize": self.maxsize, "ttl_s": self.ttl_s, "hits": self.hits,
+                "misses": self.misses, "hit_ratio": round(self.hits / total, 4) if total else 0.0}
+
+
+auth_cache = AuthCache()
+
+def revoke_user_tokens(session: Session, user: User) -> None:
+    """Invalida los tokens emitidos al usuario (llamar al desactivarlo o cambiar la contraseña).
+
+    Con sesión síncrona; en los routers async (DB_ASYNC=1), revoke_user_tokens_async.
+    """
+    user.token_version = (user.token_version or 0) + 1
+    session.add(user)
+    session.commit()
+    # en este proceso al momento; en otros procesos como mucho AUTH_CACHE_TTL_S después
+    auth_cache.invalidate_user(user.id)
+
+async def revoke_user_tokens_async(session: AsyncSession, user: User) -> None:
+    user.token_version = (user.token_version or 0) + 1
+    session.add(user)
+    await session.commit()
+    auth_cache.invalidate_user(user.id)
+
+
+def _cred_exc():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Credenciales inválidas",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode(token: str) -> Tuple[int, int, float]:
+    """(user_id, versión de token, caducidad) de un token con firma válida y sin caducar."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: Optional[int] = payload.get("sub")
-        if user_id is None:
-            raise cred_exc
-    except JWTError:
-        raise cred_exc
-    user = session.get(User, int(user_id))
-    if not user or not user.is_active:
-        raise cred_exc
-    return user
+        user_id = int(payload["sub"])
+        return user_id, int(payload.get("tv", 0)), float(payload.get("exp", 0))
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise _cred_exc()
+
+def _verified(token: str, user: Optional[User], token_version: int, exp: float) -> AuthUser:
+    if not user or not user.is_active or (user.token_version or 0) != token_version:
+        raise _cred_exc()
+    auth_user = AuthUser.from_user(user)
+    auth_cache.put(token, auth_user, exp)
+    return auth_user
+
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    session: Session = Depends(get_session),
+) -> AuthUser:
+    cached = auth_cache.get(token)
+    if cached is not None:
+        return cached
+    user_id, token_version, exp = _decode(token)
+    return _verified(token, session.get(User, user_id), token_version, exp)
+
+def get_token_claims(token: str = Depends(oauth2_scheme)) -> AuthUser:
+    # sin BD: un usuario desactivado sigue entrando hasta que caduque su token
+    user_id, token_version, _ = _decode(token)
+    return AuthUser(user_id, None, None, True, token_version)
+
+def get_current_user_read(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> AuthUser:
+    """Para endpoints de solo lectura: con AUTH_READ_CLAIMS_ONLY=1 basta con el token."""
+    if AUTH_READ_CLAIMS_ONLY:
+        return get_token_claims(token)
+    return get_current_user(token, session)
+
+
+# ====== versiones async (routers/*_async.py, DB_ASYNC=1) ======
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_async_session),
+) -> AuthUser:
+    cached = auth_cache.get(token)
+    if cached is not None:
+        return cached
+    user_id, token_version, exp = _decode(token)
+    return _verified(token, await session.get(User, user_id), token_version, exp)
+
+async def get_current_user_read_async(
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_async_session),
+) -> AuthUser:
+    if AUTH_READ_CLAIMS_ONLY:
+        return get_token_claims(token)
+    return await get_current_user_async(token, session)
@@ -0,0 +1,140 @@
+# services/bulk_macros.py
+"""
+BMR, TDEE y macros de muchos perfiles a la vez (NumPy, una pasada por columna).
+
+Mismas fórmulas y constantes que bmr.py / tdee.py / macros.py y mismo orden de
+operaciones, así que los resultados coinciden con las funciones escalares
+(incluido el redondeo: round() de Python redondea el decimal exacto y
+np.round no, por eso los casos en el límite se corrigen con round()).
+
+Las filas no válidas no abortan el lote: quedan a NaN y se informan en
+"errores" con el mismo mensaje que darían las funciones escalares.
+"""
+import io
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from bmr import COEFICIENTES_BMR
+from macros import AJUSTES_OBJETIVO, REPARTOS_OBJETIVO
+from tdee import FACTORES_ACTIVIDAD
+
+COLUMNAS_ENTRADA = ("sexo", "peso", "altura", "edad", "actividad", "objetivo")
+
+_ERR_SEXO = "Sexo no válido: usa 'hombre' o 'mujer'"
+_ERR_ACTIVIDAD = "Nivel de actividad no válido. Usa: sedentario, ligero, moderado, activo o muy activo"
+_ERR_OBJETIVO = "Objetivo no válido. Usa: deficit, mantenimiento o superavit"
+_ERR_NUMEROS = "peso, altura y edad deben ser numéricos"
+
+
+class BulkInputError(ValueError):
+    pass
+
+
+def round_py(x: np.ndarray, ndigits: int) -> np.ndarray:
+    """np.round con el resultado de round() de Python (corrige los casos casi empatados)."""
+    out = np.round(x, ndigits)
+    scaled = x * 10.0 ** ndigits
+    frac = np.abs(scaled - np.floor(scaled) - 0.5)
+    dudosos = np.flatnonzero((frac < 1e-6) & np.isfinite(x))
+    for i in dudosos:
+        out[i] = round(float(x[i]), ndigits)
+    return out
+
+def _lookup(values: pd.Series, table: Dict[str, Any], n: int) -> np.ndarray:
+    """(n, k) con los coeficientes de cada fila (NaN si la clave no existe)."""
+    keys = list(table)
+    coefs = np.array([np.atleast_1d(table[k]) for k in keys], dtype=float)
+    # -1 para claves desconocidas (pd.Categorical con valores fuera de categories avisa y dejará de aceptarlo)
+    codes = pd.Index(keys).get_indexer(values)
+    out = np.full((n, coefs.shape[1]), np.nan)
+    ok = codes >= 0
+    out[ok] = coefs[codes[ok]]
+    return out
+
+
+def compute_bulk(df: pd.DataFrame, round_bmr: bool = True) -> Dict[str, Any]:
+    # round_bmr=False: BMR sin redondear, como lo guarda NutritionPlan
+    faltan = [c for c in COLUMNAS_ENTRADA if c not in df.columns]
+    if faltan:
+        raise BulkInputError(f"Faltan columnas: {', '.join(faltan)}")
+    n = len(df)
+
+    # mismas normalizaciones que las funciones escalares
+    sexo = df["sexo"].astype("string").str.lower()
+    actividad = df["actividad"].astype("string").str.lower().str.strip()
+    objetivo = df["objetivo"].astype("string").str.lower().str.strip()
+    peso = pd.to_numeric(df["peso"], errors="coerce").to_numpy(dtype=float)
+    altura = pd.to_numeric(df["altura"], errors="coerce").to_numpy(dtype=float)
+    edad = pd.to_numeric(df["edad"], errors="coerce").to_numpy(dtype=float)
+
+    c_bmr = _lookup(sexo, COEFICIENTES_BMR, n)
+    f_act = _lookup(actividad, FACTORES_ACTIVIDAD, n)[:, 0]
+    aj = _lookup(objetivo, AJUSTES_OBJETIVO, n)[:, 0]
+    rep = _lookup(objetivo, REPARTOS_OBJETIVO, n)
+
+    bmr = c_bmr[:, 0] + (c_bmr[:, 1] * peso) + (c_bmr[:, 2] * altura) - (c_bmr[:, 3] * edad)
+    tdee = round_py(bmr * f_act, 2)
+    kcal = tdee * aj
+    c, p, f = rep[:, 0], rep[:, 1], rep[:, 2]
+    cols = {
+        "bmr": round_py(bmr, 2) if round_bmr else bmr,
+        "tdee": tdee,
+        "calorias_objetivo": round_py(kcal, 2),
+        # /calcular-macros redondea a 2 lo que ya viene a 1 decimal: no cambia
+        "proteinas": round_py((kcal * p) / 4, 1),
+        "grasas": round_py((kcal * f) / 9, 1),
+        "carbohidratos": round_py((kcal * c) / 4, 1),
+        "pct_carbohidratos": c,
+        "pct_proteinas": p,
+        "pct_grasas": f,
+    }
+
+    # primer error de cada fila, en el orden en que fallaría el cálculo escalar
+    mensajes = np.array([_ERR_SEXO, _ERR_NUMEROS, _ERR_ACTIVIDAD, _ERR_OBJETIVO])
+    fallo = np.select(
+        [np.isnan(c_bmr[:, 0]), np.isnan(peso) | np.isnan(altura) | np.isnan(edad), np.isnan(f_act), np.isnan(aj)],
+        [0, 1, 2, 3],
+        default=-1,
+    )
+    invalid = fallo >= 0
+    errores: List[Dict[str, Any]] = [
+        {"fila": int(i), "error": str(mensajes[fallo[i]])} for i in np.flatnonzero(invalid)
+    ]
+    for k in cols:
+        cols[k] = np.where(invalid, np.nan, cols[k])
+    return {"filas": n, "validas": int(n - invalid.sum()), "columnas": cols, "errores": errores}
+
+
+# ====== entrada / salida ======
+def frame_from_json(payload) -> pd.DataFrame:
+    """Lista de perfiles [{...}, ...] o columnas {"sexo": [...], ...}."""
+    if isinstance(payload, dict):
+        try:
+            return pd.DataFrame(payload)
+        except ValueError as e:
+            raise BulkInputError(f"Columnas de distinta longitud: {e}")
+    return pd.DataFrame.from_records(payload)
+
+def frame_from_file(raw: bytes, filename: str) -> pd.DataFrame:
+    name = (filename or "").lower()
+    if name.endswith(".parquet"):
+        try:
+            return pd.read_parquet(io.BytesIO(raw))
+        except ImportError:
+            raise BulkInputError("Parquet no disponible: instala pyarrow")
+    try:
+        return pd.read_csv(io.BytesIO(raw), sep=None, engine="python", encoding="utf-8-sig")
+    except Exception as e:
+        raise BulkInputError(f"No se pudo leer el CSV: {e}")
+
+def to_jsonable(result: Dict[str, Any]) -> Dict[str, Any]:
+    cols = {
+        k: pd.Series(v).astype(object).where(~np.isnan(v), None).tolist()
+        for k, v in result["columnas"].items()
+    }
+    return {**result, "columnas": cols}
+
+def to_csv(result: Dict[str, Any]) -> str:
+    return pd.DataFrame(result["columnas"]).to_csv(index_label="fila")
@@ -0,0 +1,195 @@
+# services/catalog.py
+"""
+Catálogo en memoria de alimentos (foods.csv) y menús (menus.json).
+
+Se carga y valida una sola vez; en cada acceso solo se comprueba (como mucho
+una vez por CHECK_INTERVAL_S) el mtime/tamaño de los ficheros. Si cambian y
+además cambia su hash, se construye un catálogo nuevo y se sustituye de forma
+atómica. Si la recarga falla se sigue sirviendo el catálogo anterior.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import pandas as pd
+
+from services.scaling_engine import FoodTable, MenuBatch
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+# se pueden cambiar (p.ej. a un catálogo de services/synthetic_catalog.py) con FOODS_PATH/MENUS_PATH
+FOODS_PATH = Path(os.getenv("FOODS_PATH", BASE_DIR / "data" / "foods.csv"))
+MENUS_PATH = Path(os.getenv("MENUS_PATH", BASE_DIR / "data" / "menus.json"))
+
+# Cada cuánto (segundos) se mira si los ficheros han cambiado en disco
+CHECK_INTERVAL_S = float(os.getenv("CATALOG_CHECK_INTERVAL_S", "1.0"))
+
+
+class CatalogError(Exception):
+    pass
+
+
+# ====== carga/validación ======
+def load_foods(path: Path, raw: Optional[bytes] = None) -> pd.DataFrame:
+    try:
+        src = io.BytesIO(raw) if raw is not None else path
+        df = pd.read_csv(src, dtype={"food_id": "string"}, sep=",", engine="python")
+    except Exception as e:
+        raise CatalogError(f"No se pudo leer {path}: {e}")
+    df.columns = [c.replace("\ufeff", "").strip() for c in df.columns]
+    if "food_id" not in df.columns:
+        raise CatalogError(f"El CSV {path} no tiene columna 'food_id'")
+    df["food_id"] = df["food_id"].astype("string").str.replace("\ufeff", "", regex=False).str.strip()
+    return df
+
+def load_menus(path: Path, raw: Optional[bytes] = None) -> list:
+    try:
+        if raw is None:
+            raw = path.read_bytes()
+        return json.loads(raw.decode("utf-8"))
+    except Exception as e:
+        raise CatalogError(f"No se pudo leer {path}: {e}")
+
+def missing_menu_foods(menus, food_ids) -> List[str]:
+    missing = []
+    for m in menus:
+        for it in m["items"]:
+            if it["food_id"] not in food_ids:
+                missing.append(f"{m['menu_id']}/{it['food_id']}")
+    return missing
+
+def _freeze(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+
+# ====== catálogo inmutable ======
+@dataclass(frozen=True)
+class Catalog:
+    version: str
+    foods_df: pd.DataFrame                       # solo lectura: no modificar in situ
+    foods_by_id: Mapping[str, Mapping[str, Any]]
+    menus: Tuple[Mapping[str, Any], ...]
+    menus_by_id: Mapping[str, Mapping[str, Any]]
+    menus_by_meal: Mapping[str, Tuple[Mapping[str, Any], ...]]
+    missing: Tuple[str, ...]                     # menu_id/food_id sin alimento en foods.csv
+    food_table: FoodTable                        # matriz de nutrientes para el motor de escalado
+    meal_batches: Mapping[str, MenuBatch]        # menús compilados por meal_type (vacío si hay missing)
+    loaded_at: float
+
+    @classmethod
+    def build(cls, foods_df: pd.DataFrame, menus: list, version: str) -> "Catalog":
+        foods_by_id = {
+            str(r["food_id"]): MappingProxyType(r)
+            for r in foods_df.to_dict("records")
+        }
+        frozen = tuple(_freeze(m) for m in menus)
+        by_meal: Dict[str, list] = {}
+        for m in frozen:
+            by_meal.setdefault(m.get("meal_type"), []).append(m)
+        missing = tuple(missing_menu_foods(frozen, foods_by_id))
+        table = FoodTable(foods_df)
+        batches = {} if missing else {k: MenuBatch.build(v, table) for k, v in by_meal.items()}
+        return cls(
+            version=version,
+            foods_df=foods_df,
+            foods_by_id=MappingProxyType(foods_by_id),
+            menus=frozen,
+            menus_by_id=MappingProxyType({m["menu_id"]: m for m in frozen}),
+            menus_by_meal=MappingProxyType({k: tuple(v) for k, v in by_meal.items()}),
+            missing=missing,
+            food_table=table,
+            meal_batches=MappingProxyType(batches),
+            loaded_at=time.time(),
+        )
+
+
+def _stat_signature(*paths: Path) -> Tuple:
+    sig = []
+    for p in paths:
+        st = os.stat(p)
+        sig.append((st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+class CatalogStore:
+    def __init__(self, foods_path: Path = FOODS_PATH, menus_path: Path = MENUS_PATH,
+                 check_interval: float = CHECK_INTERVAL_S):
+        self.foods_path = Path(foods_path)
+        self.menus_path = Path(menus_path)
+        self.check_interval = check_interval
+        self._catalog: Optional[Catalog] = None
+        self._signature: Optional[Tuple] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Catalog], None]] = []
+        self.last_error: Optional[str] = None
+
+    def subscribe(self, fn: Callable[[Catalog], None]) -> None:
+        """fn(catalog) se llama cada vez que se sustituye el catálogo (p.ej. para vaciar cachés)."""
+        self._listeners.append(fn)
+
+    def get(self) -> Catalog:
+        cat = self._catalog
+        if cat is not None and time.monotonic() < self._next_check:
+            return cat
+        return self._refresh(force=False)
+
+    def reload(self) -> Catalog:
+        return self._refresh(force=True)
+
+    def _refresh(self, force: bool) -> Catalog:
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                sig = _stat_signature(self.foods_path, self.menus_path)
+            except OSError as e:
+                return self._keep_or_raise(CatalogError(f"Error cargando bases: {e}"), force)
+            if not force and self._catalog is not None and sig == self._signature:
+                return self._catalog
+            try:
+                foods_raw = self.foods_path.read_bytes()
+                menus_raw = self.menus_path.read_bytes()
+                version = hashlib.sha256(
+                    hashlib.sha256(foods_raw).digest() + hashlib.sha256(menus_raw).digest()
+                ).hexdigest()[:12]
+                # Solo se ha tocado el fichero (mismo contenido): no hace falta reconstruir
+                if not force and self._catalog is not None and version == self._catalog.version:
+                    self._signature = sig
+                    return self._catalog
+                catalog = Catalog.build(
+                    load_foods(self.foods_path, foods_raw),
+                    load_menus(self.menus_path, menus_raw),
+                    version,
+                )
+            except Exception as e:
+                err = e if isinstance(e, CatalogError) else CatalogError(f"Error cargando bases: {e}")
+                return self._keep_or_raise(err, force)
+            self._catalog = catalog
+            self._signature = sig
+            self.last_error = None
+        for fn in self._listeners:
+            fn(catalog)
+        return catalog
+
+    def _keep_or_raise(self, err: CatalogError, force: bool) -> Catalog:
+        # En recargas automáticas se mantiene el catálogo anterior; en las forzadas se informa
+        self.last_error = str(err)
+        if force or self._catalog is None:
+            raise err
+        return self._catalog
+
+
+store = CatalogStore()
+
+def get_catalog() -> Catalog:
+    return store.get()
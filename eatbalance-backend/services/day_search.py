@@ -0,0 +1,166 @@
+# services/day_search.py
+"""
+Búsqueda del mejor día completo: elige un menú por comida de modo que el error
+del TOTAL diario sea mínimo (una comida puede compensar a otra).
+
+1) Tablas por comida: cada menú se escala a su objetivo de comida y se guarda lo
+   conseguido (P, C, G, kcal).
+2) Beam search para tener enseguida una buena solución.
+3) Branch-and-bound en profundidad hasta agotar el presupuesto de tiempo. La cota
+   inferior usa, para cada macro, el intervalo [suma de mínimos, suma de máximos]
+   que pueden aportar las comidas que faltan.
+"""
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from metrics import stage
+from services.menu_generator import DISTS, Macro, per_meal_targets, _error_score
+from services.scaling_engine import FoodTable, MenuBatch, materialize, scale_batch, batch_achieved
+from services.portion_solver import solve_grams
+
+# Pesos de P, C, G y kcal (mismos que _error_score)
+WEIGHTS = np.array([1.0, 1.0, 1.0, 0.01])
+
+
+@dataclass
+class MealTable:
+    meal: str
+    target: Macro
+    batch: MenuBatch
+    grams: np.ndarray      # (M, K) gramos ya redondeados
+    achieved: np.ndarray   # (M, 4) P, C, G, kcal
+    order: np.ndarray      # índices de menú de mejor a peor error individual
+
+
+def build_meal_table(meal: str, batch: MenuBatch, table: FoodTable, target: Macro, mode: str = "greedy") -> MealTable:
+    if mode == "solver":
+        grams = np.zeros(batch.base_g.shape)
+        for i, cm in enumerate(batch.menus):
+            grams[i, :len(cm.idx)] = solve_grams(cm, table, target)
+    else:
+        grams = scale_batch(batch, target.protein_g, target.carb_g, target.fat_g)
+    kpcf = batch_achieved(batch, grams)
+    achieved = kpcf[:, [1, 2, 3, 0]]
+    t = np.array([target.protein_g, target.carb_g, target.fat_g, target.kcal])
+    order = np.argsort((np.abs(achieved - t) * WEIGHTS).sum(axis=1), kind="stable")
+    return MealTable(meal, target, batch, grams, achieved, order)
+
+
+def _lower_bounds(S: np.ndarray, lo: np.ndarray, hi: np.ndarray, T: np.ndarray) -> np.ndarray:
+    # distancia ponderada de T al intervalo [S+lo, S+hi] en cada macro
+    below = np.maximum(0.0, (S + lo) - T)
+    above = np.maximum(0.0, T - (S + hi))
+    return ((below + above) * WEIGHTS).sum(axis=-1)
+
+
+def search_best_day(tables: List[MealTable], T: np.ndarray, beam_width: int = 50,
+                    time_budget_s: float = 0.2) -> Tuple[List[int], float, Dict]:
+    """Devuelve (índice de menú por comida, error diario, estadísticas de búsqueda)."""
+    t0 = time.perf_counter()
+    deadline = t0 + time_budget_s
+    n = len(tables)
+    # cotas de lo que aún pueden aportar las comidas d..n-1
+    suf_lo = np.zeros((n + 1, 4))
+    suf_hi = np.zeros((n + 1, 4))
+    for d in range(n - 1, -1, -1):
+        suf_lo[d] = suf_lo[d + 1] + tables[d].achieved.min(axis=0)
+        suf_hi[d] = suf_hi[d + 1] + tables[d].achieved.max(axis=0)
+
+    # ===== 1) beam search =====
+    sums = np.zeros((1, 4))
+    picks = np.zeros((1, 0), dtype=np.intp)
+    for d, mt in enumerate(tables):
+        cand = sums[:, None, :] + mt.achieved[None, :, :]
+        lb = _lower_bounds(cand, suf_lo[d + 1], suf_hi[d + 1], T).ravel()
+        keep = np.argsort(lb, kind="stable")[:beam_width]
+        b_idx, m_idx = np.divmod(keep, len(mt.achieved))
+        sums = cand.reshape(-1, 4)[keep]
+        picks = np.hstack([picks[b_idx], m_idx[:, None]])
+    scores = ((np.abs(sums - T)) * WEIGHTS).sum(axis=1)
+    j = int(np.argmin(scores))
+    best_score, best_pick = float(scores[j]), [int(x) for x in picks[j]]
+
+    # ===== 2) branch-and-bound con presupuesto de tiempo =====
+    nodes = 0
+    timed_out = False
+    stack = [(0, np.zeros(4), [])]
+    while stack:
+        if time.perf_counter() > deadline:
+            timed_out = True
+            break
+        d, S, chosen = stack.pop()
+        mt = tables[d]
+        cand = S + mt.achieved[mt.order]
+        lb = _lower_bounds(cand, suf_lo[d + 1], suf_hi[d + 1], T)
+        nodes += len(lb)
+        ok = np.flatnonzero(lb < best_score - 1e-9)
+        if d == n - 1:
+            if ok.size:
+                k = ok[int(np.argmin(lb[ok]))]
+                best_score = float(lb[k])
+                best_pick = chosen + [int(mt.order[k])]
+            continue
+        # se apilan de peor a mejor para explorar primero el hijo más prometedor
+        for k in ok[np.argsort(lb[ok], kind="stable")][::-1]:
+            stack.append((d + 1, cand[k], chosen + [int(mt.order[k])]))
+
+    stats = {
+        "optimal": not timed_out,
+        "nodes": nodes,
+        "elapsed_ms": round(1000 * (time.perf_counter() - t0), 2),
+    }
+    return best_pick, best_score, stats
+
+
+def best_day_plan(table: FoodTable, batches: Mapping[str, MenuBatch], totals: Dict, scheme: str,
+                  mode: str = "greedy", beam_width: int = 50, time_budget_ms: float = 200.0) -> Dict:
+    targets = per_meal_targets(totals["kcal"], totals["protein_g"], totals["carb_g"], totals["fat_g"], scheme)
+    tables: List[MealTable] = []
+    skipped: List[str] = []
+    for meal in DISTS[scheme].keys():
+        batch = batches.get(meal)
+        if batch is None or len(batch) == 0:
+            skipped.append(meal)
+            continue
+        with stage("scale"):
+            tables.append(build_meal_table(meal, batch, table, targets[meal], mode))
+
+    # el objetivo diario es la suma de los objetivos de las comidas con menús disponibles
+    T = np.zeros(4)
+    for mt in tables:
+        T += [mt.target.protein_g, mt.target.carb_g, mt.target.fat_g, mt.target.kcal]
+
+    plan: Dict[str, Optional[Dict]] = {meal: None for meal in DISTS[scheme].keys()}
+    stats: Dict = {"optimal": True, "nodes": 0, "elapsed_ms": 0.0}
+    if tables:
+        with stage("search"):
+            picks, _, stats = search_best_day(tables, T, beam_width, time_budget_ms / 1000.0)
+    else:
+        picks = []
+
+    day = Macro(0.0, 0.0, 0.0, 0.0)
+    for mt, i in zip(tables, picks):
+        cm = mt.batch.menus[i]
+        with stage("rank"):
+            items, dbg = materialize(cm, table, mt.grams[i, :len(cm.idx)], mt.target)
+        for k in ("kcal", "protein_g", "carb_g", "fat_g"):
+            setattr(day, k, getattr(day, k) + dbg["achieved"][k])
+        plan[mt.meal] = {
+            "menu_id": cm.menu_id,
+            "menu_name": cm.menu_name,
+            "items": items,
+            "target": vars(mt.target),
+            "achieved": dbg["achieved"],
+            "errors": dbg["errors"],
+        }
+
+    target_day = {"kcal": float(T[3]), "protein_g": float(T[0]), "carb_g": float(T[1]), "fat_g": float(T[2])}
+    errors = {k: round(getattr(day, k) - target_day[k], 2) for k in target_day}
+    return {
+        "plan": plan,
+        "day": {"target": target_day, "achieved": vars(day), "errors": errors, "score": _error_score(errors)},
+        "search": {**stats, "skipped_meals": skipped},
+    }
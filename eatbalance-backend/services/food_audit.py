@@ -0,0 +1,205 @@
+# services/food_audit.py
+"""
+Auditoría del catálogo (/plan/audit/foods) en una pasada vectorizada.
+
+Comprobaciones:
+- kcal_mismatch: kcal declaradas frente a 4·(P + C) + 9·G (umbral en %).
+- macros_over_100: P + C + G por encima de 100 g por 100 g.
+- nutrients_invalid: kcal o macros vacíos, no numéricos o negativos.
+- category_missing / category_unknown: sin categoría o con una que el motor no conoce.
+- menu_bad_food: menús con alimentos inexistentes o con alguno de los errores anteriores.
+
+El cálculo (máscaras e índices de las filas con problemas) se cachea por
+(versión del catálogo, umbral); los dicts de cada incidencia se construyen al
+recorrerlas (iter_issues), así la salida NDJSON no tiene la lista entera en memoria.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Mapping, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.catalog import Catalog, store as catalog_store
+
+NUTRIENT_COLUMNS = ("kcal", "protein_g", "carb_g", "fat_g")
+KNOWN_CATEGORIES = ("PROTEIN", "CARB", "FAT", "FAT_FLEX", "MIXED")
+# errores de un alimento que invalidan los menús que lo usan (kcal_mismatch solo es un aviso)
+BAD_FOOD_CHECKS = ("nutrients_invalid", "macros_over_100", "category_missing")
+MAX_MACROS_G = 100.0
+# umbrales distintos cacheados por versión de catálogo
+CACHE_SIZE = 8
+
+
+@dataclass(frozen=True)
+class AuditResult:
+    catalog_version: str
+    threshold_pct: float
+    foods_count: int
+    menus_count: int
+    food_ids: np.ndarray
+    names: np.ndarray
+    categories: np.ndarray
+    values: Dict[str, np.ndarray]                # columnas numéricas (NaN si no válidas)
+    kcal_calc: np.ndarray
+    rows: Dict[str, np.ndarray]                  # check -> índices de las filas con el problema
+    invalid_fields: np.ndarray                   # (n, 4) bool: qué columna no es válida
+    bad_menus: Tuple[Tuple[str, str, Tuple[Tuple[str, Tuple[str, ...]], ...]], ...]
+
+    def summary(self) -> Dict[str, int]:
+        out = {check: int(rows.size) for check, rows in self.rows.items()}
+        out["menu_bad_food"] = len(self.bad_menus)
+        return out
+
+    def _food_issue(self, check: str, i: int) -> Dict:
+        issue = {"check": check, "food_id": str(self.food_ids[i]), "name": str(self.names[i])}
+        if check == "kcal_mismatch":
+            kcal, kcal_calc = float(self.values["kcal"][i]), float(self.kcal_calc[i])
+            issue.update({
+                "kcal_declared": round(kcal, 1),
+                "kcal_from_macros": round(kcal_calc, 1),
+                "delta_kcal": round(kcal - kcal_calc, 1),
+                "delta_pct": round(100.0 * (kcal - kcal_calc) / kcal_calc, 1),
+            })
+        elif check == "macros_over_100":
+            total = sum(float(self.values[c][i]) for c in ("protein_g", "carb_g", "fat_g"))
+            issue["macros_g_per_100g"] = round(total, 1)
+        elif check == "nutrients_invalid":
+            issue["fields"] = [c for c, bad in zip(NUTRIENT_COLUMNS, self.invalid_fields[i]) if bad]
+        elif check == "category_unknown":
+            issue["category"] = str(self.categories[i])
+        return issue
+
+    def iter_issues(self) -> Iterator[Dict]:
+        """Incidencias una a una: primero las de alimentos (por comprobación) y luego las de menús."""
+        for check, rows in self.rows.items():
+            for i in rows:
+                yield self._food_issue(check, int(i))
+        for menu_id, meal_type, foods in self.bad_menus:
+            yield {
+                "check": "menu_bad_food",
+                "menu_id": menu_id,
+                "meal_type": meal_type,
+                "foods": [{"food_id": fid, "checks": list(checks)} for fid, checks in foods],
+            }
+
+
+def _numeric(df: pd.DataFrame, col: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(valores float con NaN, máscara de no válidos: vacío, no numérico o negativo)."""
+    if col not in df.columns:
+        values = np.full(len(df), np.nan)
+    else:
+        values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+    return values, ~(values >= 0)
+
+def run_audit(catalog: Catalog, threshold_pct: float) -> AuditResult:
+    df = catalog.foods_df
+    n = len(df)
+    values, invalid = {}, []
+    for col in NUTRIENT_COLUMNS:
+        v, bad = _numeric(df, col)
+        values[col] = v
+        invalid.append(bad)
+    invalid_fields = np.column_stack(invalid) if n else np.zeros((0, len(NUTRIENT_COLUMNS)), dtype=bool)
+
+    p, c, f, kcal = values["protein_g"], values["carb_g"], values["fat_g"], values["kcal"]
+    kcal_calc = 4 * (p + c) + 9 * f
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = 100.0 * (kcal - kcal_calc) / kcal_calc
+    # mismas condiciones que la auditoría fila a fila (NaN nunca cumple las comparaciones)
+    kcal_mismatch = (kcal_calc > 0) & (np.abs(pct) >= threshold_pct)
+
+    if "category" in df.columns:
+        cats = df["category"].astype("string").str.strip()
+        missing_cat = cats.isna().to_numpy() | (cats.fillna("") == "").to_numpy()
+        unknown_cat = ~missing_cat & ~cats.isin(KNOWN_CATEGORIES).fillna(False).to_numpy()
+        categories = cats.fillna("").to_numpy(dtype=object)
+    else:
+        missing_cat = np.ones(n, dtype=bool)
+        unknown_cat = np.zeros(n, dtype=bool)
+        categories = np.full(n, "", dtype=object)
+
+    masks = {
+        "kcal_mismatch": kcal_mismatch,
+        "macros_over_100": (p + c + f) > MAX_MACROS_G,
+        "nutrients_invalid": invalid_fields.any(axis=1),
+        "category_missing": missing_cat,
+        "category_unknown": unknown_cat,
+    }
+    rows = {check: np.flatnonzero(mask) for check, mask in masks.items()}
+
+    food_ids = df["food_id"].astype(str).to_numpy(dtype=object)
+    names = df["name"].astype(str).to_numpy(dtype=object) if "name" in df.columns else food_ids
+    return AuditResult(
+        catalog_version=catalog.version,
+        threshold_pct=threshold_pct,
+        foods_count=n,
+        menus_count=len(catalog.menus),
+        food_ids=food_ids,
+        names=names,
+        categories=categories,
+        values=values,
+        kcal_calc=kcal_calc,
+        rows=rows,
+        invalid_fields=invalid_fields,
+        bad_menus=_bad_menus(catalog, food_ids, masks),
+    )
+
+def _bad_menus(catalog: Catalog, food_ids: np.ndarray, masks: Mapping[str, np.ndarray]):
+    bad_rows = np.zeros(len(food_ids), dtype=bool)
+    for check in BAD_FOOD_CHECKS:
+        bad_rows |= masks[check]
+    bad: Dict[str, Tuple[str, ...]] = {
+        str(food_ids[i]): tuple(check for check in BAD_FOOD_CHECKS if masks[check][i])
+        for i in np.flatnonzero(bad_rows)
+    }
+    out: List = []
+    if not bad and not catalog.missing:
+        return tuple(out)
+    for m in catalog.menus:
+        foods = []
+        for it in m["items"]:
+            fid = it["food_id"]
+            if fid not in catalog.foods_by_id:
+                foods.append((fid, ("food_missing",)))
+            elif fid in bad:
+                foods.append((fid, bad[fid]))
+        if foods:
+            out.append((m["menu_id"], m.get("meal_type"), tuple(foods)))
+    return tuple(out)
+
+
+# ====== caché por versión de catálogo ======
+class AuditCache:
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple[str, float], AuditResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, catalog: Catalog, threshold_pct: float) -> AuditResult:
+        key = (catalog.version, float(threshold_pct))
+        with self._lock:
+            result = self._data.get(key)
+            if result is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+        # fuera del lock: dos peticiones simultáneas pueden calcular lo mismo
+        result = run_audit(catalog, threshold_pct)
+        with self._lock:
+            self._data[key] = result
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+audit_cache = AuditCache()
+catalog_store.subscribe(lambda _catalog: audit_cache.clear())
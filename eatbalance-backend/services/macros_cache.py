@@ -0,0 +1,229 @@
+# services/macros_cache.py
+"""
+Macros por 100 g de un alimento por nombre, para /macros-alimento.
+
+Orden de consulta:
+1) Catálogo (data/foods.csv): sinónimos generados a partir de food_id y del
+   nombre (con y sin lo que va entre paréntesis), más unos pocos a mano.
+2) Caché persistente (tabla FoodMacrosCache) con lo que ya respondió el LLM.
+3) LLM; si la respuesta trae tres números se guarda en la caché.
+
+La clave es el nombre normalizado: minúsculas, sin tildes ni signos, sin
+palabras vacías, en singular y con las palabras ordenadas, de modo que
+"Pechugas de Pollo" y "pollo pechuga" comparten entrada.
+
+Los aciertos de la caché se cuentan en memoria y se guardan en
+FoodMacrosCache.hits cada MACROS_HITS_FLUSH_EVERY aciertos (en segundo plano),
+al pedir /macros-alimento/stats y al apagar: la lectura no escribe en la BD.
+"""
+import asyncio
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlmodel import select
+
+from db import ready_session
+from models import FoodMacrosCache
+from openrouter_client import get_macros_from_openrouter
+from services.catalog import Catalog, get_catalog, store as catalog_store
+
+MACROS_HITS_FLUSH_EVERY = int(os.getenv("MACROS_HITS_FLUSH_EVERY", "100"))
+
+STOPWORDS = {"de", "del", "la", "las", "el", "los", "y", "con", "en", "al", "a", "un", "una", "por", "para"}
+
+# sinónimos que no se deducen del CSV (clave normalizada -> food_id)
+SINONIMOS_EXTRA = {
+    "banana": "platano",
+    "banano": "platano",
+    "mantequilla mani": "mantequilla_cacahuete",
+    "crema mani": "crema_cacahuete",
+    "gnocchi": "noquis",
+    "whey": "proteina_polvo_whey",
+    "merluza": "pescado_blanco",
+    "atun": "atun_lata_escurrido",
+    "clara huevo": "claras_liquidas",
+}
+
+stats: Counter = Counter()
+_synonym_table: Tuple[Optional[str], Dict[str, str]] = (None, {})
+_inflight: dict = {}
+# aciertos de la caché persistente pendientes de guardar (clave -> n)
+_pending_hits: Counter = Counter()
+# _count_hit (event loop) y flush_hits (hilo del threadpool) lo tocan a la vez
+_hits_lock = threading.Lock()
+_flush_task: Optional[asyncio.Future] = None
+
+
+# ====== normalización ======
+def _singular(tok: str) -> str:
+    if len(tok) <= 3:
+        return tok
+    if tok.endswith("ces"):
+        return tok[:-3] + "z"          # nueces -> nuez
+    if tok.endswith("es") and tok[-3] in "lnrj":
+        return tok[:-2]                # limones -> limon, mieles -> miel
+    if tok.endswith("s") and tok[-2] in "aeiou":
+        return tok[:-1]                # huevos -> huevo, tomates -> tomate
+    return tok
+
+def normalizar_alimento(nombre: str) -> str:
+    s = unicodedata.normalize("NFKD", nombre.lower())
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    toks = re.findall(r"[a-z0-9]+", s)
+    toks = [_singular(t) for t in toks if t not in STOPWORDS]
+    return " ".join(sorted(toks))
+
+def _build_synonyms(catalog: Catalog) -> Dict[str, str]:
+    syn: Dict[str, str] = {}
+    for food_id, name in zip(catalog.foods_df["food_id"], catalog.foods_df["name"]):
+        for alias in (str(name), re.sub(r"\(.*?\)", " ", str(name)), str(food_id).replace("_", " ")):
+            key = normalizar_alimento(alias)
+            if key:
+                syn.setdefault(key, str(food_id))
+    for alias, food_id in SINONIMOS_EXTRA.items():
+        if food_id in catalog.foods_by_id:
+            syn.setdefault(normalizar_alimento(alias), food_id)
+    return syn
+
+def _synonyms(catalog: Catalog) -> Dict[str, str]:
+    global _synonym_table
+    version, syn = _synonym_table
+    if version != catalog.version:
+        syn = _build_synonyms(catalog)
+        _synonym_table = (catalog.version, syn)
+    return syn
+
+catalog_store.subscribe(lambda c: _synonyms(c))
+
+
+def parse_macros(texto: str) -> Optional[Tuple[float, float, float]]:
+    """'31, 0, 3.6' (o '31 g de proteína, 0 g ...') -> (P, C, G); None si no hay tres números."""
+    nums = re.findall(r"\d+(?:[.,]\d+)?", texto or "")
+    if len(nums) < 3:
+        return None
+    p, c, f = (float(n.replace(",", ".")) for n in nums[:3])
+    return p, c, f
+
+def _respuesta(p: float, c: float, f: float, source: str, **extra) -> Dict:
+    return {
+        "macros": f"{p:g}, {c:g}, {f:g}",
+        "proteinas_g": p,
+        "carbohidratos_g": c,
+        "grasas_g": f,
+        "source": source,
+        **extra,
+    }
+
+
+# ====== caché persistente ======
+def _read_cache(key: str) -> Optional[Tuple[float, float, float]]:
+    with ready_session() as session:
+        row = session.get(FoodMacrosCache, key)
+        if row is None:
+            return None
+        return row.protein_g, row.carb_g, row.fat_g
+
+def _write_cache(key: str, query: str, macros: Tuple[float, float, float], raw: str) -> None:
+    with ready_session() as session:
+        row = session.get(FoodMacrosCache, key)
+        if row is None:
+            row = FoodMacrosCache(key=key, query=query, protein_g=macros[0], carb_g=macros[1],
+                                  fat_g=macros[2], raw=raw, created_at=datetime.utcnow())
+        else:
+            row.protein_g, row.carb_g, row.fat_g, row.raw = *macros, raw
+        session.add(row)
+        session.commit()
+
+def flush_hits() -> int:
+    """Suma a FoodMacrosCache.hits los aciertos acumulados en memoria; devuelve cuántos."""
+    global _pending_hits
+    with _hits_lock:
+        pending, _pending_hits = _pending_hits, Counter()
+    if not pending:
+        return 0
+    try:
+        with ready_session() as session:
+            for key, n in pending.items():
+                session.exec(update(FoodMacrosCache).where(FoodMacrosCache.key == key)
+                             .values(hits=FoodMacrosCache.hits + n))
+            session.commit()
+    except Exception:
+        # no se pierden: vuelven a quedar pendientes para el siguiente intento
+        with _hits_lock:
+            _pending_hits.update(pending)
+        raise
+    return sum(pending.values())
+
+def _count_hit(key: str) -> None:
+    global _flush_task
+    with _hits_lock:
+        _pending_hits[key] += 1
+        due = sum(_pending_hits.values()) >= MACROS_HITS_FLUSH_EVERY
+    if due and (_flush_task is None or _flush_task.done()):
+        # fuera del camino de la petición: no se espera a la escritura
+        _flush_task = asyncio.ensure_future(asyncio.to_thread(flush_hits))
+
+
+async def _ask_llm(key: str, alimento: str) -> Dict:
+    stats["llm"] += 1
+    raw = await get_macros_from_openrouter(alimento)
+    macros = parse_macros(raw)
+    if macros is None:
+        # respuesta sin formato: se devuelve tal cual y no se guarda
+        stats["llm_unparsed"] += 1
+        return {"macros": raw, "source": "llm"}
+    await asyncio.to_thread(_write_cache, key, alimento, macros, raw)
+    return _respuesta(*macros, source="llm")
+
+async def macros_alimento(alimento: str) -> Dict:
+    key = normalizar_alimento(alimento)
+    stats["requests"] += 1
+
+    catalog = None
+    try:
+        catalog = get_catalog()
+    except Exception:
+        pass  # sin catálogo se sigue con la caché y el LLM
+    if catalog is not None:
+        food_id = _synonyms(catalog).get(key)
+        if food_id is not None:
+            stats["catalog"] += 1
+            food = catalog.foods_by_id[food_id]
+            return _respuesta(float(food["protein_g"]), float(food["carb_g"]), float(food["fat_g"]),
+                              source="catalog", food_id=food_id)
+
+    cached = await asyncio.to_thread(_read_cache, key) if key else None
+    if cached is not None:
+        stats["cache"] += 1
+        _count_hit(key)
+        return _respuesta(*cached, source="cache")
+
+    # peticiones simultáneas del mismo alimento comparten una única consulta al LLM
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_ask_llm(key, alimento))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t: _inflight.pop(key, None))
+    else:
+        stats["coalesced"] += 1
+    return await asyncio.shield(task)
+
+
+def cache_stats() -> Dict:
+    flush_hits()
+    with ready_session() as session:
+        entries = session.exec(select(func.count()).select_from(FoodMacrosCache)).one()
+    total = stats["requests"]
+    served_locally = stats["catalog"] + stats["cache"]
+    return {
+        "entries": entries,
+        "synonyms": len(_synonym_table[1]),
+        "hit_ratio": round(served_locally / total, 4) if total else 0.0,
+        **stats,
+    }
@@ -3,6 +3,17 @@ from dataclasses import dataclass
 from typing import List, Dict, Tuple, Optional
 import pandas as pd
 
+from services.scaling_engine import (
+    FoodTable, MenuBatch, compile_menu, scale_compiled,
+    scale_batch, batch_achieved, approx_scores, preselect, materialize, round_grams_array,
+    scale_batch_raw,
+)
+from services.portion_solver import solve_compiled
+from metrics import stage
+
+# Modos de escalado: ajuste secuencial de siempre u optimizador de porciones
+SCALING_MODES = ("greedy", "solver")
+
 @dataclass
 class Macro:
     kcal: float
@@ -81,95 +92,30 @@ def per_meal_targets(total_kcal: float, p_g: float, c_g: float, f_g: float, sche
         t[meal] = Macro(kcal=kcal, protein_g=P, carb_g=C, fat_g=F)
     return t
 
-def scale_menu_to_targets(menu: Dict, foods_df: pd.DataFrame, targets: Macro) -> Tuple[List[Dict], Dict]:
-    # Index rápido por food_id
-    fdf = foods_df.set_index("food_id")
-
-    # gramos iniciales = base del menú
-    grams_map: Dict[str, float] = {it["food_id"]: float(it["base_g"]) for it in menu["items"]}
-
-    def current_macros() -> Macro:
-        return sum_macros([macros_of(fdf.loc[fid], g) for fid, g in grams_map.items()])
-
-    # grupos por categoría
-    protein_ids = [it["food_id"] for it in menu["items"] if fdf.loc[it["food_id"], "category"] == "PROTEIN"]
-    carb_ids    = [it["food_id"] for it in menu["items"] if fdf.loc[it["food_id"], "category"] == "CARB"]
-    fatflex_ids = [it["food_id"] for it in menu["items"] if fdf.loc[it["food_id"], "category"] == "FAT_FLEX"]
-    fat_ids     = [it["food_id"] for it in menu["items"] if fdf.loc[it["food_id"], "category"] == "FAT"]
-
-    # ===== 1) Ajuste proteína =====
-    cur = current_macros()
-    base_p = sum(macros_of(fdf.loc[fid], grams_map[fid]).protein_g for fid in protein_ids)
-    if base_p > 0:
-        need_from_prot = max(0.0, targets.protein_g - (cur.protein_g - base_p))
-        factor_p = need_from_prot / base_p
-        factor_p = max(0.6, min(3.5, factor_p))  # tope ampliado para llegar mejor
-        for fid in protein_ids:
-            grams_map[fid] *= factor_p
-
-    # ===== 2) Ajuste carbohidratos =====
-    cur = current_macros()
-    base_c = sum(macros_of(fdf.loc[fid], grams_map[fid]).carb_g for fid in carb_ids)
-    other_c = cur.carb_g - base_c
-    if base_c > 0:
-        need_from_carb = max(0.0, targets.carb_g - other_c)
-        factor_c = need_from_carb / base_c
-        factor_c = max(0.6, min(3.5, factor_c))  # tope ampliado
-        for fid in carb_ids:
-            grams_map[fid] *= factor_c
-
-    # ===== 3) Ajuste grasas ===== (usa aceite como FAT_FLEX si existe)
-    cur = current_macros()
-    base_flex = sum(macros_of(fdf.loc[fid], grams_map[fid]).fat_g for fid in fatflex_ids)
-    base_fats = sum(macros_of(fdf.loc[fid], grams_map[fid]).fat_g for fid in fat_ids)
-    other_f = cur.fat_g - base_flex - base_fats
-    need_f = max(0.0, targets.fat_g - other_f)
-    if len(fatflex_ids) > 0:
-        fid = fatflex_ids[0]
-        fat_per_g = fdf.loc[fid, "fat_g"] / 100.0
-        grams_map[fid] = (need_f / fat_per_g) if fat_per_g > 0 else 0.0
-    elif base_fats > 0:
-        factor_f = need_f / base_fats if base_fats > 0 else 1.0
-        factor_f = max(0.6, min(3.0, factor_f))
-        for fid in fat_ids:
-            grams_map[fid] *= factor_f
-
-    # ===== 4) Redondeo práctico =====
-    grams_map = {fid: round_grams(fdf.loc[fid, "category"], g) for fid, g in grams_map.items()}
-
-    # ===== 5) Resultado =====
-    final = current_macros()
-    result_items = []
-    for fid, g in grams_map.items():
-        row = fdf.loc[fid]
-        m = macros_of(row, g)
-        result_items.append({
-            "food_id": fid,
-            "name": row["name"],
-            "grams": g,
-            "kcal": round(m.kcal, 2),
-            "protein_g": round(m.protein_g, 2),
-            "carb_g": round(m.carb_g, 2),
-            "fat_g": round(m.fat_g, 2),
-        })
-    debug = {
-        "target": {"kcal": targets.kcal, "protein_g": targets.protein_g, "carb_g": targets.carb_g, "fat_g": targets.fat_g},
-        "achieved": {"kcal": final.kcal, "protein_g": final.protein_g, "carb_g": final.carb_g, "fat_g": final.fat_g},
-        "errors": {
-            "kcal": round(final.kcal - targets.kcal, 2),
-            "protein_g": round(final.protein_g - targets.protein_g, 2),
-            "carb_g": round(final.carb_g - targets.carb_g, 2),
-            "fat_g": round(final.fat_g - targets.fat_g, 2),
-        }
-    }
-    return result_items, debug
-
-def generate_day_plan(foods_df: pd.DataFrame, menus: list, totals: Dict, scheme: str, selection: Dict[str, str]) -> Dict:
+def scale_menu_to_targets(menu: Dict, foods_df: pd.DataFrame, targets: Macro,
+                          table: Optional[FoodTable] = None, mode: str = "greedy") -> Tuple[List[Dict], Dict]:
+    # greedy: proteína -> carbohidratos -> grasas (FAT_FLEX si existe) -> redondeo práctico,
+    # calculado con el motor vectorizado (services/scaling_engine.py)
+    # solver: mínimos cuadrados acotados + redondeo (services/portion_solver.py)
+    if mode not in SCALING_MODES:
+        raise ValueError(f"Modo de escalado no válido: {mode}. Usa: {', '.join(SCALING_MODES)}")
+    if table is None:
+        table = FoodTable(foods_df)
+    cm = compile_menu(menu, table)
+    if mode == "solver":
+        return solve_compiled(cm, table, targets)
+    return scale_compiled(cm, table, targets)
+
+def generate_day_plan(foods_df: pd.DataFrame, menus: list, totals: Dict, scheme: str, selection: Dict[str, str],
+                      table: Optional[FoodTable] = None, mode: str = "greedy") -> Dict:
+    if table is None:
+        table = FoodTable(foods_df)
     targets = per_meal_targets(totals["kcal"], totals["protein_g"], totals["carb_g"], totals["fat_g"], scheme)
     out: Dict[str, Dict] = {}
     for meal, menu_id in selection.items():
         menu = next(m for m in menus if m["menu_id"] == menu_id)
-        items, dbg = scale_menu_to_targets(menu, foods_df, targets[meal])
+        with stage("scale"):
+            items, dbg = scale_menu_to_targets(menu, foods_df, targets[meal], table, mode)
         out[meal] = {
             "menu_name": menu["menu_name"],
             "items": items,
@@ -184,25 +130,81 @@ def _error_score(err: Dict[str, float]) -> float:
     # suma de errores absolutos de macros; kcal pesa poco
     return abs(err.get("protein_g", 0.0)) + abs(err.get("carb_g", 0.0)) + abs(err.get("fat_g", 0.0)) + abs(err.get("kcal", 0.0)) / 100.0
 
-def generate_all_options(foods_df: pd.DataFrame, menus: list, totals: Dict, scheme: str, top_n: Optional[int] = 5) -> Dict[str, Dict]:
+def _option(cm, items: List[Dict], dbg: Dict) -> Dict:
+    return {
+        "menu_id": cm.menu_id,
+        "menu_name": cm.menu_name,
+        "items": items,
+        "achieved": dbg["achieved"],
+        "errors": dbg["errors"],
+        "score": _error_score(dbg["errors"]),
+    }
+
+def _rank_batch(batch: MenuBatch, table: FoodTable, target: Macro, top_n: Optional[int],
+                raw_grams=None) -> List[Dict]:
+    # Escala y puntúa todos los menús de la comida en una pasada; solo se construyen
+    # los dicts de los candidatos al top N (la puntuación final es la exacta de siempre).
+    # raw_grams: gramos sin redondear ya calculados (tablas precalculadas)
+    if len(batch) == 0:
+        return []
+    with stage("scale"):
+        if raw_grams is not None:
+            grams = round_grams_array(raw_grams, batch.steps)
+        else:
+            grams = scale_batch(batch, target.protein_g, target.carb_g, target.fat_g)
+    with stage("rank"):
+        scores = approx_scores(batch_achieved(batch, grams), target)
+        options = []
+        for i in preselect(scores, top_n):
+            cm = batch.menus[i]
+            items, dbg = materialize(cm, table, grams[i, :len(cm.idx)], target)
+            options.append(_option(cm, items, dbg))
+        options.sort(key=lambda x: x["score"])
+    if top_n is not None:
+        options = options[:top_n]
+    return options
+
+def _rank_solver(batch: MenuBatch, table: FoodTable, target: Macro, top_n: Optional[int],
+                 raw_grams=None) -> List[Dict]:
+    # el optimizador trabaja menú a menú
+    with stage("scale"):
+        options = [_option(cm, *solve_compiled(cm, table, target)) for cm in batch.menus]
+    with stage("rank"):
+        options.sort(key=lambda x: x["score"])
+    if top_n is not None:
+        options = options[:top_n]
+    return options
+
+def generate_all_options(foods_df: pd.DataFrame, menus: list, totals: Dict, scheme: str, top_n: Optional[int] = 5,
+                         table: Optional[FoodTable] = None,
+                         batches: Optional[Dict[str, MenuBatch]] = None, mode: str = "greedy",
+                         option_tables=None) -> Dict[str, Dict]:
+    # option_tables (services/option_tables.py) deben corresponder a `batches`
+    # (misma versión de catálogo); solo se usan en modo greedy
+    if mode not in SCALING_MODES:
+        raise ValueError(f"Modo de escalado no válido: {mode}. Usa: {', '.join(SCALING_MODES)}")
+    rank = _rank_solver if mode == "solver" else _rank_batch
+    if table is None:
+        table = FoodTable(foods_df)
     targets = per_meal_targets(totals["kcal"], totals["protein_g"], totals["carb_g"], totals["fat_g"], scheme)
     out: Dict[str, Dict] = {}
     for meal in DISTS[scheme].keys():
-        options = []
-        for m in menus:
-            if m.get("meal_type") != meal:
-                continue
-            items, dbg = scale_menu_to_targets(m, foods_df, targets[meal])
-            options.append({
-                "menu_id": m["menu_id"],
-                "menu_name": m["menu_name"],
-                "items": items,
-                "achieved": dbg["achieved"],
-                "errors": dbg["errors"],
-                "score": _error_score(dbg["errors"]),
-            })
-        options.sort(key=lambda x: x["score"])
-        if top_n is not None:
-            options = options[:top_n]
-        out[meal] = {"target": vars(targets[meal]), "options": options}
+        if batches is not None:
+            batch = batches.get(meal) or MenuBatch.build([], table)
+        else:
+            batch = MenuBatch.build([m for m in menus if m.get("meal_type") == meal], table)
+        t = targets[meal]
+        raw = None
+        if option_tables is not None and mode == "greedy" and meal in option_tables.meals:
+            with stage("scale"):
+                hit = option_tables.meals[meal].lookup(t.protein_g, t.carb_g, t.fat_g)
+                if hit is not None:
+                    raw, redo = hit
+                    if redo.size:
+                        raw[redo] = scale_batch_raw(batch.subset(redo), t.protein_g, t.carb_g, t.fat_g)
+        out[meal] = {
+            "target": vars(t),
+            "options": rank(batch, table, t, top_n, raw),
+            "source": "table" if raw is not None else "exact",
+        }
     return out
@@ -0,0 +1,273 @@
+# services/off_import.py
+"""
+Importador del volcado completo de OpenFoodFacts a la caché local (product_store).
+
+Lee el fichero en streaming (JSONL o CSV/TSV, opcionalmente .gz) con una cadena
+de generadores, así que la memoria no depende del tamaño del volcado:
+
+    líneas -> registros -> filtro país/idioma -> filas OFFProduct -> lotes
+
+Cada lote se inserta en una transacción y, tras el commit, se guarda un punto de
+control (posición en el fichero) en <volcado>.import-state.json; con --resume se
+continúa desde ahí. Si cambia el fichero o los filtros, se empieza de cero.
+
+Uso (desde eatbalance-backend):
+    python -m services.off_import openfoodfacts-products.jsonl.gz --country spain --lang es
+    python -m services.off_import en.openfoodfacts.org.products.csv.gz --resume
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlmodel import Session
+
+from db import create_db_and_tables, engine
+from services import product_store
+
+DEFAULT_BATCH_SIZE = 5000
+PROGRESS_EVERY_S = 5.0
+
+# nutrientes que usa la app (mismos que openfoodfacts._nutrientes)
+NUTRIENT_FIELDS = {
+    "calorias": "energy-kcal_100g",
+    "proteinas": "proteins_100g",
+    "grasas": "fat_100g",
+    "carbohidratos": "carbohydrates_100g",
+    "azucares": "sugars_100g",
+}
+
+# los campos del CSV de OFF pueden ser muy largos (ingredientes, etc.)
+csv.field_size_limit(sys.maxsize)
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    imported: int = 0
+    filtered: int = 0
+    invalid: int = 0
+    batches: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def line(self, pos: int, size: int) -> str:
+        dt = max(time.perf_counter() - self.started, 1e-9)
+        pct = f"{100.0 * pos / size:5.1f}%" if size else "  ?  "
+        return (f"{pct} leídos={self.read} importados={self.imported} filtrados={self.filtered} "
+                f"inválidos={self.invalid} | {self.read / dt:,.0f} reg/s, {pos / dt / 1e6:.1f} MB/s")
+
+
+# ====== lectura en streaming ======
+def _open(path: Path):
+    """(stream binario descomprimido, fichero en disco) para medir el progreso sobre el tamaño real."""
+    raw = open(path, "rb")
+    if path.suffix == ".gz":
+        return gzip.GzipFile(fileobj=raw, mode="rb"), raw
+    return raw, raw
+
+def _is_jsonl(path: Path) -> bool:
+    name = path.name[:-3] if path.name.endswith(".gz") else path.name
+    return name.endswith((".jsonl", ".json", ".ndjson"))
+
+def iter_lines(stream, start: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """(posición tras la línea, línea) desde start; en un .gz las posiciones son del contenido descomprimido."""
+    if start:
+        stream.seek(start)
+    pos = start
+    for line in stream:
+        pos += len(line)
+        yield pos, line
+
+def _float(v) -> Optional[float]:
+    if v is None or v == "":
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def parse_jsonl(lines: Iterable[Tuple[int, bytes]], prefilter: Optional[bytes], stats: ImportStats) -> Iterator[Tuple[int, Optional[Dict]]]:
+    for pos, line in lines:
+        stats.read += 1
+        # descarte barato antes de parsear: la etiqueta del país tiene que aparecer en la línea
+        if prefilter is not None and prefilter not in line:
+            stats.filtered += 1
+            yield pos, None
+            continue
+        try:
+            p = json.loads(line)
+        except ValueError:
+            stats.invalid += 1
+            yield pos, None
+            continue
+        yield pos, p
+
+def parse_csv(header: List[str], lines: Iterable[Tuple[int, bytes]], stats: ImportStats) -> Iterator[Tuple[int, Optional[Dict]]]:
+    # el CSV de OFF va separado por tabuladores y sin comillas
+    delimiter = "\t" if len(header) > 1 or "\t" in header[0] else ","
+    for pos, line in lines:
+        stats.read += 1
+        text = line.decode("utf-8", errors="replace").rstrip("\r\n")
+        row = next(csv.reader([text], delimiter=delimiter, quoting=csv.QUOTE_NONE if delimiter == "\t" else csv.QUOTE_MINIMAL), [])
+        if len(row) != len(header):
+            stats.invalid += 1
+            yield pos, None
+            continue
+        r = dict(zip(header, row))
+        # mismo formato que el JSONL para el resto de la cadena
+        r["countries_tags"] = [t for t in r.get("countries_tags", "").split(",") if t]
+        r["nutriments"] = {f: r.get(f) for f in NUTRIENT_FIELDS.values()}
+        yield pos, r
+
+def read_csv_header(stream) -> Tuple[List[str], int]:
+    first = stream.readline()
+    text = first.decode("utf-8", errors="replace").rstrip("\r\n")
+    delimiter = "\t" if "\t" in text else ","
+    return next(csv.reader([text], delimiter=delimiter)), len(first)
+
+
+# ====== filtros y normalización ======
+def country_tag(country: Optional[str]) -> Optional[str]:
+    if not country:
+        return None
+    c = product_store.normalizar_termino(country).replace(" ", "-")
+    return c if ":" in c else f"en:{c}"
+
+def to_row(p: Dict, country: Optional[str], lang: Optional[str], now: datetime, stats: ImportStats) -> Optional[Dict]:
+    if country and country not in (p.get("countries_tags") or []):
+        stats.filtered += 1
+        return None
+    if lang and p.get("lang") and p.get("lang") != lang:
+        stats.filtered += 1
+        return None
+    code = str(p.get("code") or "").strip()
+    nutriments = p.get("nutriments") or {}
+    n = {k: _float(nutriments.get(f)) for k, f in NUTRIENT_FIELDS.items()}
+    if not code or all(v is None for v in n.values()):
+        stats.invalid += 1
+        return None
+    name = (lang and p.get(f"product_name_{lang}")) or p.get("product_name") or "Desconocido"
+    item = {"id": code, "nombre": name, "marca": p.get("brands") or "N/A", "nutrientes_por_100g": n}
+    return product_store._row_from_item(item, "dump", now)
+
+def batched(records: Iterable[Tuple[int, Optional[Dict]]], size: int) -> Iterator[Tuple[int, List[Dict]]]:
+    """Lotes de filas válidas junto con la posición del fichero tras el último registro leído."""
+    batch: List[Dict] = []
+    pos = None
+    for pos, row in records:
+        if row is not None:
+            batch.append(row)
+        if len(batch) >= size:
+            yield pos, batch
+            batch = []
+    if pos is not None:
+        yield pos, batch
+
+
+# ====== punto de control ======
+def state_path(path: Path) -> Path:
+    return path.with_name(path.name + ".import-state.json")
+
+def _fingerprint(path: Path, country: Optional[str], lang: Optional[str]) -> Dict:
+    st = path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "country": country, "lang": lang}
+
+def load_state(path: Path, fingerprint: Dict) -> Optional[Dict]:
+    try:
+        state = json.loads(state_path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return state if state.get("fingerprint") == fingerprint else None
+
+def save_state(path: Path, state: Dict) -> None:
+    tmp = state_path(path).with_suffix(".tmp")
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp, state_path(path))
+
+
+# ====== importación ======
+def import_dump(path, country: Optional[str] = None, lang: Optional[str] = None,
+                batch_size: int = DEFAULT_BATCH_SIZE, resume: bool = False,
+                limit: Optional[int] = None, progress: bool = True) -> ImportStats:
+    path = Path(path)
+    country = country_tag(country)
+    fingerprint = _fingerprint(path, country, lang)
+    state = load_state(path, fingerprint) if resume else None
+    if state and state.get("done"):
+        print(f"{path.name}: ya importado ({state['imported']} productos)")
+        return ImportStats(read=state["read"], imported=state["imported"])
+
+    create_db_and_tables()
+    product_store.ensure_search_index()
+    stats = ImportStats()
+    start = 0
+    if state:
+        start = state["offset"]
+        stats.read, stats.imported = state["read"], state["imported"]
+        print(f"Reanudando {path.name} en el byte {start} ({stats.read} registros leídos)")
+
+    stream, raw = _open(path)
+    size = fingerprint["size"]
+    now = datetime.utcnow()
+    last_report = time.perf_counter()
+    try:
+        if _is_jsonl(path):
+            prefilter = f'"{country}"'.encode() if country else None
+            records = parse_jsonl(iter_lines(stream, start), prefilter, stats)
+        else:
+            stream.seek(0)
+            header, header_len = read_csv_header(stream)
+            records = parse_csv(header, iter_lines(stream, max(start, header_len)), stats)
+        rows = ((pos, to_row(p, country, lang, now, stats) if p is not None else None) for pos, p in records)
+
+        for pos, batch in batched(rows, batch_size):
+            truncated = limit is not None and stats.imported + len(batch) > limit
+            if truncated:
+                batch = batch[:limit - stats.imported]
+            with Session(engine) as session:
+                stats.imported += product_store.upsert_products(session, batch)
+                session.commit()
+            stats.batches += 1
+            # un lote recortado por --limit no avanza el punto de control (el upsert es idempotente)
+            if not truncated:
+                save_state(path, {"fingerprint": fingerprint, "offset": pos, "read": stats.read,
+                                  "imported": stats.imported, "done": False})
+            if progress and time.perf_counter() - last_report >= PROGRESS_EVERY_S:
+                print(stats.line(raw.tell(), size), flush=True)
+                last_report = time.perf_counter()
+            if limit is not None and stats.imported >= limit:
+                return stats
+        save_state(path, {"fingerprint": fingerprint, "offset": size, "read": stats.read,
+                          "imported": stats.imported, "done": True})
+    finally:
+        stream.close()
+        raw.close()
+    if progress:
+        print(stats.line(size, size))
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Importa un volcado de OpenFoodFacts (JSONL/CSV, .gz) a la caché local")
+    ap.add_argument("dump", type=Path)
+    ap.add_argument("--country", help="Solo productos vendidos en este país (p.ej. spain o en:spain)")
+    ap.add_argument("--lang", help="Solo productos con este idioma principal (p.ej. es)")
+    ap.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    ap.add_argument("--resume", action="store_true", help="Continuar desde el último lote guardado")
+    ap.add_argument("--limit", type=int, help="Parar tras importar N productos")
+    args = ap.parse_args()
+
+    stats = import_dump(args.dump, args.country, args.lang, args.batch_size, args.resume, args.limit)
+    dt = time.perf_counter() - stats.started
+    print(f"{stats.imported} productos importados en {stats.batches} lotes ({dt:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# services/option_tables.py
+"""
+Tablas precalculadas de opciones por comida para /plan/generate_all.
+
+El escalado de un menú solo depende del objetivo (P, C, G) de la comida, y los
+gramos sin redondear son lineales a trozos en ese objetivo. Por eso basta una
+rejilla 3D por meal_type (válida para todos los esquemas de DISTS): en cada
+punto se guardan los gramos sin redondear de cada menú. En la petición se
+interpolan (trilineal), se redondean y se puntúan como siempre; si el objetivo
+cae fuera de la rejilla se calcula de forma exacta.
+
+La interpolación solo es exacta en celdas donde el menú es lineal (sin cambios
+de tramo por los topes o el max(0, ...)). Al construir se comprueba el centro
+de cada celda y se marca como "segura"; los menús que caen en una celda no
+segura se calculan de forma exacta.
+
+Construcción (desde eatbalance-backend):
+    python -m services.option_tables build [--points 17] [--out data/option_tables.npz]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+from services.catalog import BASE_DIR, Catalog
+from services.menu_generator import DISTS
+from services.scaling_engine import scale_batch_raw
+
+OPTION_TABLES_PATH = Path(os.getenv("OPTION_TABLES_PATH", str(BASE_DIR / "data" / "option_tables.npz")))
+DEFAULT_POINTS = 17
+# Diferencia máxima (g) entre interpolado y exacto en el centro para dar una celda por lineal
+LINEAR_TOL_G = 0.01
+
+# Rango de totales diarios (g) que cubre la rejilla; se multiplica por los pesos de DISTS
+DAILY_RANGE = {
+    "protein_g": (40.0, 300.0),
+    "carb_g": (50.0, 700.0),
+    "fat_g": (20.0, 200.0),
+}
+_MACROS = ("protein_g", "carb_g", "fat_g")
+
+
+def meal_axes(meal: str, points: int = DEFAULT_POINTS) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Ejes P, C, G de la rejilla de una comida (None si ningún esquema la usa)."""
+    weights = [DISTS[s][meal] for s in DISTS if meal in DISTS[s]]
+    if not weights:
+        return None
+    axes = []
+    for k in _MACROS:
+        lo = DAILY_RANGE[k][0] * min(w[k] for w in weights)
+        hi = DAILY_RANGE[k][1] * max(w[k] for w in weights)
+        axes.append(np.linspace(lo, hi, points))
+    return tuple(axes)
+
+
+@dataclass(frozen=True)
+class MealGrid:
+    axes: Tuple[np.ndarray, np.ndarray, np.ndarray]
+    grams: np.ndarray   # (M, nP, nC, nF, K) gramos sin redondear
+    safe: np.ndarray    # (M, nP-1, nC-1, nF-1) celda lineal para ese menú
+
+    def lookup(self, p: float, c: float, f: float) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(gramos sin redondear (M, K) interpolados, filas a recalcular), o None fuera de la rejilla."""
+        idx, frac = [], []
+        for ax, v in zip(self.axes, (p, c, f)):
+            if not (ax[0] <= v <= ax[-1]):
+                return None
+            step = ax[1] - ax[0]
+            i = min(int((v - ax[0]) / step), len(ax) - 2)
+            idx.append(i)
+            frac.append((v - ax[i]) / step)
+        (i, j, k), (tp, tc, tf) = idx, frac
+        cube = self.grams[:, i:i + 2, j:j + 2, k:k + 2, :].astype(np.float64)
+        cube = cube[:, 0] * (1 - tp) + cube[:, 1] * tp
+        cube = cube[:, 0] * (1 - tc) + cube[:, 1] * tc
+        raw = cube[:, 0] * (1 - tf) + cube[:, 1] * tf
+        return raw, np.flatnonzero(~self.safe[:, i, j, k])
+
+
+@dataclass(frozen=True)
+class OptionTables:
+    catalog_version: str
+    points: int
+    meals: Mapping[str, MealGrid]
+
+
+def build_tables(catalog: Catalog, points: int = DEFAULT_POINTS) -> OptionTables:
+    meals: Dict[str, MealGrid] = {}
+    for meal, batch in catalog.meal_batches.items():
+        axes = meal_axes(meal, points)
+        if axes is None or len(batch) == 0:
+            continue
+        P, C, F = axes
+        M, K = batch.base_g.shape
+        grams = np.empty((M, points, points, points, K), dtype=np.float32)
+        for a, p in enumerate(P):
+            for b, c in enumerate(C):
+                for d, f in enumerate(F):
+                    grams[:, a, b, d, :] = scale_batch_raw(batch, p, c, f)
+        # celda lineal si el centro exacto coincide con la media de sus 8 esquinas
+        g = grams.astype(np.float64)
+        corners = sum(
+            g[:, a:points - 1 + a, b:points - 1 + b, d:points - 1 + d, :]
+            for a in (0, 1) for b in (0, 1) for d in (0, 1)
+        ) / 8.0
+        safe = np.empty((M, points - 1, points - 1, points - 1), dtype=bool)
+        mid = [(ax[:-1] + ax[1:]) / 2.0 for ax in axes]
+        for a, p in enumerate(mid[0]):
+            for b, c in enumerate(mid[1]):
+                for d, f in enumerate(mid[2]):
+                    diff = np.abs(scale_batch_raw(batch, p, c, f) - corners[:, a, b, d, :])
+                    safe[:, a, b, d] = diff.max(axis=1, initial=0.0) <= LINEAR_TOL_G
+        meals[meal] = MealGrid(axes, grams, safe)
+    return OptionTables(catalog.version, points, meals)
+
+
+def save_tables(tables: OptionTables, path: Path = OPTION_TABLES_PATH) -> None:
+    arrays = {}
+    meta = {"catalog_version": tables.catalog_version, "points": tables.points, "meals": {}}
+    for meal, grid in tables.meals.items():
+        meta["meals"][meal] = [[float(ax[0]), float(ax[-1])] for ax in grid.axes]
+        arrays[f"grams__{meal}"] = grid.grams
+        arrays[f"safe__{meal}"] = grid.safe
+    np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+
+
+def load_tables(path: Path = OPTION_TABLES_PATH) -> OptionTables:
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        points = int(meta["points"])
+        meals = {
+            meal: MealGrid(
+                tuple(np.linspace(lo, hi, points) for lo, hi in ranges),
+                data[f"grams__{meal}"],
+                data[f"safe__{meal}"],
+            )
+            for meal, ranges in meta["meals"].items()
+        }
+    return OptionTables(meta["catalog_version"], points, meals)
+
+
+class OptionTablesStore:
+    """Carga perezosa del fichero; solo se usa si coincide con la versión del catálogo."""
+
+    def __init__(self, path: Path = OPTION_TABLES_PATH):
+        self.path = Path(path)
+        self._tables: Optional[OptionTables] = None
+        self._mtime: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self, catalog: Catalog) -> Optional[OptionTables]:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    self._tables = load_tables(self.path)
+                except Exception as e:
+                    print("No se pudieron cargar las tablas de opciones:", e)
+                    self._tables = None
+                self._mtime = mtime
+            tables = self._tables
+        if tables is None or tables.catalog_version != catalog.version:
+            return None
+        return tables
+
+
+store = OptionTablesStore()
+
+
+def main():
+    from services.catalog import get_catalog
+
+    ap = argparse.ArgumentParser(description="Tablas precalculadas de opciones por comida")
+    ap.add_argument("command", choices=["build"])
+    ap.add_argument("--points", type=int, default=DEFAULT_POINTS, help="Puntos por eje de la rejilla")
+    ap.add_argument("--out", type=Path, default=OPTION_TABLES_PATH)
+    args = ap.parse_args()
+
+    catalog = get_catalog()
+    t0 = time.perf_counter()
+    tables = build_tables(catalog, args.points)
+    save_tables(tables, args.out)
+    size_kb = args.out.stat().st_size / 1024
+    print(f"{len(tables.meals)} comidas, {args.points}^3 puntos, catálogo {catalog.version}: "
+          f"{args.out} ({size_kb:.0f} KB) en {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# services/password_hasher.py
+"""
+bcrypt de /auth/login y /auth/register fuera del event loop y del threadpool
+del servidor: un pool de procesos propio y acotado.
+
+- Admisión global: como mucho HASH_WORKERS + HASH_MAX_QUEUE operaciones a la
+  vez; si no hay hueco en HASH_QUEUE_TIMEOUT_S se rechaza (503 en el router).
+- Admisión por clave: como mucho HASH_MAX_PER_IP operaciones simultáneas por IP
+  y HASH_MAX_PER_EMAIL por email (429 en el router); una ráfaga desde un mismo
+  origen no acapara el pool.
+- Las plazas (global y por clave) se devuelven cuando el bcrypt termina, no
+  cuando la petición deja de esperarlo (cliente desconectado): una tarea que
+  ya corre en un proceso no se puede interrumpir.
+- verify() usa pwd_context.verify_and_update: si el hash se hizo con otro coste
+  (BCRYPT_ROUNDS) devuelve también el hash nuevo para guardarlo.
+- Con HASH_WORKERS=0 se calcula en el threadpool, como antes.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+from security import pwd_context
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "16"))
+HASH_QUEUE_TIMEOUT_S = float(os.getenv("HASH_QUEUE_TIMEOUT_S", "1"))
+# operaciones simultáneas por IP / por email (0 = sin límite)
+HASH_MAX_PER_IP = int(os.getenv("HASH_MAX_PER_IP", "4"))
+HASH_MAX_PER_EMAIL = int(os.getenv("HASH_MAX_PER_EMAIL", "2"))
+
+
+class HashOverloaded(Exception):
+    pass
+
+
+class HashRateLimited(Exception):
+    pass
+
+
+# ====== tareas (se ejecutan en el proceso del pool o en el threadpool) ======
+def task_hash(password: str) -> Tuple[str, float]:
+    t0 = time.perf_counter()
+    return pwd_context.hash(password), time.perf_counter() - t0
+
+def task_verify(password: str, hashed: str) -> Tuple[Tuple[bool, Optional[str]], float]:
+    t0 = time.perf_counter()
+    try:
+        result = pwd_context.verify_and_update(password, hashed)
+    except ValueError:
+        # hash vacío o con formato desconocido: credenciales inválidas
+        result = (False, None)
+    return result, time.perf_counter() - t0
+
+
+# ====== ejecutor ======
+class PasswordHasher:
+    def __init__(self, workers: int = HASH_WORKERS, max_queue: int = HASH_MAX_QUEUE,
+                 queue_timeout_s: float = HASH_QUEUE_TIMEOUT_S,
+                 max_per_ip: int = HASH_MAX_PER_IP, max_per_email: int = HASH_MAX_PER_EMAIL):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.max_per_ip = max_per_ip
+        self.max_per_email = max_per_email
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self._per_key: Counter = Counter()   # ("ip"|"email", valor) -> operaciones en curso
+        self._key_lock = threading.Lock()
+        self.waiting = 0
+        self.inflight = 0
+        self.counters: Counter = Counter()
+        self.exec_s_total = 0.0
+        self.wait_s_total = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return max(1, self.workers) + self.max_queue
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def start(self) -> None:
+        if self.workers > 0:
+            pool = self._get_pool()
+            for _ in range(self.workers):
+                pool.submit(time.sleep, 0)
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _admission(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._loop is not loop:
+            self._loop = loop
+            self._sem = asyncio.Semaphore(self.capacity)
+        return self._sem
+
+    def _acquire_keys(self, ip: Optional[str], email: Optional[str]) -> List[Tuple[str, str]]:
+        limited = []
+        if ip and self.max_per_ip > 0:
+            limited.append((("ip", ip), self.max_per_ip))
+        if email and self.max_per_email > 0:
+            limited.append((("email", email.lower()), self.max_per_email))
+        with self._key_lock:
+            if any(self._per_key[k] >= limit for k, limit in limited):
+                self.counters["rate_limited"] += 1
+                raise HashRateLimited()
+            for k, _ in limited:
+                self._per_key[k] += 1
+        return [k for k, _ in limited]
+
+    def _release_keys(self, keys: List[Tuple[str, str]]) -> None:
+        with self._key_lock:
+            for k in keys:
+                self._per_key[k] -= 1
+                if self._per_key[k] <= 0:
+                    del self._per_key[k]
+
+    def _broken_pool(self) -> HashOverloaded:
+        self.counters["broken_pool"] += 1
+        self.shutdown()
+        return HashOverloaded()
+
+    async def _run(self, fn, *args, ip: Optional[str] = None, email: Optional[str] = None) -> Any:
+        keys = self._acquire_keys(ip, email)
+        sem = self._admission()
+        t0 = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(sem.acquire(), self.queue_timeout_s)
+        except BaseException as e:
+            self._release_keys(keys)
+            if isinstance(e, asyncio.TimeoutError):
+                self.counters["rejected"] += 1
+                raise HashOverloaded()
+            raise
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+
+        # plaza global y por clave hasta que el bcrypt termina, no hasta que la petición deja de esperarlo
+        def release(f: Optional[asyncio.Future] = None) -> None:
+            self.inflight -= 1
+            sem.release()
+            self._release_keys(keys)
+            if f is not None and not f.cancelled():
+                f.exception()  # resultado ya descartado: sin aviso de excepción no recogida
+
+        cf = None
+        try:
+            if self.workers > 0:
+                cf = self._get_pool().submit(fn, *args)
+                fut = asyncio.wrap_future(cf)
+            else:
+                fut = asyncio.ensure_future(run_in_threadpool(fn, *args))
+        except BrokenProcessPool:
+            release()
+            raise self._broken_pool()
+        except BaseException:
+            release()
+            raise
+        fut.add_done_callback(release)
+        try:
+            # shield: si la petición se cancela (cliente desconectado), el trabajo sigue y conserva su plaza
+            result, exec_s = await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            # si aún no ha empezado se cancela (y libera la plaza); si ya corre, termina y se descarta
+            if cf is not None:
+                cf.cancel()
+            raise
+        except BrokenProcessPool:
+            raise self._broken_pool()
+        wait_s = max(0.0, time.perf_counter() - t0 - exec_s)
+        self.counters["completed"] += 1
+        self.exec_s_total += exec_s
+        self.wait_s_total += wait_s
+        metrics.merge({"hash_queue": wait_s, "hash": exec_s})
+        return result
+
+    async def hash(self, password: str, ip: Optional[str] = None, email: Optional[str] = None) -> str:
+        return await self._run(task_hash, password, ip=ip, email=email)
+
+    async def verify(self, password: str, hashed: str, ip: Optional[str] = None,
+                     email: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+        """(contraseña correcta, hash nuevo si hay que rehacerlo con el coste actual)."""
+        ok, new_hash = await self._run(task_verify, password, hashed, ip=ip, email=email)
+        if new_hash:
+            self.counters["rehashed"] += 1
+        return ok, new_hash
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.counters["completed"]
+        return {
+            "mode": "process" if self.workers > 0 else "thread",
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "inflight": self.inflight,
+            "waiting_admission": self.waiting,
+            "max_per_ip": self.max_per_ip,
+            "max_per_email": self.max_per_email,
+            **self.counters,
+            "exec_ms_avg": round(1000 * self.exec_s_total / done, 2) if done else 0.0,
+            "wait_ms_avg": round(1000 * self.wait_s_total / done, 2) if done else 0.0,
+        }
+
+
+password_hasher = PasswordHasher()
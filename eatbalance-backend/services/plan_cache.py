@@ -0,0 +1,101 @@
+# services/plan_cache.py
+"""
+Caché LRU + TTL de resultados de generate_all_options / generate_day_plan.
+
+La clave usa los totales diarios de macros. Por defecto (PLAN_CACHE_QUANTUM_G=0)
+no se cuantizan: solo aciertan totales idénticos y la respuesta es la misma
+que sin caché. Con una tolerancia > 0 la clave y el plan se calculan con los
+totales cuantizados (los objetivos por comida son lineales en ellos): acierta
+más, pero cualquier petición del mismo "cubo" recibe los objetivos del cubo,
+no los suyos exactos.
+
+La clave incluye la versión del catálogo y la caché se vacía al recargarlo.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "1024"))
+PLAN_CACHE_TTL_S = float(os.getenv("PLAN_CACHE_TTL_S", "300"))
+# Tolerancia de cuantización de los totales de macros (gramos); 0 = sin cuantizar
+PLAN_CACHE_QUANTUM_G = float(os.getenv("PLAN_CACHE_QUANTUM_G", "0"))
+
+
+class PlanCache:
+    def __init__(self, maxsize: int = PLAN_CACHE_SIZE, ttl_s: float = PLAN_CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires, value = entry
+            if expires < now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._data)
+        total = self.hits + self.misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "quantum_g": PLAN_CACHE_QUANTUM_G,
+        }
+
+
+def _q(x: float, step: float) -> float:
+    return round(x / step) * step if step > 0 else x
+
+def quantize_totals(totals: Dict[str, float], quantum_g: float = PLAN_CACHE_QUANTUM_G) -> Dict[str, float]:
+    return {
+        "kcal": totals["kcal"],
+        "protein_g": _q(totals["protein_g"], quantum_g),
+        "carb_g": _q(totals["carb_g"], quantum_g),
+        "fat_g": _q(totals["fat_g"], quantum_g),
+    }
+
+def totals_key(totals: Dict[str, float]) -> Tuple[float, float, float]:
+    # per_meal_targets deriva las kcal de P/C/G: las kcal totales no cambian el resultado
+    return (totals["protein_g"], totals["carb_g"], totals["fat_g"])
+
+
+plan_cache = PlanCache()
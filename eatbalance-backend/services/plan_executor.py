@@ -0,0 +1,212 @@
+# services/plan_executor.py
+"""
+Ejecución de la generación de planes (/plan/generate, /generate_all, /best_day)
+en un pool de procesos, para que el cálculo con NumPy/pandas no compita por el
+GIL con los endpoints ligeros.
+
+- Cada proceso carga el catálogo (y las tablas de opciones) en el initializer
+  y lo mantiene al día con su propio CatalogStore.
+- Admisión acotada: como mucho PLAN_WORKERS + PLAN_MAX_QUEUE tareas a la vez;
+  si no hay hueco en PLAN_QUEUE_TIMEOUT_S se rechaza (503 en el router). La
+  plaza se devuelve cuando el trabajo termina, no cuando la petición deja de
+  esperarlo (timeout o cliente desconectado): una tarea que ya corre en un
+  proceso no se puede interrumpir y sigue ocupándolo.
+- Con PLAN_WORKERS=0 se calcula en el threadpool del servidor, como antes.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+from services.catalog import get_catalog, store as catalog_store
+from services.day_search import best_day_plan
+from services.menu_generator import generate_all_options, generate_day_plan
+from services.option_tables import store as option_tables_store
+
+PLAN_WORKERS = int(os.getenv("PLAN_WORKERS", str(min(4, os.cpu_count() or 1))))
+PLAN_MAX_QUEUE = int(os.getenv("PLAN_MAX_QUEUE", "32"))
+PLAN_QUEUE_TIMEOUT_S = float(os.getenv("PLAN_QUEUE_TIMEOUT_S", "2"))
+# cuenta desde que se admite la tarea (incluye la espera en la cola del pool)
+PLAN_TASK_TIMEOUT_S = float(os.getenv("PLAN_TASK_TIMEOUT_S", "30"))
+
+
+class PlanOverloaded(Exception):
+    pass
+
+
+class PlanTimeout(Exception):
+    pass
+
+
+# ====== tareas (se ejecutan en el proceso del pool o en el threadpool) ======
+def _init_worker():
+    catalog = get_catalog()
+    option_tables_store.get(catalog)
+
+def _catalog_for(version: str):
+    with metrics.stage("load"):
+        catalog = get_catalog()
+        if catalog.version != version:
+            # el proceso aún no ha visto el cambio de foods.csv/menus.json
+            catalog = catalog_store.reload()
+    return catalog
+
+# cada tarea devuelve (versión de catálogo, resultado, segundos, etapas medidas en el proceso)
+def task_generate(version: str, totals: Dict, scheme: str, selection: Dict[str, str], mode: str):
+    t0 = time.perf_counter()
+    with metrics.collect() as timings:
+        catalog = _catalog_for(version)
+        plan = generate_day_plan(foods_df=catalog.foods_df, menus=catalog.menus, totals=totals, scheme=scheme,
+                                 selection=selection, table=catalog.food_table, mode=mode)
+    return catalog.version, plan, time.perf_counter() - t0, timings.stages
+
+def task_generate_all(version: str, totals: Dict, scheme: str, top_n: Optional[int], mode: str):
+    t0 = time.perf_counter()
+    with metrics.collect() as timings:
+        catalog = _catalog_for(version)
+        plan = generate_all_options(foods_df=catalog.foods_df, menus=catalog.menus, totals=totals, scheme=scheme,
+                                    top_n=top_n, table=catalog.food_table, batches=catalog.meal_batches, mode=mode,
+                                    option_tables=option_tables_store.get(catalog))
+    return catalog.version, plan, time.perf_counter() - t0, timings.stages
+
+def task_best_day(version: str, totals: Dict, scheme: str, mode: str, beam_width: int, time_budget_ms: float):
+    t0 = time.perf_counter()
+    with metrics.collect() as timings:
+        catalog = _catalog_for(version)
+        result = best_day_plan(catalog.food_table, catalog.meal_batches, totals, scheme,
+                               mode=mode, beam_width=beam_width, time_budget_ms=time_budget_ms)
+    return catalog.version, result, time.perf_counter() - t0, timings.stages
+
+
+# ====== ejecutor ======
+class PlanExecutor:
+    def __init__(self, workers: int = PLAN_WORKERS, max_queue: int = PLAN_MAX_QUEUE,
+                 queue_timeout_s: float = PLAN_QUEUE_TIMEOUT_S, task_timeout_s: float = PLAN_TASK_TIMEOUT_S):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.task_timeout_s = task_timeout_s
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self.waiting = 0    # esperando plaza de admisión
+        self.inflight = 0   # admitidas (en cola del pool o ejecutándose)
+        self.counters: Counter = Counter()
+        self.exec_s_total = 0.0
+        self.exec_s_max = 0.0
+        self.wait_s_total = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return max(1, self.workers) + self.max_queue
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            return self._pool
+
+    def start(self) -> None:
+        """Arranca los procesos ya (el initializer carga el catálogo) en vez de en la primera petición."""
+        if self.workers > 0:
+            pool = self._get_pool()
+            for _ in range(self.workers):
+                pool.submit(time.sleep, 0)
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _admission(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._loop is not loop:
+            self._loop = loop
+            self._sem = asyncio.Semaphore(self.capacity)
+        return self._sem
+
+    async def run(self, fn: Callable[..., Tuple[str, Any, float, Dict[str, float]]], *args) -> Tuple[str, Any]:
+        """Ejecuta fn(*args) -> (versión, resultado, segundos, etapas) y devuelve (versión, resultado)."""
+        sem = self._admission()
+        t0 = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(sem.acquire(), self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            self.counters["rejected"] += 1
+            raise PlanOverloaded()
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+
+        def release(f: asyncio.Future) -> None:
+            self.inflight -= 1
+            sem.release()
+            if not f.cancelled():
+                f.exception()  # resultado ya descartado: sin aviso de excepción no recogida
+
+        cf = None
+        try:
+            if self.workers > 0:
+                cf = self._get_pool().submit(fn, *args)
+                fut = asyncio.wrap_future(cf)
+            else:
+                fut = asyncio.ensure_future(run_in_threadpool(fn, *args))
+        except BaseException:
+            self.inflight -= 1
+            sem.release()
+            raise
+        fut.add_done_callback(release)
+        try:
+            # shield: si la petición deja de esperar, el trabajo sigue y conserva su plaza
+            version, result, exec_s, stages = await asyncio.wait_for(asyncio.shield(fut), self.task_timeout_s)
+        except asyncio.TimeoutError:
+            # si aún no ha empezado se cancela (y libera la plaza); si ya corre, termina y se descarta
+            if cf is not None:
+                cf.cancel()
+            self.counters["timeouts"] += 1
+            raise PlanTimeout()
+        except asyncio.CancelledError:
+            if cf is not None:
+                cf.cancel()
+            raise
+        except BrokenProcessPool:
+            # un proceso murió (p.ej. sin memoria): se recrea el pool para las siguientes
+            self.counters["broken_pool"] += 1
+            self.shutdown()
+            raise PlanOverloaded()
+        total_s = time.perf_counter() - t0
+        wait_s = max(0.0, total_s - exec_s)
+        self.counters["completed"] += 1
+        self.exec_s_total += exec_s
+        self.exec_s_max = max(self.exec_s_max, exec_s)
+        self.wait_s_total += wait_s
+        metrics.merge({"queue": wait_s, **stages})
+        return version, result
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.counters["completed"]
+        return {
+            "mode": "process" if self.workers > 0 else "thread",
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "inflight": self.inflight,
+            "queue_depth": max(0, self.inflight - max(1, self.workers)) + self.waiting,
+            "waiting_admission": self.waiting,
+            **self.counters,
+            "exec_ms_avg": round(1000 * self.exec_s_total / done, 2) if done else 0.0,
+            "exec_ms_max": round(1000 * self.exec_s_max, 2),
+            "wait_ms_avg": round(1000 * self.wait_s_total / done, 2) if done else 0.0,
+        }
+
+
+plan_executor = PlanExecutor()
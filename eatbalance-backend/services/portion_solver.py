@@ -0,0 +1,131 @@
+# services/portion_solver.py
+"""
+Modo "solver": en vez del ajuste secuencial (proteína -> carbohidratos -> grasas)
+busca los gramos de todos los alimentos a la vez.
+
+1) Mínimos cuadrados acotados (BVLS por conjunto activo, solo NumPy) sobre las
+   filas P, C, G y kcal/100 -- los mismos términos que _error_score.
+2) Redondeo a los pasos de round_grams y búsqueda local +-paso que minimiza la
+   puntuación exacta (suma de errores absolutos redondeados).
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+
+from services.scaling_engine import (
+    CompiledMenu, FoodTable, PROTEIN, CARB, FAT_FLEX, FAT, materialize,
+)
+
+# Límites por categoría como factor sobre base_g (OTHER/MIXED se queda en su base)
+CATEGORY_BOUNDS: Dict[int, Tuple[float, float]] = {
+    PROTEIN: (0.6, 3.5),
+    CARB: (0.6, 3.5),
+    FAT: (0.6, 3.0),
+}
+# El FAT_FLEX (aceite) es libre entre 0 y este máximo en gramos
+FAT_FLEX_MAX_G = 40.0
+
+MAX_ACTIVE_SET_ITER = 50
+MAX_LOCAL_SEARCH_ITER = 50
+
+
+def _design(cm: CompiledMenu, table: FoodTable) -> np.ndarray:
+    # filas: P, C, G y kcal/100 por gramo de cada alimento
+    per_g = table.nutrients[cm.idx].T / 100.0
+    kcal = (4 * (per_g[0] + per_g[1]) + 9 * per_g[2]) / 100.0
+    return np.vstack([per_g, kcal])
+
+def _bounds(cm: CompiledMenu, table: FoodTable) -> Tuple[np.ndarray, np.ndarray]:
+    cats = table.categories[cm.idx]
+    lo = cm.base_g.copy()
+    hi = cm.base_g.copy()
+    for code, (f_lo, f_hi) in CATEGORY_BOUNDS.items():
+        sel = cats == code
+        lo[sel] = cm.base_g[sel] * f_lo
+        hi[sel] = cm.base_g[sel] * f_hi
+    flex = cats == FAT_FLEX
+    lo[flex] = 0.0
+    hi[flex] = np.maximum(FAT_FLEX_MAX_G, cm.base_g[flex])
+    return lo, hi
+
+
+def bounded_lstsq(A: np.ndarray, b: np.ndarray, lo: np.ndarray, hi: np.ndarray,
+                  max_iter: int = MAX_ACTIVE_SET_ITER) -> np.ndarray:
+    """min ||A x - b||^2 con lo <= x <= hi (BVLS estilo Lawson-Hanson; n pequeño)."""
+    x = lo.astype(np.float64).copy()
+    free = np.zeros(x.shape, dtype=bool)
+    movable = lo < hi
+    for _ in range(max_iter):
+        # liberar la variable acotada que más mejora (condiciones KKT)
+        grad = A.T @ (A @ x - b)
+        want = movable & ~free & (((x <= lo) & (grad < 0)) | ((x >= hi) & (grad > 0)))
+        if not want.any():
+            break
+        free[int(np.argmax(np.where(want, np.abs(grad), -1.0)))] = True
+
+        # resolver sobre las libres; si alguna se sale, avanzar hasta la cota y fijarla
+        for _ in range(max_iter):
+            rhs = b - A[:, ~free] @ x[~free]
+            z = np.linalg.lstsq(A[:, free], rhs, rcond=None)[0]
+            xf, lof, hif = x[free], lo[free], hi[free]
+            if ((z >= lof) & (z <= hif)).all():
+                x[free] = z
+                break
+            d = z - xf
+            with np.errstate(divide="ignore", invalid="ignore"):
+                steps = np.where(d > 0, (hif - xf) / d, np.where(d < 0, (lof - xf) / d, np.inf))
+            alpha = float(np.clip(steps.min(), 0.0, 1.0))
+            xf = np.clip(xf + alpha * d, lof, hif)
+            hit = np.isclose(xf, lof) | np.isclose(xf, hif)
+            xf = np.where(np.isclose(xf, lof), lof, np.where(np.isclose(xf, hif), hif, xf))
+            x[free] = xf
+            idx = np.flatnonzero(free)
+            free[idx[hit]] = False
+            if not free.any():
+                break
+    return x
+
+
+def _scores(A: np.ndarray, G: np.ndarray, t: np.ndarray) -> np.ndarray:
+    # G: (n_cand, k) -> puntuación de _error_score para cada candidato
+    ach = G @ A[:3].T
+    kcal = 4 * (ach[:, 0] + ach[:, 1]) + 9 * ach[:, 2]
+    err = np.abs(np.round(ach - t[:3], 2)).sum(axis=1)
+    return err + np.abs(np.round(kcal - t[3], 2)) / 100.0
+
+
+def solve_grams(cm: CompiledMenu, table: FoodTable, targets) -> np.ndarray:
+    """Gramos ya redondeados que minimizan el error del menú frente a targets."""
+    if len(cm.idx) == 0:
+        return cm.base_g.copy()
+    A = _design(cm, table)
+    t = np.array([targets.protein_g, targets.carb_g, targets.fat_g, targets.kcal])
+    b = t.copy()
+    b[3] /= 100.0
+    lo, hi = _bounds(cm, table)
+    x = bounded_lstsq(A, b, lo, hi)
+
+    # ===== redondeo a la rejilla de round_grams + búsqueda local =====
+    steps = table.steps[cm.idx]
+    lo_r = np.ceil(lo / steps) * steps
+    hi_r = np.floor(hi / steps) * steps
+    fixed = lo_r >= hi_r
+    lo_r[fixed] = hi_r[fixed] = np.maximum(0.0, steps[fixed] * np.rint(cm.base_g[fixed] / steps[fixed]))
+    g = np.clip(steps * np.rint(x / steps), lo_r, hi_r)
+    best = _scores(A, g[None, :], t)[0]
+    moves = np.vstack([np.diag(steps), -np.diag(steps)])
+    for _ in range(MAX_LOCAL_SEARCH_ITER):
+        cand = g[None, :] + moves
+        ok = ((cand >= lo_r) & (cand <= hi_r)).all(axis=1) & np.tile(~fixed, 2)
+        if not ok.any():
+            break
+        sc = np.where(ok, _scores(A, cand, t), np.inf)
+        j = int(np.argmin(sc))
+        if sc[j] >= best - 1e-12:
+            break
+        g, best = cand[j], sc[j]
+    return g
+
+
+def solve_compiled(cm: CompiledMenu, table: FoodTable, targets):
+    return materialize(cm, table, solve_grams(cm, table, targets), targets)
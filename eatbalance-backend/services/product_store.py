@@ -0,0 +1,263 @@
+# services/product_store.py
+"""
+Caché persistente de productos de OpenFoodFacts sobre la BD de la app (db.engine).
+
+- OFFProduct guarda cada producto normalizado (mismos campos que devuelve
+  openfoodfacts.py) y un índice FTS5 (offproduct_fts) sobre nombre y marca.
+- OFFSearch guarda la respuesta de cada búsqueda por término normalizado.
+- TTL + stale-while-revalidate: dentro del TTL se sirve directamente; hasta
+  TTL + SWR se sirve lo guardado y se refresca en segundo plano; más allá se
+  vuelve a consultar OFF.
+- Si el índice local tiene suficientes resultados (caché "caliente") o se
+  trabaja sin conexión (OFF_OFFLINE=1), la búsqueda se resuelve en local.
+  Sin FTS5 (otra BD o antes de que ensure_search_index termine) se busca con
+  LIKE sobre search_name, el nombre normalizado igual que el término.
+- El volcado completo de OFF se carga con services/off_import.py.
+"""
+import asyncio
+import json
+import os
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, text
+from sqlmodel import Session, select
+
+from db import engine, ready_session
+from models import OFFProduct, OFFSearch
+import openfoodfacts
+
+PRODUCT_TTL_S = float(os.getenv("OFF_CACHE_TTL_S", str(7 * 24 * 3600)))
+PRODUCT_SWR_S = float(os.getenv("OFF_CACHE_SWR_S", str(30 * 24 * 3600)))
+# nº mínimo de coincidencias locales para no ir a OFF en una búsqueda nueva
+LOCAL_MIN_HITS = int(os.getenv("OFF_LOCAL_MIN_HITS", "10"))
+OFFLINE = os.getenv("OFF_OFFLINE", "0") == "1"
+
+FTS_TABLE = "offproduct_fts"
+
+stats: Counter = Counter()
+_refreshing: set = set()
+_background: set = set()
+_fts_ok: Optional[bool] = None
+
+
+class ProductNotFound(Exception):
+    pass
+
+
+# ====== normalización ======
+def normalizar_termino(term: str) -> str:
+    s = unicodedata.normalize("NFKD", term.lower())
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return " ".join(s.split())
+
+def _row_from_item(item: Dict, source: str, fetched_at: datetime) -> Dict:
+    n = item.get("nutrientes_por_100g", {}) or {}
+    name = item.get("nombre") or "Desconocido"
+    return {
+        "code": str(item.get("id", "")),
+        "name": name,
+        "search_name": normalizar_termino(name),
+        "brands": item.get("marca") or "N/A",
+        "kcal_100g": n.get("calorias"),
+        "protein_100g": n.get("proteinas"),
+        "fat_100g": n.get("grasas"),
+        "carbs_100g": n.get("carbohidratos"),
+        "sugars_100g": n.get("azucares"),
+        "source": source,
+        "fetched_at": fetched_at,
+    }
+
+def _item_from_row(p: OFFProduct, with_id: bool = True) -> Dict:
+    out = {"id": p.code} if with_id else {}
+    out.update({
+        "nombre": p.name,
+        "marca": p.brands,
+        "nutrientes_por_100g": {
+            "calorias": p.kcal_100g,
+            "proteinas": p.protein_100g,
+            "grasas": p.fat_100g,
+            "carbohidratos": p.carbs_100g,
+            "azucares": p.sugars_100g,
+        },
+    })
+    return out
+
+def _age_s(ts: datetime) -> float:
+    return (datetime.utcnow() - ts).total_seconds()
+
+
+# ====== almacenamiento ======
+def ensure_search_index() -> bool:
+    """Crea la tabla FTS5 si la BD es SQLite y la soporta (si no, se busca con LIKE)."""
+    global _fts_ok
+    if engine.dialect.name != "sqlite":
+        _fts_ok = False
+        return False
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "code UNINDEXED, name, brands, tokenize='unicode61 remove_diacritics 2')"
+            )
+        _fts_ok = True
+    except Exception as e:
+        print("FTS5 no disponible, búsqueda local con LIKE:", e)
+        _fts_ok = False
+    return _fts_ok
+
+def upsert_products(session: Session, rows: List[Dict]) -> int:
+    """Inserta o actualiza productos (dicts con las columnas de OFFProduct) y su índice FTS."""
+    rows = [r for r in rows if r.get("code")]
+    if not rows:
+        return 0
+    # el último gana si un lote trae el mismo code repetido
+    rows = list({r["code"]: r for r in rows}.values())
+    if engine.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(OFFProduct.__table__)
+        cols = {c: stmt.excluded[c] for c in rows[0] if c != "code"}
+        session.exec(stmt.on_conflict_do_update(index_elements=["code"], set_=cols), params=rows)
+    else:
+        for r in rows:
+            session.merge(OFFProduct(**r))
+    if _fts_ok:
+        codes = [r["code"] for r in rows]
+        session.exec(
+            text(f"DELETE FROM {FTS_TABLE} WHERE code IN (SELECT value FROM json_each(:codes))"),
+            params={"codes": json.dumps(codes)},
+        )
+        session.exec(
+            text(f"INSERT INTO {FTS_TABLE}(code, name, brands) VALUES (:code, :name, :brands)"),
+            params=[{"code": r["code"], "name": r["name"], "brands": r["brands"]} for r in rows],
+        )
+    return len(rows)
+
+def _fts_query(term: str) -> str:
+    # cada palabra como prefijo: "leche" "semi" -> "leche"* "semi"*
+    toks = [t.replace('"', "") for t in normalizar_termino(term).split()]
+    return " ".join(f'"{t}"*' for t in toks if t)
+
+def search_local(session: Session, term: str, limit: int) -> List[Dict]:
+    q = _fts_query(term)
+    if not q:
+        return []
+    if _fts_ok:
+        codes = [r[0] for r in session.exec(
+            text(f"SELECT code FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q ORDER BY bm25({FTS_TABLE}) LIMIT :n"),
+            params={"q": q, "n": limit},
+        ).all()]
+        if not codes:
+            return []
+        by_code = {p.code: p for p in session.exec(select(OFFProduct).where(OFFProduct.code.in_(codes))).all()}
+        return [_item_from_row(by_code[c]) for c in codes if c in by_code]
+    # cada palabra en cualquier parte del nombre normalizado (el término ya viene normalizado)
+    words = normalizar_termino(term).split()
+    cond = and_(*[OFFProduct.search_name.contains(w, autoescape=True) for w in words])
+    rows = session.exec(select(OFFProduct).where(cond).limit(limit)).all()
+    return [_item_from_row(p) for p in rows]
+
+
+# ====== lectura/escritura síncronas (se ejecutan en el threadpool) ======
+def _read_search(term: str, max_resultados: int) -> Tuple[Optional[List[Dict]], float, List[Dict]]:
+    with ready_session() as session:
+        cached = session.get(OFFSearch, (term, max_resultados))
+        local = [] if cached else search_local(session, term, max_resultados)
+        if cached:
+            return cached.results, _age_s(cached.fetched_at), []
+        return None, 0.0, local
+
+def _write_search(term: str, max_resultados: int, results: List[Dict]) -> None:
+    now = datetime.utcnow()
+    with ready_session() as session:
+        upsert_products(session, [_row_from_item(it, "api", now) for it in results])
+        row = session.get(OFFSearch, (term, max_resultados))
+        if row is None:
+            session.add(OFFSearch(term=term, max_results=max_resultados, results=results, fetched_at=now))
+        else:
+            row.results = results
+            row.fetched_at = now
+        session.commit()
+
+def _read_product(code: str) -> Optional[OFFProduct]:
+    with ready_session() as session:
+        return session.get(OFFProduct, code)
+
+def _write_product(code: str, item: Dict) -> None:
+    with ready_session() as session:
+        upsert_products(session, [_row_from_item({**item, "id": code}, "api", datetime.utcnow())])
+        session.commit()
+
+
+# ====== API asíncrona ======
+def _spawn_refresh(key, coro_factory) -> None:
+    if key in _refreshing:
+        return
+    _refreshing.add(key)
+
+    async def run():
+        try:
+            await coro_factory()
+            stats["refreshed"] += 1
+        except Exception as e:
+            stats["refresh_errors"] += 1
+            print("Error refrescando caché OFF:", key, e)
+        finally:
+            _refreshing.discard(key)
+
+    task = asyncio.ensure_future(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+async def _fetch_search(term: str, nombre: str, max_resultados: int) -> List[Dict]:
+    results = await openfoodfacts.buscar_productos(nombre, max_resultados)
+    await asyncio.to_thread(_write_search, term, max_resultados, results)
+    return results
+
+async def buscar_productos(nombre: str, max_resultados: int = 15) -> List[Dict]:
+    term = normalizar_termino(nombre)
+    cached, age, local = await asyncio.to_thread(_read_search, term, max_resultados)
+    if cached is not None:
+        if age <= PRODUCT_TTL_S or OFFLINE:
+            stats["search_hit"] += 1
+            return cached
+        if age <= PRODUCT_TTL_S + PRODUCT_SWR_S:
+            stats["search_stale"] += 1
+            _spawn_refresh(("search", term, max_resultados),
+                           lambda: _fetch_search(term, nombre, max_resultados))
+            return cached
+    elif OFFLINE or len(local) >= min(LOCAL_MIN_HITS, max_resultados):
+        stats["search_local"] += 1
+        return local
+    stats["search_miss"] += 1
+    return await _fetch_search(term, nombre, max_resultados)
+
+async def _fetch_product(code: str) -> Dict:
+    item = await openfoodfacts.obtener_producto_por_id(code)
+    await asyncio.to_thread(_write_product, code, item)
+    return item
+
+async def obtener_producto_por_id(code: str) -> Dict:
+    row = await asyncio.to_thread(_read_product, code)
+    if row is not None:
+        age = _age_s(row.fetched_at)
+        if age <= PRODUCT_TTL_S or OFFLINE or row.source == "dump":
+            stats["product_hit"] += 1
+            return _item_from_row(row, with_id=False)
+        if age <= PRODUCT_TTL_S + PRODUCT_SWR_S:
+            stats["product_stale"] += 1
+            _spawn_refresh(("product", code), lambda: _fetch_product(code))
+            return _item_from_row(row, with_id=False)
+    if OFFLINE:
+        raise ProductNotFound(code)
+    stats["product_miss"] += 1
+    return await _fetch_product(code)
+
+
+def cache_stats() -> Dict:
+    with ready_session() as session:
+        products = session.exec(text("SELECT COUNT(*) FROM offproduct")).one()[0]
+        searches = session.exec(text("SELECT COUNT(*) FROM offsearch")).one()[0]
+    return {"products": products, "searches": searches, "fts": bool(_fts_ok), "offline": OFFLINE, **stats}
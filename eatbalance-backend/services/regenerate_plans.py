@@ -0,0 +1,297 @@
+# services/regenerate_plans.py
+"""
+Regeneración nocturna de planes: recalcula el NutritionPlan y un menú por
+defecto de cada UserProfile (p.ej. tras cambiar fórmulas o el catálogo).
+
+- Lee los perfiles por bloques (keyset por id, memoria constante).
+- BMR/TDEE/macros del bloque de golpe con services/bulk_macros.py.
+- Los menús (mejor opción de cada comida, lo mismo que autoselecciona el
+  frontend) se calculan en un pool de procesos; cada proceso carga el
+  catálogo una vez en el initializer.
+- Cada bloque se escribe en una transacción (planes + menús) y después se
+  guarda el último id procesado en el fichero de control (--resume).
+- Por defecto se saltan los usuarios cuyo último plan tiene los mismos valores
+  y cuyo menú se generó con la misma versión del catálogo (--force para no saltar).
+- Los perfiles no válidos y los menús que fallan se registran con logging
+  (usuario y motivo) y se acumulan en JobStats.failures.
+
+Uso (desde eatbalance-backend):
+    python -m services.regenerate_plans [--scheme 4] [--workers 4] [--chunk-size 500] [--dry-run] [--resume]
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from db import engine
+from models import Menu, NutritionPlan, UserProfile
+from services import bulk_macros
+from services.catalog import BASE_DIR, get_catalog
+from services.menu_generator import DISTS, generate_all_options
+
+DEFAULT_SCHEME = "4"
+DEFAULT_CHUNK_SIZE = 500
+CHECKPOINT_PATH = BASE_DIR / "data" / "regenerate_plans.checkpoint.json"
+# bloques en vuelo a la vez (lectura/cálculo solapados con la escritura)
+MAX_INFLIGHT = 4
+# fallos que se guardan en JobStats.failures (el resto solo se cuentan y se registran)
+MAX_FAILURES_KEPT = 1000
+
+log = logging.getLogger(__name__)
+
+
+# ====== trabajo en los procesos del pool ======
+_worker_catalog = None
+_worker_tables = None
+
+def _init_worker():
+    global _worker_catalog, _worker_tables
+    from services.option_tables import store as option_tables_store
+    _worker_catalog = get_catalog()
+    _worker_tables = option_tables_store.get(_worker_catalog)
+
+def default_menu(catalog, option_tables, totals: Dict, scheme: str) -> Dict:
+    """Mejor opción de cada comida con el formato de /plan/generate."""
+    options = generate_all_options(
+        foods_df=catalog.foods_df, menus=catalog.menus, totals=totals, scheme=scheme, top_n=1,
+        table=catalog.food_table, batches=catalog.meal_batches, option_tables=option_tables)
+    plan = {}
+    for meal, o in options.items():
+        if not o["options"]:
+            continue
+        best = o["options"][0]
+        plan[meal] = {
+            "menu_id": best["menu_id"],
+            "menu_name": best["menu_name"],
+            "items": best["items"],
+            "target": o["target"],
+            "achieved": best["achieved"],
+            "errors": best["errors"],
+        }
+    return plan
+
+def _compute_menus(jobs: List[Tuple[int, Dict]], scheme: str
+                   ) -> Tuple[str, List[Tuple[int, Optional[Dict]]], List[Tuple[int, str]]]:
+    """(versión de catálogo, [(user_id, menú o None)], [(user_id, motivo)] de los que fallaron)."""
+    out, errors = [], []
+    for user_id, totals in jobs:
+        try:
+            out.append((user_id, default_menu(_worker_catalog, _worker_tables, totals, scheme)))
+        except Exception as e:
+            # se informa desde el proceso principal (el log del worker no llega a la salida del job)
+            out.append((user_id, None))
+            errors.append((user_id, f"{type(e).__name__}: {e}"))
+    return _worker_catalog.version, out, errors
+
+
+# ====== lectura ======
+def iter_profiles(chunk_size: int, after_id: int = 0):
+    while True:
+        with Session(engine) as session:
+            rows = session.exec(
+                select(UserProfile).where(UserProfile.id > after_id).order_by(UserProfile.id).limit(chunk_size)
+            ).all()
+        if not rows:
+            return
+        after_id = rows[-1].id
+        yield rows
+
+def compute_plans(profiles: List[UserProfile]) -> Tuple[List[Dict], List[Tuple[int, str]]]:
+    """Plan de cada perfil válido (mismas cifras que /nutrition/plan/generate) y [(user_id, motivo)] de los no válidos."""
+    df = pd.DataFrame({
+        "sexo": [p.sex for p in profiles],
+        "peso": [p.weight_kg for p in profiles],
+        "altura": [p.height_cm for p in profiles],
+        "edad": [p.age for p in profiles],
+        "actividad": [p.activity_level for p in profiles],
+        "objetivo": [p.goal for p in profiles],
+    })
+    res = bulk_macros.compute_bulk(df, round_bmr=False)
+    cols = res["columnas"]
+    bad = {e["fila"]: e["error"] for e in res["errores"]}
+    plans = []
+    for i, p in enumerate(profiles):
+        if i in bad:
+            continue
+        plans.append({
+            "user_id": p.user_id,
+            "bmr": float(cols["bmr"][i]),
+            "tdee": float(cols["tdee"][i]),
+            "calorias_objetivo": float(cols["calorias_objetivo"][i]),
+            "protein_g": float(cols["proteinas"][i]),
+            "carbs_g": float(cols["carbohidratos"][i]),
+            "fat_g": float(cols["grasas"][i]),
+        })
+    return plans, [(profiles[i].user_id, reason) for i, reason in bad.items()]
+
+
+# ====== escritura ======
+def _latest(session: Session, user_ids: List[int]) -> Dict[int, Tuple[NutritionPlan, Optional[Tuple]]]:
+    """Último plan de cada usuario y (versión de catálogo, esquema) de su menú nocturno, si lo tiene."""
+    last_ids = select(func.max(NutritionPlan.id)).where(NutritionPlan.user_id.in_(user_ids)).group_by(NutritionPlan.user_id)
+    plans = session.exec(select(NutritionPlan).where(NutritionPlan.id.in_(last_ids))).all()
+    menus = session.exec(select(Menu).where(Menu.plan_id.in_([p.id for p in plans]))).all() if plans else []
+    menu_by_plan = {
+        m.plan_id: (m.json_payload.get("catalog_version"), m.json_payload.get("scheme"))
+        for m in menus if (m.json_payload or {}).get("source") == "nightly"
+    }
+    return {p.user_id: (p, menu_by_plan.get(p.id)) for p in plans}
+
+def split_unchanged(plans: List[Dict], version: str, scheme: str) -> Tuple[List[Dict], int]:
+    """Quita los planes iguales al último guardado (y con menú de la misma versión y esquema)."""
+    with Session(engine) as session:
+        latest = _latest(session, [p["user_id"] for p in plans])
+    changed = []
+    for plan in plans:
+        prev = latest.get(plan["user_id"])
+        if prev is not None and prev[1] == (version, scheme) and all(
+            getattr(prev[0], k) == plan[k] for k in ("bmr", "tdee", "protein_g", "carbs_g", "fat_g")
+        ):
+            continue
+        changed.append(plan)
+    return changed, len(plans) - len(changed)
+
+def write_chunk(plans: List[Dict], menus: Dict[int, Optional[Dict]], version: str, scheme: str) -> int:
+    """Inserta planes y menús del bloque en una sola transacción."""
+    with Session(engine) as session:
+        rows = [NutritionPlan(user_id=p["user_id"], bmr=p["bmr"], tdee=p["tdee"],
+                              protein_g=p["protein_g"], carbs_g=p["carbs_g"], fat_g=p["fat_g"]) for p in plans]
+        session.add_all(rows)
+        session.flush()  # ids de los planes para enlazar los menús
+        session.add_all([
+            Menu(user_id=row.user_id, plan_id=row.id, json_payload={
+                "source": "nightly", "catalog_version": version, "scheme": scheme, "plan": menus[row.user_id],
+            })
+            for row in rows if menus.get(row.user_id) is not None
+        ])
+        session.commit()
+    return len(rows)
+
+
+# ====== punto de control ======
+def load_checkpoint(path: Path, run: Dict) -> int:
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return 0
+    if state.get("run") != run or state.get("done"):
+        return 0
+    return int(state.get("last_profile_id", 0))
+
+def save_checkpoint(path: Path, run: Dict, last_id: int, done: bool = False) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"run": run, "last_profile_id": last_id, "done": done}), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+@dataclass
+class JobStats:
+    profiles: int = 0
+    written: int = 0
+    unchanged: int = 0
+    invalid: int = 0
+    menu_errors: int = 0
+    # (user_id, "perfil" | "menú", motivo); como mucho MAX_FAILURES_KEPT
+    failures: List[Tuple[int, str, str]] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    def fail(self, user_id: int, kind: str, reason: str) -> None:
+        log.warning("usuario %s (%s): %s", user_id, kind, reason)
+        if len(self.failures) < MAX_FAILURES_KEPT:
+            self.failures.append((user_id, kind, reason))
+
+    def line(self) -> str:
+        dt = max(time.perf_counter() - self.started, 1e-9)
+        return (f"perfiles={self.profiles} escritos={self.written} sin_cambios={self.unchanged} "
+                f"no_válidos={self.invalid} errores_menú={self.menu_errors} | {self.profiles / dt:,.0f} perfiles/s")
+
+
+def run(scheme: str = DEFAULT_SCHEME, workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+        dry_run: bool = False, resume: bool = False, force: bool = False,
+        checkpoint: Path = CHECKPOINT_PATH) -> JobStats:
+    if scheme not in DISTS:
+        raise ValueError(f"Esquema no válido: {scheme}")
+    version = get_catalog().version
+    run_id = {"scheme": scheme, "catalog_version": version}
+    after_id = load_checkpoint(checkpoint, run_id) if resume else 0
+    if after_id:
+        print(f"Reanudando tras el perfil {after_id}")
+
+    stats = JobStats()
+    workers = workers or os.cpu_count() or 1
+    inflight: "deque[Tuple[int, List[Dict], List[Future]]]" = deque()
+    last_done = after_id
+
+    def finish_oldest():
+        nonlocal last_done
+        last_id, plans, futures = inflight.popleft()
+        menus: Dict[int, Optional[Dict]] = {}
+        for fut in futures:
+            worker_version, results, errors = fut.result()
+            if worker_version != version:
+                raise RuntimeError("El catálogo cambió durante la ejecución; vuelve a lanzar el proceso")
+            menus.update(results)
+            for user_id, reason in errors:
+                stats.fail(user_id, "menú", reason)
+        stats.menu_errors += sum(1 for m in menus.values() if m is None)
+        if dry_run:
+            stats.written += len(plans)
+        else:
+            stats.written += write_chunk(plans, menus, version, scheme)
+            save_checkpoint(checkpoint, run_id, last_id)
+        last_done = last_id
+        print(stats.line(), flush=True)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for profiles in iter_profiles(chunk_size, after_id):
+            plans, invalid = compute_plans(profiles)
+            stats.profiles += len(profiles)
+            stats.invalid += len(invalid)
+            for user_id, reason in invalid:
+                stats.fail(user_id, "perfil", reason)
+            if not force and plans:
+                plans, unchanged = split_unchanged(plans, version, scheme)
+                stats.unchanged += unchanged
+            jobs = [(p["user_id"], {"kcal": p["calorias_objetivo"], "protein_g": p["protein_g"],
+                                    "carb_g": p["carbs_g"], "fat_g": p["fat_g"]}) for p in plans]
+            step = max(1, -(-len(jobs) // workers))
+            futures = [pool.submit(_compute_menus, jobs[i:i + step], scheme) for i in range(0, len(jobs), step)]
+            inflight.append((profiles[-1].id, plans, futures))
+            if len(inflight) >= MAX_INFLIGHT:
+                finish_oldest()
+        while inflight:
+            finish_oldest()
+
+    if not dry_run:
+        save_checkpoint(checkpoint, run_id, last_done, done=True)
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Regenera planes y menús por defecto de todos los perfiles")
+    ap.add_argument("--scheme", default=DEFAULT_SCHEME, choices=sorted(DISTS))
+    ap.add_argument("--workers", type=int, help="Procesos del pool (por defecto, nº de CPUs)")
+    ap.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    ap.add_argument("--dry-run", action="store_true", help="Calcula todo pero no escribe en la BD")
+    ap.add_argument("--resume", action="store_true", help="Continúa desde el último bloque guardado")
+    ap.add_argument("--force", action="store_true", help="Escribe aunque el plan no haya cambiado")
+    ap.add_argument("--checkpoint", type=Path, default=CHECKPOINT_PATH)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    stats = run(args.scheme, args.workers, args.chunk_size, args.dry_run, args.resume, args.force, args.checkpoint)
+    print(("[dry-run] " if args.dry_run else "") + stats.line())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# services/scaling_engine.py
+"""
+Motor de escalado de menús sobre arrays de NumPy.
+
+Cada menú se compila a un vector de índices de alimento + gramos base, y los
+alimentos a una matriz densa de nutrientes (P/C/G por 100 g). Los pasos de
+ajuste (proteína -> carbohidratos -> grasas -> redondeo) son los mismos que el
+algoritmo original con pandas y dan exactamente los mismos números: las sumas
+se hacen con cumsum (acumulación secuencial, igual que sum_macros) y los
+redondeos finales se hacen con floats de Python.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Códigos de categoría; el resto (MIXED, ...) no se escala
+PROTEIN, CARB, FAT_FLEX, FAT, OTHER = 0, 1, 2, 3, -1
+_CAT_CODES = {"PROTEIN": PROTEIN, "CARB": CARB, "FAT_FLEX": FAT_FLEX, "FAT": FAT}
+
+# Topes de los factores de ajuste (mismos que en el algoritmo original)
+PROTEIN_CLAMP = (0.6, 3.5)
+CARB_CLAMP = (0.6, 3.5)
+FAT_CLAMP = (0.6, 3.0)
+
+
+class FoodTable:
+    """Alimentos como arrays: nutrients[i] = (protein_g, carb_g, fat_g) por 100 g."""
+
+    def __init__(self, foods_df: pd.DataFrame):
+        self.food_ids: List[str] = foods_df["food_id"].astype(str).tolist()
+        self.index: Dict[str, int] = {fid: i for i, fid in enumerate(self.food_ids)}
+        self.names: List = foods_df["name"].tolist() if "name" in foods_df.columns else list(self.food_ids)
+        self.nutrients = foods_df[["protein_g", "carb_g", "fat_g"]].to_numpy(dtype=np.float64)
+        self.categories = np.array(
+            [_CAT_CODES.get(c, OTHER) for c in foods_df["category"].tolist()], dtype=np.int8
+        )
+        # Paso de redondeo práctico por alimento (ver menu_generator.round_grams)
+        self.steps = np.where((self.categories == FAT) | (self.categories == FAT_FLEX), 1.0, 5.0)
+
+
+@dataclass(frozen=True)
+class CompiledMenu:
+    menu_id: str
+    menu_name: str
+    meal_type: str
+    food_ids: Tuple[str, ...]
+    idx: np.ndarray      # (k,) índices en FoodTable
+    base_g: np.ndarray   # (k,) gramos base
+
+
+def compile_menu(menu: Mapping, table: FoodTable) -> CompiledMenu:
+    # Un food_id repetido cuenta como un solo alimento con el último base_g. El algoritmo
+    # original también se quedaba con el último base_g, pero aplicaba el factor (y sumaba
+    # el aporte) una vez por aparición; aquí se aplica una sola vez.
+    grams: Dict[str, float] = {it["food_id"]: float(it["base_g"]) for it in menu["items"]}
+    fids = tuple(grams.keys())
+    return CompiledMenu(
+        menu_id=menu["menu_id"],
+        menu_name=menu["menu_name"],
+        meal_type=menu.get("meal_type"),
+        food_ids=fids,
+        idx=np.array([table.index[f] for f in fids], dtype=np.intp),
+        base_g=np.array([grams[f] for f in fids], dtype=np.float64),
+    )
+
+
+def _seq_sum(x: np.ndarray) -> float:
+    # suma estrictamente secuencial (np.sum usa suma por pares y cambiaría los últimos bits)
+    return float(np.cumsum(x)[-1]) if x.size else 0.0
+
+def _clamp(x: float, lo_hi: Tuple[float, float]) -> float:
+    return max(lo_hi[0], min(lo_hi[1], x))
+
+
+def scale_grams(cm: CompiledMenu, table: FoodTable, target_p: float, target_c: float, target_f: float) -> np.ndarray:
+    """Gramos ajustados (sin redondear) para un menú compilado."""
+    nut = table.nutrients[cm.idx]
+    cats = table.categories[cm.idx]
+    grams = cm.base_g.copy()
+    prot = cats == PROTEIN
+    carb = cats == CARB
+    flex = cats == FAT_FLEX
+    fat = cats == FAT
+
+    # ===== 1) Ajuste proteína =====
+    p = nut[:, 0] * (grams / 100.0)
+    base_p = _seq_sum(p[prot])
+    if base_p > 0:
+        need = max(0.0, target_p - (_seq_sum(p) - base_p))
+        grams[prot] *= _clamp(need / base_p, PROTEIN_CLAMP)
+
+    # ===== 2) Ajuste carbohidratos =====
+    c = nut[:, 1] * (grams / 100.0)
+    base_c = _seq_sum(c[carb])
+    other_c = _seq_sum(c) - base_c
+    if base_c > 0:
+        need = max(0.0, target_c - other_c)
+        grams[carb] *= _clamp(need / base_c, CARB_CLAMP)
+
+    # ===== 3) Ajuste grasas ===== (usa el primer FAT_FLEX si existe)
+    f = nut[:, 2] * (grams / 100.0)
+    base_flex = _seq_sum(f[flex])
+    base_fats = _seq_sum(f[fat])
+    need_f = max(0.0, target_f - (_seq_sum(f) - base_flex - base_fats))
+    if flex.any():
+        j = int(np.flatnonzero(flex)[0])
+        fat_per_g = nut[j, 2] / 100.0
+        grams[j] = (need_f / fat_per_g) if fat_per_g > 0 else 0.0
+    elif base_fats > 0:
+        grams[fat] *= _clamp(need_f / base_fats, FAT_CLAMP)
+    return grams
+
+
+def round_grams_array(grams: np.ndarray, steps: np.ndarray) -> np.ndarray:
+    # np.rint redondea al par, igual que round() de Python
+    return np.maximum(0.0, steps * np.rint(grams / steps))
+
+
+def achieved_macros(cm: CompiledMenu, table: FoodTable, grams: np.ndarray) -> Tuple[float, float, float, float]:
+    """(kcal, P, C, G) del menú con esos gramos; kcal derivadas de macros."""
+    m = table.nutrients[cm.idx] * (grams / 100.0)[:, None]
+    kcal = 4 * (m[:, 0] + m[:, 1]) + 9 * m[:, 2]
+    return _seq_sum(kcal), _seq_sum(m[:, 0]), _seq_sum(m[:, 1]), _seq_sum(m[:, 2])
+
+
+def _py_grams(g: float):
+    # round_grams devuelve int si es > 0 y 0.0 en otro caso; se conserva en la salida JSON
+    return int(g) if g > 0 else 0.0
+
+
+def materialize(cm: CompiledMenu, table: FoodTable, grams: np.ndarray, targets) -> Tuple[List[Dict], Dict]:
+    """Construye (items, debug) con el mismo formato que scale_menu_to_targets."""
+    m = table.nutrients[cm.idx] * (grams / 100.0)[:, None]
+    kcal = 4 * (m[:, 0] + m[:, 1]) + 9 * m[:, 2]
+    items = []
+    for i, fid in enumerate(cm.food_ids):
+        items.append({
+            "food_id": fid,
+            "name": table.names[cm.idx[i]],
+            "grams": _py_grams(grams[i]),
+            "kcal": round(float(kcal[i]), 2),
+            "protein_g": round(float(m[i, 0]), 2),
+            "carb_g": round(float(m[i, 1]), 2),
+            "fat_g": round(float(m[i, 2]), 2),
+        })
+    fk, fp, fc, ff = _seq_sum(kcal), _seq_sum(m[:, 0]), _seq_sum(m[:, 1]), _seq_sum(m[:, 2])
+    debug = {
+        "target": {"kcal": targets.kcal, "protein_g": targets.protein_g, "carb_g": targets.carb_g, "fat_g": targets.fat_g},
+        "achieved": {"kcal": fk, "protein_g": fp, "carb_g": fc, "fat_g": ff},
+        "errors": {
+            "kcal": round(fk - targets.kcal, 2),
+            "protein_g": round(fp - targets.protein_g, 2),
+            "carb_g": round(fc - targets.carb_g, 2),
+            "fat_g": round(ff - targets.fat_g, 2),
+        }
+    }
+    return items, debug
+
+
+def scale_compiled(cm: CompiledMenu, table: FoodTable, targets) -> Tuple[List[Dict], Dict]:
+    grams = scale_grams(cm, table, targets.protein_g, targets.carb_g, targets.fat_g)
+    grams = round_grams_array(grams, table.steps[cm.idx])
+    return materialize(cm, table, grams, targets)
+
+
+# ====== Modo lote: todos los menús de una comida a la vez ======
+@dataclass(frozen=True)
+class MenuBatch:
+    """Menús de una comida en matrices rellenadas (M menús x K alimentos como máximo)."""
+    menus: Tuple[CompiledMenu, ...]
+    nut: np.ndarray      # (M, K, 3) P/C/G por 100 g; 0 en el relleno
+    base_g: np.ndarray   # (M, K)
+    cats: np.ndarray     # (M, K) OTHER en el relleno
+    steps: np.ndarray    # (M, K)
+
+    @classmethod
+    def build(cls, menus, table: FoodTable) -> "MenuBatch":
+        compiled = tuple(m if isinstance(m, CompiledMenu) else compile_menu(m, table) for m in menus)
+        M = len(compiled)
+        K = max((len(cm.idx) for cm in compiled), default=0)
+        nut = np.zeros((M, K, 3))
+        base_g = np.zeros((M, K))
+        cats = np.full((M, K), OTHER, dtype=np.int8)
+        steps = np.full((M, K), 5.0)
+        for i, cm in enumerate(compiled):
+            k = len(cm.idx)
+            nut[i, :k] = table.nutrients[cm.idx]
+            base_g[i, :k] = cm.base_g
+            cats[i, :k] = table.categories[cm.idx]
+            steps[i, :k] = table.steps[cm.idx]
+        return cls(compiled, nut, base_g, cats, steps)
+
+    def __len__(self) -> int:
+        return len(self.menus)
+
+    def subset(self, rows: np.ndarray) -> "MenuBatch":
+        return MenuBatch(tuple(self.menus[i] for i in rows), self.nut[rows], self.base_g[rows],
+                         self.cats[rows], self.steps[rows])
+
+
+def _row_sum(x: np.ndarray) -> np.ndarray:
+    # suma secuencial por fila; los ceros del relleno/máscara no alteran el resultado
+    return np.cumsum(x, axis=1)[:, -1] if x.shape[1] else np.zeros(x.shape[0])
+
+def _factor(need: np.ndarray, base: np.ndarray, lo_hi: Tuple[float, float]) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f = np.clip(need / base, lo_hi[0], lo_hi[1])
+    return np.where(base > 0, f, 1.0)
+
+
+def scale_batch_raw(batch: MenuBatch, target_p: float, target_c: float, target_f: float) -> np.ndarray:
+    """Mismos pasos que scale_grams (sin redondear) para todos los menús del lote."""
+    nut, cats = batch.nut, batch.cats
+    grams = batch.base_g.copy()
+    prot = cats == PROTEIN
+    carb = cats == CARB
+    flex = cats == FAT_FLEX
+    fat = cats == FAT
+
+    # 1) proteína
+    p = nut[:, :, 0] * (grams / 100.0)
+    base_p = _row_sum(np.where(prot, p, 0.0))
+    need_p = np.maximum(0.0, target_p - (_row_sum(p) - base_p))
+    grams = np.where(prot, grams * _factor(need_p, base_p, PROTEIN_CLAMP)[:, None], grams)
+
+    # 2) carbohidratos
+    c = nut[:, :, 1] * (grams / 100.0)
+    base_c = _row_sum(np.where(carb, c, 0.0))
+    need_c = np.maximum(0.0, target_c - (_row_sum(c) - base_c))
+    grams = np.where(carb, grams * _factor(need_c, base_c, CARB_CLAMP)[:, None], grams)
+
+    # 3) grasas: primer FAT_FLEX de cada menú o, si no hay, factor sobre los FAT
+    f = nut[:, :, 2] * (grams / 100.0)
+    base_flex = _row_sum(np.where(flex, f, 0.0))
+    base_fats = _row_sum(np.where(fat, f, 0.0))
+    need_f = np.maximum(0.0, target_f - (_row_sum(f) - base_flex - base_fats))
+    has_flex = flex.any(axis=1)
+    rows = np.arange(len(batch))
+    first = np.argmax(flex, axis=1)
+    fat_per_g = nut[rows, first, 2] / 100.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        flex_g = np.where(fat_per_g > 0, need_f / fat_per_g, 0.0)
+    grams = np.where(fat & ~has_flex[:, None], grams * _factor(need_f, base_fats, FAT_CLAMP)[:, None], grams)
+    grams[rows[has_flex], first[has_flex]] = flex_g[has_flex]
+    return grams
+
+
+def scale_batch(batch: MenuBatch, target_p: float, target_c: float, target_f: float) -> np.ndarray:
+    """scale_batch_raw + redondeo práctico."""
+    return round_grams_array(scale_batch_raw(batch, target_p, target_c, target_f), batch.steps)
+
+
+def batch_achieved(batch: MenuBatch, grams: np.ndarray) -> np.ndarray:
+    """(M, 4) con kcal, P, C, G conseguidos por cada menú."""
+    m = batch.nut * (grams / 100.0)[:, :, None]
+    kcal = 4 * (m[:, :, 0] + m[:, :, 1]) + 9 * m[:, :, 2]
+    return np.stack([_row_sum(kcal), _row_sum(m[:, :, 0]), _row_sum(m[:, :, 1]), _row_sum(m[:, :, 2])], axis=1)
+
+
+# np.round puede diferir de round() en el último céntimo de cada error: como mucho
+# 3*0.01 + 0.01/100 en la puntuación. Con este margen la preselección nunca deja fuera
+# un menú que la puntuación exacta colocaría en el top N.
+_SCORE_MARGIN = 0.07
+
+def approx_scores(achieved: np.ndarray, targets) -> np.ndarray:
+    """Puntuación de error (ver menu_generator._error_score) para todo el lote."""
+    t = np.array([targets.kcal, targets.protein_g, targets.carb_g, targets.fat_g])
+    err = np.abs(np.round(achieved - t, 2))
+    return err[:, 1] + err[:, 2] + err[:, 3] + err[:, 0] / 100.0
+
+
+def preselect(scores: np.ndarray, top_n) -> np.ndarray:
+    """Índices candidatos (ordenados) a entrar en el top N; todos si top_n es None."""
+    M = scores.shape[0]
+    if top_n is None or top_n >= M:
+        return np.arange(M)
+    kth = np.partition(scores, top_n - 1)[top_n - 1]
+    return np.flatnonzero(scores <= kth + _SCORE_MARGIN)
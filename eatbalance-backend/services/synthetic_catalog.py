@@ -0,0 +1,193 @@
+# services/synthetic_catalog.py
+"""
+Catálogos sintéticos realistas para pruebas de carga y benchmarks.
+
+Todo se calibra con el catálogo real (data/foods.csv y data/menus.json):
+- Alimentos: variantes de los alimentos reales de cada categoría, con la misma
+  proporción de categorías (PROTEIN, CARB, MIXED, FAT, FAT_FLEX). Los macros
+  llevan un ruido log-normal, nunca suman más de 100 g por 100 g y las kcal
+  salen de 4·(P + C) + 9·G con una desviación pequeña, como en las etiquetas reales.
+- Menús: para cada meal_type se usan las mismas combinaciones de categorías que
+  los menús reales (con su frecuencia) y base_g dentro del rango real de cada
+  (meal_type, categoría), redondeado al paso del motor (5 g; 1 g en grasas).
+
+Escribe foods.csv y menus.json con el mismo formato que los reales; para que
+la API los use: FOODS_PATH=.../foods.csv MENUS_PATH=.../menus.json.
+
+Uso (desde eatbalance-backend):
+    python -m services.synthetic_catalog --foods 10000 --menus 50000 [--seed 0] [--out-dir data/synthetic]
+"""
+import argparse
+import json
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.catalog import BASE_DIR, FOODS_PATH, MENUS_PATH, load_foods, load_menus
+
+DEFAULT_OUT_DIR = BASE_DIR / "data" / "synthetic"
+MACROS = ("protein_g", "carb_g", "fat_g")
+# desviación típica (log) del ruido de cada macro y de las kcal declaradas frente a las calculadas
+MACRO_NOISE = 0.25
+KCAL_NOISE = 0.03
+MAX_MACROS_G = 99.8
+# ampliación del rango real de base_g
+BASE_G_SPREAD = 0.2
+
+
+# ====== perfil del catálogo real ======
+class CatalogProfile:
+    """Distribuciones del catálogo de referencia que imita el generador."""
+
+    def __init__(self, foods_df: pd.DataFrame, menus: list):
+        foods = foods_df.copy()
+        for c in ("kcal",) + MACROS:
+            foods[c] = pd.to_numeric(foods[c], errors="coerce").fillna(0.0)
+        self.prototypes: Dict[str, pd.DataFrame] = {cat: df for cat, df in foods.groupby("category")}
+        counts = foods["category"].value_counts()
+        self.category_mix = (counts / counts.sum()).to_dict()
+
+        category_of = dict(zip(foods["food_id"], foods["category"]))
+        meal_counts: Counter = Counter()
+        compositions: Dict[str, Counter] = defaultdict(Counter)
+        base_g: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+        for m in menus:
+            cats = [category_of.get(it["food_id"]) for it in m["items"]]
+            if None in cats:
+                continue
+            meal_counts[m["meal_type"]] += 1
+            compositions[m["meal_type"]][tuple(cats)] += 1
+            for cat, it in zip(cats, m["items"]):
+                base_g[(m["meal_type"], cat)].append(float(it["base_g"]))
+        self.meal_mix = {k: v / sum(meal_counts.values()) for k, v in meal_counts.items()}
+        self.compositions = {meal: list(c.items()) for meal, c in compositions.items()}
+        self.base_g_range = {k: (min(v), max(v)) for k, v in base_g.items()}
+
+    @classmethod
+    def from_files(cls, foods_path: Path = FOODS_PATH, menus_path: Path = MENUS_PATH) -> "CatalogProfile":
+        return cls(load_foods(foods_path), load_menus(menus_path))
+
+
+def _split(total: int, weights: Dict[str, float]) -> Dict[str, int]:
+    """Reparte `total` según los pesos (al menos 1 por clave si total lo permite)."""
+    keys = sorted(weights)
+    raw = np.array([weights[k] for k in keys]) * total
+    n = np.floor(raw).astype(int)
+    n[np.argsort(raw - n)[::-1][: total - n.sum()]] += 1
+    if total >= len(keys):
+        for i in np.flatnonzero(n == 0):
+            n[i] = 1
+            n[np.argmax(n)] -= 1
+    return dict(zip(keys, n.tolist()))
+
+
+# ====== alimentos ======
+def generate_foods(profile: CatalogProfile, n_foods: int, rng: np.random.Generator) -> pd.DataFrame:
+    parts = []
+    for cat, n in _split(n_foods, profile.category_mix).items():
+        if n == 0:
+            continue
+        protos = profile.prototypes[cat]
+        pick = rng.integers(len(protos), size=n)
+        base = protos[list(MACROS)].to_numpy(dtype=float)[pick]
+        # ruido multiplicativo y un pequeño fondo para que los ceros no queden siempre a 0
+        macros = base * rng.lognormal(0.0, MACRO_NOISE, size=base.shape)
+        macros += (base == 0) * rng.exponential(0.2, size=base.shape) * (rng.random(base.shape) < 0.3)
+        # como mucho MAX_MACROS_G por 100 g (margen para que el redondeo a 0,1 no pase de 100)
+        total = macros.sum(axis=1, keepdims=True)
+        macros = np.where(total > MAX_MACROS_G, macros * (MAX_MACROS_G / total), macros)
+        macros = np.round(macros, 1)
+        kcal = (4 * (macros[:, 0] + macros[:, 1]) + 9 * macros[:, 2]) * rng.lognormal(0.0, KCAL_NOISE, size=n)
+
+        names = protos["name"].to_numpy()[pick]
+        ids = [f"syn_{cat.lower()}_{i:06d}" for i in range(n)]
+        parts.append(pd.DataFrame({
+            "food_id": ids,
+            "name": [f"{name} #{i}" for name, i in zip(names, range(n))],
+            "category": cat,
+            "kcal": np.round(kcal).astype(int),
+            "protein_g": macros[:, 0],
+            "carb_g": macros[:, 1],
+            "fat_g": macros[:, 2],
+            "notes": "sintético",
+        }))
+    return pd.concat(parts, ignore_index=True)
+
+
+# ====== menús ======
+def _step(cat: str) -> float:
+    # mismos pasos de redondeo que FoodTable.steps
+    return 1.0 if cat in ("FAT", "FAT_FLEX") else 5.0
+
+def generate_menus(profile: CatalogProfile, foods_df: pd.DataFrame, n_menus: int,
+                   rng: np.random.Generator) -> List[Dict]:
+    ids_by_cat = {cat: df["food_id"].to_numpy() for cat, df in foods_df.groupby("category")}
+    name_of = dict(zip(foods_df["food_id"], foods_df["name"]))
+    menus = []
+    for meal, n in _split(n_menus, profile.meal_mix).items():
+        comps = [c for c, _ in profile.compositions[meal] if all(cat in ids_by_cat for cat in c)]
+        if not comps:
+            continue
+        weights = np.array([w for c, w in profile.compositions[meal] if c in comps], dtype=float)
+        choice = rng.choice(len(comps), size=n, p=weights / weights.sum())
+        for j, ci in enumerate(choice):
+            items = []
+            used = set()
+            for cat in comps[ci]:
+                pool = ids_by_cat[cat]
+                fid = pool[rng.integers(len(pool))]
+                # sin el mismo alimento dos veces en un menú (si hay donde elegir)
+                for _ in range(3):
+                    if fid not in used:
+                        break
+                    fid = pool[rng.integers(len(pool))]
+                used.add(fid)
+                lo, hi = profile.base_g_range[(meal, cat)]
+                g = rng.uniform(lo * (1 - BASE_G_SPREAD), hi * (1 + BASE_G_SPREAD))
+                step = _step(cat)
+                items.append({"food_id": str(fid), "base_g": int(max(step, step * round(g / step)))})
+            menus.append({
+                "menu_id": f"syn_{meal}_{j:06d}",
+                "meal_type": meal,
+                "menu_name": " + ".join(name_of[it["food_id"]] for it in items),
+                "items": items,
+            })
+    return menus
+
+
+def generate_catalog(n_foods: int, n_menus: int, seed: int = 0,
+                     profile: Optional[CatalogProfile] = None) -> Tuple[pd.DataFrame, List[Dict]]:
+    profile = profile or CatalogProfile.from_files()
+    rng = np.random.default_rng(seed)
+    foods = generate_foods(profile, n_foods, rng)
+    return foods, generate_menus(profile, foods, n_menus, rng)
+
+def write_catalog(foods_df: pd.DataFrame, menus: List[Dict], out_dir: Path) -> Tuple[Path, Path]:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    foods_path, menus_path = out_dir / "foods.csv", out_dir / "menus.json"
+    foods_df.to_csv(foods_path, index=False)
+    menus_path.write_text(json.dumps(menus, ensure_ascii=False, indent=1), encoding="utf-8")
+    return foods_path, menus_path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Genera un catálogo sintético con el formato de foods.csv/menus.json")
+    ap.add_argument("--foods", type=int, default=10000)
+    ap.add_argument("--menus", type=int, default=50000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out-dir", type=Path, default=DEFAULT_OUT_DIR)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    foods, menus = generate_catalog(args.foods, args.menus, args.seed)
+    foods_path, menus_path = write_catalog(foods, menus, args.out_dir)
+    print(f"{len(foods)} alimentos, {len(menus)} menús (semilla {args.seed}) en {time.perf_counter() - t0:.1f}s")
+    print(f"FOODS_PATH={foods_path} MENUS_PATH={menus_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,19 @@
 from bmr import calcular_bmr
 
-def calcular_tdee(sexo: str, peso: float, altura: float, edad: int, actividad: str) -> float:
+FACTORES_ACTIVIDAD = {
+    "sedentario": 1.2,
+    "ligero": 1.375,
+    "moderado": 1.55,
+    "activo": 1.725,
+    "muy activo": 1.9
+}
+
+# bmr: si el llamador ya lo ha calculado, se reutiliza en vez de recalcularlo
+def calcular_tdee(sexo: str, peso: float, altura: float, edad: int, actividad: str, bmr: float | None = None) -> float:
     actividad = actividad.lower().strip()
-    factores = {
-        "sedentario": 1.2,
-        "ligero": 1.375,
-        "moderado": 1.55,
-        "activo": 1.725,
-        "muy activo": 1.9
-    }
-    if actividad not in factores:
+    if actividad not in FACTORES_ACTIVIDAD:
         raise ValueError("Nivel de actividad no válido. Usa: sedentario, ligero, moderado, activo o muy activo")
 
-    bmr = calcular_bmr(sexo, peso, altura, edad)
-    return round(bmr * factores[actividad], 2)
+    if bmr is None:
+        bmr = calcular_bmr(sexo, peso, altura, edad)
+    return round(bmr * FACTORES_ACTIVIDAD[actividad], 2)
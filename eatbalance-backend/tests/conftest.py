@@ -0,0 +1,10 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# la BD de los tests va a un directorio temporal, no toca eatbalance.db
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='eatbalance-tests-')}/eatbalance.db"
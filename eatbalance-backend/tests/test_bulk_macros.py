@@ -0,0 +1,24 @@
+# tests/test_bulk_macros.py
+import warnings
+
+import pandas as pd
+
+from services.bulk_macros import compute_bulk
+
+
+def test_claves_desconocidas_sin_avisos():
+    df = pd.DataFrame({
+        "sexo": ["hombre", "x", None, "mujer"],
+        "peso": [80, 80, 80, 60],
+        "altura": [180, 180, 180, 165],
+        "edad": [30, 30, 30, 25],
+        "actividad": ["moderado", "moderado", "ligero", "nada"],
+        "objetivo": ["deficit", "deficit", "superavit", "mantenimiento"],
+    })
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        res = compute_bulk(df)
+    assert res["validas"] == 1
+    assert [e["fila"] for e in res["errores"]] == [1, 2, 3]
+    assert res["errores"][2]["error"].startswith("Nivel de actividad no válido")
+    assert pd.isna(res["columnas"]["bmr"][1]) and not pd.isna(res["columnas"]["bmr"][0])
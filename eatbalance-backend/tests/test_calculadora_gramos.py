@@ -0,0 +1,56 @@
+# tests/test_calculadora_gramos.py
+import pytest
+
+from calculadora_gramos import extraer_gramos, nutrientes_pedidos, responder_pregunta_gramos
+
+POLLO = {"calorias": 165, "proteinas": 31, "grasas": 3.6, "carbohidratos": 0, "azucares": None}
+
+
+# ====== respuesta local ======
+@pytest.mark.parametrize("pregunta, gramos", [
+    ("¿Cuánta proteína hay en 150 g?", 150),
+    ("¿Cuántas calorías tienen 200 gramos de pollo?", 200),
+    ("Proteínas en 1,5 kg", 1500),
+    ("¿Cuánta proteína tiene una pechuga de 150 g?", 150),
+    ("¿Cuántos gramos de proteína hay en 150 g de pollo?", 150),
+])
+def test_extrae_la_racion(pregunta, gramos):
+    assert extraer_gramos(pregunta) == gramos
+
+def test_respuesta_local():
+    texto = responder_pregunta_gramos("pollo", POLLO, "¿Cuánta proteína hay en 150 g de pollo?")
+    assert texto.splitlines()[0] == "En 150 g de pollo hay:"
+    assert "- Proteínas: 46.5 g" in texto
+    assert "Calorías" not in texto
+
+def test_sin_nutriente_concreto_responde_todos():
+    texto = responder_pregunta_gramos("pollo", POLLO, "¿Qué macros tienen 200 g?")
+    assert "- Calorías: 330 kcal" in texto
+    assert "- Azúcares: desconocido" in texto
+    assert nutrientes_pedidos("¿y de grasa?") == ["grasas"]
+
+
+# ====== al LLM ======
+@pytest.mark.parametrize("pregunta", [
+    # los gramos son del nutriente, no de la ración
+    "¿Cuántos gramos de pollo necesito para llegar a 30 g de proteína?",
+    "¿Cuánto pollo para 30 g de proteína?",
+    "¿Cuánta proteína le queda si le quito 20 g de grasa?",
+    "¿Qué alimento tiene 25 gramos de proteínas?",
+    # objetivo o pregunta inversa
+    "Quiero comer 150 g, ¿cuánta proteína tomo?",
+    "¿Cuánto pollo hace falta para 40 g?",
+    # multiplicador de la ración
+    "Tengo 2 pechugas de 150 g, ¿cuánta proteína tienen en total?",
+    "¿Cuántas calorías tienen dos filetes de 120 g?",
+    "Media pechuga de 200 g, ¿cuánta proteína?",
+    # pregunta abierta, sin cantidad o con varias
+    "¿Es sano comer 200 g de pollo?",
+    "¿Cuánta proteína tiene el pollo?",
+    "¿Cuánta proteína hay en 100 g de pollo y 50 g de arroz?",
+])
+def test_va_al_llm(pregunta):
+    assert responder_pregunta_gramos("pollo", POLLO, pregunta) is None
+
+def test_sin_valores_del_nutriente_va_al_llm():
+    assert responder_pregunta_gramos("pollo", {"azucares": None}, "¿Cuánto azúcar hay en 100 g?") is None
@@ -0,0 +1,26 @@
+# tests/test_db.py
+import pytest
+from fastapi import HTTPException
+
+import db
+from services import macros_cache, product_store
+
+
+@pytest.fixture
+def bd_no_lista(monkeypatch):
+    # migraciones fallidas: wait_ready responde 503 sin esperar
+    monkeypatch.setattr(db, "_migrate_error", RuntimeError("migración a medias"))
+    db._ready.set()
+
+
+@pytest.mark.parametrize("call", [
+    lambda: product_store.cache_stats(),
+    lambda: product_store._read_product("123"),
+    lambda: product_store._read_search("leche", 5),
+    lambda: macros_cache.cache_stats(),
+    lambda: macros_cache._read_cache("leche"),
+])
+def test_servicios_esperan_a_la_bd(bd_no_lista, call):
+    with pytest.raises(HTTPException) as exc:
+        call()
+    assert exc.value.status_code == 503
@@ -0,0 +1,134 @@
+# tests/test_food_audit.py
+import asyncio
+import json
+
+import httpx
+import pandas as pd
+import pytest
+
+from routers import plan as plan_router
+from services import food_audit
+from services.catalog import FOODS_PATH, Catalog, load_foods, load_menus
+
+FOODS = [
+    # food_id, name, category, kcal, protein_g, carb_g, fat_g
+    ("pollo", "Pollo", "PROTEIN", "156", "31", "0", "3.6"),
+    ("inflado", "Kcal infladas", "CARB", "200", "5", "20", "0"),       # 4·25 = 100 kcal: +100 %
+    ("denso", "Más de 100 g", "MIXED", "485", "60", "50", "5"),       # 115 g de macros
+    ("roto", "Datos rotos", "FAT", "abc", "1", "1", "-1"),
+    ("sin_cat", "Sin categoría", "", "400", "0", "100", "0"),
+    ("rara", "Categoría rara", "SNACK", "400", "0", "100", "0"),
+]
+MENUS = [
+    {"menu_id": "bien", "menu_name": "Bien", "meal_type": "comida", "items": [{"food_id": "pollo", "base_g": 150}]},
+    {"menu_id": "mal", "menu_name": "Mal", "meal_type": "cena",
+     "items": [{"food_id": "pollo", "base_g": 100}, {"food_id": "denso", "base_g": 50},
+               {"food_id": "fantasma", "base_g": 10}, {"food_id": "roto", "base_g": 10}]},
+    # inflado (solo aviso) y rara (categoría desconocida) no invalidan el menú
+    {"menu_id": "avisos", "menu_name": "Avisos", "meal_type": "desayuno",
+     "items": [{"food_id": "inflado", "base_g": 80}, {"food_id": "rara", "base_g": 30}]},
+    {"menu_id": "sin_cat", "menu_name": "Sin cat", "meal_type": "merienda",
+     "items": [{"food_id": "sin_cat", "base_g": 30}]},
+]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    df = pd.DataFrame(FOODS, columns=["food_id", "name", "category", "kcal", "protein_g", "carb_g", "fat_g"])
+    df["category"] = df["category"].replace("", None)
+    return Catalog.build(df, MENUS, version="test-audit")
+
+
+def test_resumen(catalog):
+    result = food_audit.run_audit(catalog, 5.0)
+    assert result.summary() == {
+        "kcal_mismatch": 1,
+        "macros_over_100": 1,
+        "nutrients_invalid": 1,
+        "category_missing": 1,
+        "category_unknown": 1,
+        "menu_bad_food": 2,
+    }
+    assert (result.foods_count, result.menus_count) == (6, 4)
+
+def test_incidencias(catalog):
+    issues = list(food_audit.run_audit(catalog, 5.0).iter_issues())
+    assert issues == [
+        {"check": "kcal_mismatch", "food_id": "inflado", "name": "Kcal infladas", "kcal_declared": 200.0,
+         "kcal_from_macros": 100.0, "delta_kcal": 100.0, "delta_pct": 100.0},
+        {"check": "macros_over_100", "food_id": "denso", "name": "Más de 100 g", "macros_g_per_100g": 115.0},
+        {"check": "nutrients_invalid", "food_id": "roto", "name": "Datos rotos", "fields": ["kcal", "fat_g"]},
+        {"check": "category_missing", "food_id": "sin_cat", "name": "Sin categoría"},
+        {"check": "category_unknown", "food_id": "rara", "name": "Categoría rara", "category": "SNACK"},
+        {"check": "menu_bad_food", "menu_id": "mal", "meal_type": "cena",
+         "foods": [{"food_id": "denso", "checks": ["macros_over_100"]},
+                   {"food_id": "fantasma", "checks": ["food_missing"]},
+                   {"food_id": "roto", "checks": ["nutrients_invalid"]}]},
+        {"check": "menu_bad_food", "menu_id": "sin_cat", "meal_type": "merienda",
+         "foods": [{"food_id": "sin_cat", "checks": ["category_missing"]}]},
+    ]
+
+def test_cache_por_version_y_umbral(catalog):
+    cache = food_audit.AuditCache(maxsize=2)
+    first = cache.get(catalog, 5.0)
+    assert cache.get(catalog, 5) is first
+    assert cache.get(catalog, 150.0).summary()["kcal_mismatch"] == 0
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_ndjson(catalog, monkeypatch):
+    monkeypatch.setattr(plan_router, "_get_catalog", lambda: catalog)
+    monkeypatch.setattr(food_audit, "audit_cache", food_audit.AuditCache())
+    import main
+
+    async def get(params):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/plan/audit/foods", params=params)
+
+    r = asyncio.run(get({"formato": "ndjson"}))
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert r.text.endswith("\n")
+    meta, *issues = [json.loads(line) for line in r.text.splitlines()]
+    assert meta == {"count": 6, "menus_count": 4, "threshold_pct": 5.0, "catalog_version": "test-audit",
+                    "summary": food_audit.run_audit(catalog, 5.0).summary()}
+    assert issues == list(food_audit.run_audit(catalog, 5.0).iter_issues())
+    # el JSON de siempre lleva lo mismo
+    body = asyncio.run(get({})).json()
+    assert body == {**meta, "issues": issues}
+
+
+# ====== paridad con la auditoría fila a fila sobre data/foods.csv ======
+def legacy_kcal_issues(df: pd.DataFrame, threshold_pct: float):
+    issues = []
+    for _, r in df.iterrows():
+        try:
+            p = float(r.get("protein_g", 0) or 0)
+            c = float(r.get("carb_g", 0) or 0)
+            f = float(r.get("fat_g", 0) or 0)
+            kcal = float(r.get("kcal", 0) or 0)
+        except Exception:
+            continue
+        kcal_calc = 4 * (p + c) + 9 * f
+        if kcal_calc > 0:
+            pct = 100.0 * (kcal - kcal_calc) / kcal_calc
+            if abs(pct) >= threshold_pct:
+                issues.append({
+                    "food_id": str(r["food_id"]),
+                    "name": str(r.get("name", "")),
+                    "kcal_declared": round(kcal, 1),
+                    "kcal_from_macros": round(kcal_calc, 1),
+                    "delta_kcal": round(kcal - kcal_calc, 1),
+                    "delta_pct": round(pct, 1),
+                })
+    return issues
+
+@pytest.mark.parametrize("threshold_pct", [0.5, 2.0, 5.0, 10.0])
+def test_kcal_mismatch_igual_que_el_original(threshold_pct):
+    df = load_foods(FOODS_PATH)
+    catalog = Catalog.build(df, load_menus(FOODS_PATH.with_name("menus.json")), version="foods.csv")
+    new = [{k: v for k, v in issue.items() if k != "check"}
+           for issue in food_audit.run_audit(catalog, threshold_pct).iter_issues()
+           if issue["check"] == "kcal_mismatch"]
+    assert new == legacy_kcal_issues(df, threshold_pct)
+    if threshold_pct == 0.5:
+        assert new  # el CSV real tiene diferencias: la comparación no es trivial
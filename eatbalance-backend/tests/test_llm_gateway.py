@@ -0,0 +1,126 @@
+# tests/test_llm_gateway.py
+import asyncio
+import http.server
+import json
+import socketserver
+import threading
+
+import httpx
+import pytest
+
+import llm_gateway
+
+
+@pytest.fixture(autouse=True)
+def espera_corta(monkeypatch):
+    # si una plaza se queda ocupada, la siguiente petición falla enseguida en vez de esperar 10 s
+    monkeypatch.setattr(llm_gateway, "LLM_QUEUE_TIMEOUT_S", 0.05)
+
+
+def test_aclose_sin_iterar_libera_la_plaza():
+    async def run():
+        for _ in range(llm_gateway.LLM_CONCURRENCY["ollama"] + 2):
+            tokens = await llm_gateway.ollama_stream("hola")
+            await tokens.aclose()
+        return llm_gateway.snapshot()["ollama"]
+
+    assert asyncio.run(run())["active"] == 0
+
+def test_aclose_dos_veces_libera_una_sola_vez():
+    async def run():
+        tokens = await llm_gateway.ollama_stream("hola")
+        await tokens.aclose()
+        await tokens.aclose()
+        return (await llm_gateway._state())[1]["ollama"]
+
+    limiter = asyncio.run(run())
+    assert limiter.active == 0
+    assert limiter.sem._value == llm_gateway.LLM_CONCURRENCY["ollama"]
+
+def test_cliente_desconectado_antes_del_stream_libera_la_plaza():
+    import main
+
+    body = json.dumps({"nombre": "pan", "macros_por_100g": {"kcal": 250},
+                       "pregunta": "¿es sano para cenar?", "stream": True}).encode()
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+             "method": "POST", "scheme": "http", "path": "/ollama-chat", "raw_path": b"/ollama-chat",
+             "root_path": "", "query_string": b"", "server": ("test", 80), "client": ("127.0.0.1", 1),
+             "headers": [(b"content-type", b"application/json"), (b"accept", b"text/event-stream")]}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        # el cliente ya se ha ido: falla el envío de las cabeceras, antes de iterar el cuerpo
+        if message["type"] == "http.response.start":
+            raise OSError("cliente desconectado")
+
+    async def run():
+        for _ in range(llm_gateway.LLM_CONCURRENCY["ollama"] + 2):
+            try:
+                await main.app(scope, receive, send)
+            except Exception:
+                pass
+        return llm_gateway.snapshot()["ollama"]
+
+    res = asyncio.run(run())
+    assert res["active"] == 0
+    assert res.get("rejected", 0) == 0
+
+
+def test_cambio_de_loop_cierra_el_cliente_anterior():
+    async def client():
+        return (await llm_gateway._state())[0]
+
+    first = asyncio.run(client())
+    second = asyncio.run(client())
+    try:
+        assert second is not first
+        assert first.is_closed
+    finally:
+        asyncio.run(llm_gateway.close_client())
+
+
+# ====== Ollama con una línea que no es JSON ======
+class _Ollama(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        self.wfile.write(b'{"response": "Hola", "done": false}\n<html>502 Bad Gateway</html>\n')
+
+    def log_message(self, *args):
+        pass
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    block_on_close = False
+
+@pytest.fixture
+def ollama_roto(monkeypatch):
+    srv = _Server(("127.0.0.1", 0), _Ollama)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(llm_gateway, "OLLAMA_URL", f"http://127.0.0.1:{srv.server_address[1]}")
+    yield
+    srv.shutdown()
+    srv.server_close()
+
+def test_linea_no_json_corta_el_stream_con_evento_de_error(ollama_roto):
+    import main
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            r = await client.post("/ollama-chat", json={"nombre": "pan", "macros_por_100g": {"kcal": 250},
+                                                        "pregunta": "¿es sano para cenar?", "stream": True})
+        await llm_gateway.close_client()
+        return r, llm_gateway.snapshot()["ollama"]
+
+    errors = llm_gateway.stats["ollama"]["errors"]
+    r, res = asyncio.run(run())
+    events = [block.split("\n") for block in r.text.strip().split("\n\n")]
+    assert events[0] == ['data: {"token": "Hola"}']
+    assert events[-1][0] == "event: error"
+    assert "Respuesta de Ollama no válida" in events[-1][1]
+    assert res["active"] == 0 and res["errors"] == errors + 1
@@ -0,0 +1,117 @@
+# tests/test_macros_cache.py
+import asyncio
+import sys
+import threading
+
+import pytest
+from sqlmodel import Session
+
+from db import create_db_and_tables, engine
+from models import FoodMacrosCache
+from services import macros_cache
+from services.catalog import get_catalog, store as catalog_store
+
+
+@pytest.mark.parametrize("plural, singular", [
+    ("tomates", "tomate"),
+    ("aceites de oliva", "aceite de oliva"),
+    ("filetes de ternera", "filete de ternera"),
+    ("Pechugas de Pollo", "pollo pechuga"),
+    ("limones", "limón"),
+    ("panes", "pan"),
+    ("nueces", "nuez"),
+    ("huevos", "huevo"),
+    ("judías verdes", "judía verde"),
+    ("corn flakes", "corn flake"),
+])
+def test_plural_y_singular_comparten_clave(plural, singular):
+    assert macros_cache.normalizar_alimento(plural) == macros_cache.normalizar_alimento(singular)
+
+@pytest.mark.parametrize("nombre, food_id", [
+    ("aceites de oliva", "aceite_oliva"),
+    ("pechugas de pollo", "pollo_pechuga"),
+    ("plátanos", "platano"),
+])
+def test_plurales_del_catalogo_no_van_al_llm(nombre, food_id):
+    catalog_store.reload()
+    syn = macros_cache._synonyms(get_catalog())
+    assert syn.get(macros_cache.normalizar_alimento(nombre)) == food_id
+
+def test_acierto_de_cache_no_escribe_y_se_guarda_al_vaciar(monkeypatch):
+    create_db_and_tables()
+    key = macros_cache.normalizar_alimento("bizcocho de yogur")
+    with Session(engine) as session:
+        session.merge(FoodMacrosCache(key=key, query="bizcocho de yogur", protein_g=6, carb_g=50, fat_g=15))
+        session.commit()
+    monkeypatch.setattr(macros_cache, "get_catalog", lambda: None)
+    monkeypatch.setattr(macros_cache, "MACROS_HITS_FLUSH_EVERY", 1000)
+
+    async def run():
+        return [await macros_cache.macros_alimento("Bizcochos de yogur") for _ in range(3)]
+
+    assert all(r["source"] == "cache" for r in asyncio.run(run()))
+    with Session(engine) as session:
+        assert session.get(FoodMacrosCache, key).hits == 0
+    assert macros_cache.flush_hits() == 3
+    with Session(engine) as session:
+        assert session.get(FoodMacrosCache, key).hits == 3
+
+
+def _cache_row(query: str) -> str:
+    create_db_and_tables()
+    key = macros_cache.normalizar_alimento(query)
+    with Session(engine) as session:
+        session.merge(FoodMacrosCache(key=key, query=query, protein_g=1, carb_g=1, fat_g=1, hits=0))
+        session.commit()
+    return key
+
+def test_no_se_pierden_aciertos_al_vaciar_a_la_vez(monkeypatch):
+    key = _cache_row("galleta de avena")
+    monkeypatch.setattr(macros_cache, "MACROS_HITS_FLUSH_EVERY", 10 ** 9)
+    macros_cache.flush_hits()
+    threads, per_thread = 4, 5000
+    done = threading.Event()
+
+    def count():
+        for _ in range(per_thread):
+            macros_cache._count_hit(key)
+
+    def flush():
+        while not done.is_set():
+            macros_cache.flush_hits()
+
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # más cambios de hilo: más ocasiones de pisarse
+    try:
+        flusher = threading.Thread(target=flush)
+        flusher.start()
+        workers = [threading.Thread(target=count) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        done.set()
+        flusher.join()
+    finally:
+        sys.setswitchinterval(old)
+    macros_cache.flush_hits()
+    with Session(engine) as session:
+        assert session.get(FoodMacrosCache, key).hits == threads * per_thread
+
+def test_aciertos_vuelven_a_pendientes_si_falla_la_escritura(monkeypatch):
+    key = _cache_row("tarta de queso")
+    monkeypatch.setattr(macros_cache, "MACROS_HITS_FLUSH_EVERY", 10 ** 9)
+    macros_cache.flush_hits()
+    macros_cache._count_hit(key)
+    macros_cache._count_hit(key)
+
+    def roto():
+        raise RuntimeError("BD caída")
+
+    with monkeypatch.context() as m:
+        m.setattr(macros_cache, "ready_session", roto)
+        with pytest.raises(RuntimeError):
+            macros_cache.flush_hits()
+    assert macros_cache.flush_hits() == 2
+    with Session(engine) as session:
+        assert session.get(FoodMacrosCache, key).hits == 2
@@ -0,0 +1,52 @@
+# tests/test_migrations.py
+
+from sqlalchemy import create_engine, inspect
+from sqlmodel import SQLModel
+
+import migrations
+import models  # noqa: F401  (registra las tablas en SQLModel.metadata)
+
+
+def schema(engine):
+    insp = inspect(engine)
+    out = {}
+    for table in insp.get_table_names():
+        if table == migrations.VERSION_TABLE:
+            continue
+        out[table] = {
+            "columns": {c["name"]: (str(c["type"]), c["nullable"]) for c in insp.get_columns(table)},
+            "pk": insp.get_pk_constraint(table)["constrained_columns"],
+            "fks": sorted((tuple(f["constrained_columns"]), f["referred_table"]) for f in insp.get_foreign_keys(table)),
+            "indexes": sorted((i["name"], tuple(i["column_names"]), bool(i["unique"]))
+                              for i in insp.get_indexes(table)),
+        }
+    return out
+
+
+def test_migraciones_dan_el_mismo_esquema_que_los_modelos(tmp_path):
+    # si falla: falta una migración para el último cambio de models.py
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrada.db'}")
+    migrations.upgrade(migrated)
+    reference = create_engine(f"sqlite:///{tmp_path / 'modelos.db'}")
+    SQLModel.metadata.create_all(reference)
+    assert schema(migrated) == schema(reference)
+
+def test_upgrade_es_idempotente(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'eatbalance.db'}")
+    assert migrations.upgrade(engine) == [v for v, _, _ in migrations.MIGRATIONS]
+    assert migrations.upgrade(engine) == []
+    assert migrations.pending(engine) == []
+
+def test_0004_rellena_search_name(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'eatbalance.db'}")
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS[:3])
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO offproduct (code, name, brands, source, fetched_at) VALUES "
+            "('1', 'Plátano  de CANARIAS', 'N/A', 'dump', '2024-01-01'), ('2', '', 'N/A', 'dump', '2024-01-01')")
+    monkeypatch.undo()
+    assert migrations.upgrade(engine) == [4]
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT code, search_name FROM offproduct ORDER BY code").all()
+    assert [tuple(r) for r in rows] == [("1", "platano de canarias"), ("2", "")]
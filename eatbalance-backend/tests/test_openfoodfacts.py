@@ -0,0 +1,83 @@
+# tests/test_openfoodfacts.py
+import asyncio
+import http.server
+import socketserver
+import threading
+
+import pytest
+
+import openfoodfacts as off
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+class _Server(socketserver.ThreadingTCPServer):
+    # las conexiones keep-alive del cliente no deben bloquear el cierre
+    daemon_threads = True
+    block_on_close = False
+
+@pytest.fixture
+def servidor(monkeypatch):
+    srv = _Server(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(off, "OFF_BASE_URL", f"http://127.0.0.1:{srv.server_address[1]}")
+    monkeypatch.setattr(off, "_client", None)
+    yield
+    asyncio.run(off.close_client())
+    srv.shutdown()
+    srv.server_close()
+
+
+async def _request():
+    await off._get_json("/")
+    return off._client
+
+def test_cambio_de_loop_cierra_el_cliente_anterior(servidor):
+    first = asyncio.run(_request())
+    second = asyncio.run(_request())
+    assert second is not first
+    assert first.is_closed
+
+def test_cliente_de_un_loop_vivo_se_cierra_en_su_loop(servidor):
+    other = asyncio.new_event_loop()
+    threading.Thread(target=other.run_forever, daemon=True).start()
+    try:
+        first = asyncio.run_coroutine_threadsafe(_request(), other).result(5)
+        assert asyncio.run(_request()) is not first
+        # el cierre se programa en el loop del cliente anterior
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), other).result(5)
+        assert first.is_closed
+    finally:
+        other.call_soon_threadsafe(other.stop)
+
+def test_peticiones_en_curso_por_loop():
+    # la misma petición en curso en dos loops a la vez: cada uno espera a su propia tarea
+    async def who(delay):
+        await asyncio.sleep(delay)
+        return asyncio.get_running_loop()
+
+    other = asyncio.new_event_loop()
+    threading.Thread(target=other.run_forever, daemon=True).start()
+    try:
+        slow = asyncio.run_coroutine_threadsafe(off._single_flight("k", lambda: who(0.3)), other)
+
+        async def run():
+            await asyncio.sleep(0.05)
+            return await off._single_flight("k", lambda: who(0)), asyncio.get_running_loop()
+
+        got, loop = asyncio.run(run())
+        assert got is loop
+        assert slow.result(5) is other
+    finally:
+        other.call_soon_threadsafe(other.stop)
@@ -0,0 +1,71 @@
+# tests/test_pagination.py
+import asyncio
+
+import httpx
+import pytest
+from sqlmodel import Session
+
+import main
+import security
+from db import create_db_and_tables, engine
+from models import User
+
+
+@pytest.fixture(scope="module")
+def headers():
+    create_db_and_tables()
+    with Session(engine) as session:
+        user = User(email="paginas@example.com", full_name="Test", hashed_password="x")
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        return {"Authorization": f"Bearer {security.create_user_token(user)}"}
+
+def _run(fn):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await fn(client)
+    return asyncio.run(run())
+
+
+def test_recorrer_paginas(headers):
+    async def fn(client):
+        for i in range(7):
+            (await client.post("/menus", json={"json_payload": {"i": i}}, headers=headers)).raise_for_status()
+        ids, cursor = [], None
+        while True:
+            r = await client.get("/menus", params={"limit": 3, **({"cursor": cursor} if cursor else {})},
+                                 headers=headers)
+            r.raise_for_status()
+            assert all("json_payload" not in m for m in r.json())
+            ids += [m["id"] for m in r.json()]
+            cursor = r.headers.get("x-next-cursor")
+            if not cursor:
+                return ids
+
+    ids = _run(fn)
+    assert ids == sorted(ids, reverse=True) and len(ids) == len(set(ids)) >= 7
+
+def test_cursor_invalido(headers):
+    async def fn(client):
+        return (await client.get("/menus", params={"cursor": "no-es-un-cursor"}, headers=headers)).status_code
+
+    assert _run(fn) == 400
+
+def test_etag_cambia_si_se_reutiliza_el_id(headers):
+    # SQLite reutiliza el id de la última fila borrada: (filas, id máximo) no cambiaba
+    async def fn(client):
+        params = {"include_payload": "true"}
+        last = (await client.post("/menus", json={"json_payload": {"v": "viejo"}}, headers=headers)).json()
+        etag = (await client.get("/menus", params=params, headers=headers)).headers["etag"]
+        assert (await client.get("/menus", params=params,
+                                 headers={**headers, "If-None-Match": etag})).status_code == 304
+        (await client.delete(f"/menus/{last['id']}", headers=headers)).raise_for_status()
+        new = (await client.post("/menus", json={"json_payload": {"v": "nuevo"}}, headers=headers)).json()
+        r = await client.get("/menus", params=params, headers={**headers, "If-None-Match": etag})
+        return last, new, r
+
+    last, new, r = _run(fn)
+    assert new["id"] == last["id"]
+    assert r.status_code == 200
+    assert r.json()[0]["json_payload"] == {"v": "nuevo"}
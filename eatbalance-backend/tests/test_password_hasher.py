@@ -0,0 +1,92 @@
+# tests/test_password_hasher.py
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from routers.auth import _hashing
+from services.password_hasher import HashOverloaded, HashRateLimited, PasswordHasher
+
+
+def slow_task(seconds: float):
+    time.sleep(seconds)
+    return "ok", seconds
+
+
+@pytest.fixture(params=[0, 1], ids=["thread", "process"])
+def hasher(request):
+    ex = PasswordHasher(workers=request.param, max_queue=0, queue_timeout_s=0.1, max_per_ip=1, max_per_email=1)
+    ex.start()
+    yield ex
+    ex.shutdown()
+
+def _run(hasher, fn):
+    async def run():
+        if hasher.workers:
+            await hasher._run(slow_task, 0)  # procesos arrancados antes de medir
+        return await fn()
+    return asyncio.run(run())
+
+
+def test_admision_rechaza_sin_hueco(hasher):
+    async def fn():
+        first = asyncio.ensure_future(hasher._run(slow_task, 0.5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HashOverloaded):
+            await hasher._run(slow_task, 0)
+        assert await first == "ok"
+        return await hasher._run(slow_task, 0)
+
+    assert _run(hasher, fn) == "ok"
+    assert hasher.counters["rejected"] == 1
+    assert hasher.inflight == 0
+
+def test_limite_por_ip_y_email():
+    hasher = PasswordHasher(workers=0, max_queue=4, max_per_ip=1, max_per_email=1)
+
+    async def fn():
+        first = asyncio.ensure_future(hasher._run(slow_task, 0.3, ip="1.2.3.4", email="Ana@example.com"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HashRateLimited):
+            await hasher._run(slow_task, 0, ip="1.2.3.4")
+        with pytest.raises(HashRateLimited):
+            await hasher._run(slow_task, 0, email="ana@EXAMPLE.com")
+        # otra IP y otro email sí entran
+        assert await hasher._run(slow_task, 0, ip="5.6.7.8", email="otro@example.com") == "ok"
+        await first
+        assert await hasher._run(slow_task, 0, ip="1.2.3.4", email="ana@example.com") == "ok"
+
+    asyncio.run(fn())
+    assert hasher.counters["rate_limited"] == 2
+    assert not hasher._per_key
+
+def test_cancelar_no_devuelve_la_plaza_hasta_que_acaba_el_trabajo(hasher):
+    async def fn():
+        task = asyncio.ensure_future(hasher._run(slow_task, 1.0, ip="1.2.3.4"))
+        await asyncio.sleep(0.2)
+        task.cancel()  # cliente desconectado
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert hasher.inflight == 1
+        # el bcrypt sigue ocupando la única plaza global y la de su IP
+        with pytest.raises(HashOverloaded):
+            await hasher._run(slow_task, 0)
+        with pytest.raises(HashRateLimited):
+            await hasher._run(slow_task, 0, ip="1.2.3.4")
+        await asyncio.sleep(1.0)
+        assert hasher.inflight == 0
+        return await hasher._run(slow_task, 0, ip="1.2.3.4")
+
+    assert _run(hasher, fn) == "ok"
+    assert not hasher._per_key
+
+@pytest.mark.parametrize("exc, status", [(HashRateLimited, 429), (HashOverloaded, 503)])
+def test_router_traduce_el_rechazo(exc, status):
+    async def rejected():
+        raise exc()
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(_hashing(rejected()))
+    assert e.value.status_code == status
+    assert e.value.headers == {"Retry-After": "1"}
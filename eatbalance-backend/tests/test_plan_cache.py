@@ -0,0 +1,31 @@
+# tests/test_plan_cache.py
+import asyncio
+
+import httpx
+
+import main
+from services import plan_cache
+from services.catalog import store as catalog_store
+from services.menu_generator import DISTS
+
+
+def test_por_defecto_no_cuantiza():
+    totals = {"kcal": 2500, "protein_g": 150.3, "carb_g": 280.6, "fat_g": 80.2}
+    assert plan_cache.PLAN_CACHE_QUANTUM_G == 0
+    assert plan_cache.quantize_totals(totals) == totals
+    assert plan_cache.quantize_totals(totals, 1.0) == {"kcal": 2500, "protein_g": 150, "carb_g": 281, "fat_g": 80}
+
+def test_generate_all_usa_los_totales_exactos():
+    catalog_store.reload()
+    body = {"totals": {"kcal": 2500, "protein_g": 150.3, "carb_g": 280.6, "fat_g": 80.2}, "scheme": "3", "top_n": 1}
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            first = await client.post("/plan/generate_all", json=body)
+            second = await client.post("/plan/generate_all", json=body)
+            return first.json(), second.json()
+
+    first, second = asyncio.run(run())
+    assert first == second
+    for meal, share in DISTS["3"].items():
+        assert first["plan"][meal]["target"]["protein_g"] == 150.3 * share["protein_g"]
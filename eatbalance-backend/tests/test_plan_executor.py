@@ -0,0 +1,37 @@
+# tests/test_plan_executor.py
+import asyncio
+import time
+
+import pytest
+
+from services.plan_executor import PlanExecutor, PlanOverloaded, PlanTimeout
+
+
+def slow_task(seconds: float):
+    time.sleep(seconds)
+    return "v", seconds, seconds, {}
+
+
+@pytest.mark.parametrize("workers", [0, 1])
+def test_timeout_no_devuelve_la_plaza_hasta_que_acaba_el_trabajo(workers):
+    ex = PlanExecutor(workers=workers, max_queue=0, queue_timeout_s=0.1, task_timeout_s=0.2)
+    ex.start()
+
+    async def run():
+        if workers:
+            # procesos arrancados antes de medir
+            await ex.run(slow_task, 0)
+        with pytest.raises(PlanTimeout):
+            await ex.run(slow_task, 1.0)
+        assert ex.inflight == 1
+        # el trabajo sigue ocupando la única plaza: no se admite otro
+        with pytest.raises(PlanOverloaded):
+            await ex.run(slow_task, 0)
+        await asyncio.sleep(1.2)
+        assert ex.inflight == 0
+        return await ex.run(slow_task, 0)
+
+    try:
+        assert asyncio.run(run()) == ("v", 0)
+    finally:
+        ex.shutdown()
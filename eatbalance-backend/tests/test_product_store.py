@@ -0,0 +1,151 @@
+# tests/test_product_store.py
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session
+
+from db import create_db_and_tables, engine
+from models import OFFProduct, OFFSearch
+from services import product_store
+
+
+def _item(code: str, nombre: str, kcal: float = 100) -> dict:
+    return {"id": code, "nombre": nombre, "marca": "Marca",
+            "nutrientes_por_100g": {"calorias": kcal, "proteinas": 1, "grasas": 1, "carbohidratos": 20,
+                                    "azucares": 10}}
+
+def _upsert(*items, source: str = "api"):
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        product_store.upsert_products(session, [product_store._row_from_item(it, source, now) for it in items])
+        session.commit()
+
+def _search(term: str, prefix: str, limit: int = 50):
+    # la BD de los tests es compartida: solo los productos de este test (por prefijo del code)
+    with Session(engine) as session:
+        return [it["nombre"] for it in product_store.search_local(session, term, limit) if it["id"].startswith(prefix)]
+
+def _age(model, key, seconds: float):
+    with Session(engine) as session:
+        row = session.get(model, key)
+        row.fetched_at = datetime.utcnow() - timedelta(seconds=seconds)
+        session.add(row)
+        session.commit()
+
+
+@pytest.fixture(autouse=True)
+def bd():
+    create_db_and_tables()
+    product_store.stats.clear()
+
+
+class FakeOFF:
+    """openfoodfacts.py sin red: cuenta las llamadas y devuelve lo configurado."""
+
+    def __init__(self, monkeypatch, results=(), product=None):
+        self.calls = 0
+        self.results, self.product = list(results), product
+        monkeypatch.setattr(product_store.openfoodfacts, "buscar_productos", self.buscar)
+        monkeypatch.setattr(product_store.openfoodfacts, "obtener_producto_por_id", self.obtener)
+
+    async def buscar(self, nombre, max_resultados):
+        self.calls += 1
+        return self.results
+
+    async def obtener(self, code):
+        self.calls += 1
+        if self.product is None:
+            raise AssertionError("OFF no debería consultarse")
+        return self.product
+
+
+# ====== búsqueda local ======
+def test_like_sin_tildes_ni_mayusculas(monkeypatch):
+    monkeypatch.setattr(product_store, "_fts_ok", False)
+    _upsert(_item("like-1", "Plátano de Canarias"), _item("like-2", "Zumo 100% plátano"))
+    assert _search("platano canarias", "like-") == ["Plátano de Canarias"]
+    assert _search("PLÁTANO de", "like-") == ["Plátano de Canarias"]
+    assert sorted(_search("platano", "like-")) == ["Plátano de Canarias", "Zumo 100% plátano"]
+    # comodines de LIKE como texto literal
+    assert _search("100%", "like-") == ["Zumo 100% plátano"]
+    assert _search("_latano", "like-") == []
+
+def test_fts(monkeypatch):
+    assert product_store.ensure_search_index()
+    _upsert(_item("fts-1", "Yogur griego natural"), _item("fts-2", "Yogur de fresa"))
+    assert _search("griego yog", "fts-") == ["Yogur griego natural"]
+    assert sorted(_search("YOGUR", "fts-")) == ["Yogur de fresa", "Yogur griego natural"]
+
+
+# ====== TTL y stale-while-revalidate ======
+def test_busqueda_ttl_swr(monkeypatch):
+    off = FakeOFF(monkeypatch, results=[_item("swr-1", "Galletas integrales")])
+    monkeypatch.setattr(product_store, "LOCAL_MIN_HITS", 100)
+
+    async def run():
+        assert [p["nombre"] for p in await product_store.buscar_productos("Galletas", 5)] == ["Galletas integrales"]
+        assert off.calls == 1
+        # dentro del TTL: de la caché, sin ir a OFF
+        await product_store.buscar_productos("galletas", 5)
+        assert off.calls == 1 and product_store.stats["search_hit"] == 1
+
+        # caducada pero dentro de SWR: se sirve y se refresca en segundo plano
+        _age(OFFSearch, ("galletas", 5), product_store.PRODUCT_TTL_S + 10)
+        off.results = [_item("swr-2", "Galletas de avena")]
+        assert [p["nombre"] for p in await product_store.buscar_productos("galletas", 5)] == ["Galletas integrales"]
+        await asyncio.gather(*product_store._background)
+        assert off.calls == 2 and product_store.stats["refreshed"] == 1
+        assert [p["nombre"] for p in await product_store.buscar_productos("galletas", 5)] == ["Galletas de avena"]
+
+        # más allá de TTL + SWR: se espera a OFF
+        _age(OFFSearch, ("galletas", 5), product_store.PRODUCT_TTL_S + product_store.PRODUCT_SWR_S + 10)
+        await product_store.buscar_productos("galletas", 5)
+        assert off.calls == 3 and product_store.stats["search_miss"] == 2
+
+    asyncio.run(run())
+
+def test_busqueda_local_caliente(monkeypatch):
+    off = FakeOFF(monkeypatch)
+    monkeypatch.setattr(product_store, "_fts_ok", False)
+    monkeypatch.setattr(product_store, "LOCAL_MIN_HITS", 2)
+    _upsert(_item("hot-1", "Arroz basmati"), _item("hot-2", "Arroz integral"))
+    res = asyncio.run(product_store.buscar_productos("arroz", 5))
+    assert sorted(p["nombre"] for p in res) == ["Arroz basmati", "Arroz integral"]
+    assert off.calls == 0 and product_store.stats["search_local"] == 1
+
+def test_producto_ttl_y_volcado(monkeypatch):
+    off = FakeOFF(monkeypatch, product=_item("p-1", "Leche entera nueva"))
+    _upsert(_item("p-1", "Leche entera"))
+    _upsert(_item("p-dump", "Queso curado"), source="dump")
+    _age(OFFProduct, "p-dump", product_store.PRODUCT_TTL_S + product_store.PRODUCT_SWR_S + 10)
+
+    async def run():
+        assert (await product_store.obtener_producto_por_id("p-1"))["nombre"] == "Leche entera"
+        # lo importado del volcado no caduca
+        assert (await product_store.obtener_producto_por_id("p-dump"))["nombre"] == "Queso curado"
+        assert off.calls == 0
+        _age(OFFProduct, "p-1", product_store.PRODUCT_TTL_S + product_store.PRODUCT_SWR_S + 10)
+        assert (await product_store.obtener_producto_por_id("p-1"))["nombre"] == "Leche entera nueva"
+        assert off.calls == 1
+
+    asyncio.run(run())
+
+
+# ====== sin conexión ======
+def test_offline(monkeypatch):
+    off = FakeOFF(monkeypatch)
+    monkeypatch.setattr(product_store, "OFFLINE", True)
+    monkeypatch.setattr(product_store, "_fts_ok", False)
+    _upsert(_item("off-1", "Atún en aceite"))
+    _age(OFFProduct, "off-1", product_store.PRODUCT_TTL_S + product_store.PRODUCT_SWR_S + 10)
+
+    async def run():
+        # caducado, pero sin conexión se sirve lo guardado
+        assert (await product_store.obtener_producto_por_id("off-1"))["nombre"] == "Atún en aceite"
+        with pytest.raises(product_store.ProductNotFound):
+            await product_store.obtener_producto_por_id("no-existe")
+        assert [p["nombre"] for p in await product_store.buscar_productos("atun", 5)] == ["Atún en aceite"]
+
+    asyncio.run(run())
+    assert off.calls == 0
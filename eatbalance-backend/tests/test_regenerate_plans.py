@@ -0,0 +1,45 @@
+# tests/test_regenerate_plans.py
+import logging
+
+from sqlmodel import Session
+
+from db import create_db_and_tables, engine
+from models import User, UserProfile
+from services import regenerate_plans
+from services.catalog import get_catalog
+
+
+def _profile(user_id: int, sex: str = "hombre") -> UserProfile:
+    return UserProfile(user_id=user_id, sex=sex, age=30, height_cm=180, weight_kg=80,
+                       activity_level="moderado", goal="mantenimiento")
+
+def test_compute_plans_devuelve_usuario_y_motivo():
+    plans, invalid = regenerate_plans.compute_plans([_profile(1), _profile(2, sex="x"), _profile(3)])
+    assert [p["user_id"] for p in plans] == [1, 3]
+    assert len(invalid) == 1
+    user_id, reason = invalid[0]
+    assert (user_id, reason) == (2, "Sexo no válido: usa 'hombre' o 'mujer'")
+
+def test_compute_menus_devuelve_los_errores(monkeypatch):
+    monkeypatch.setattr(regenerate_plans, "_worker_catalog", get_catalog())
+    monkeypatch.setattr(regenerate_plans, "_worker_tables", None)
+    totals = {"kcal": 2500, "protein_g": 150, "carb_g": 300, "fat_g": 80}
+    _, out, errors = regenerate_plans._compute_menus([(7, totals)], "esquema-inexistente")
+    assert out == [(7, None)]
+    assert errors[0][0] == 7 and "KeyError" in errors[0][1]
+
+def test_run_registra_los_perfiles_no_validos(tmp_path, caplog):
+    create_db_and_tables()
+    with Session(engine) as session:
+        user = User(email="regenerar@example.com", full_name="Test", hashed_password="x")
+        session.add(user)
+        session.commit()
+        session.add(_profile(user.id, sex="x"))
+        session.commit()
+        user_id = user.id
+
+    with caplog.at_level(logging.WARNING, logger=regenerate_plans.__name__):
+        stats = regenerate_plans.run(workers=1, dry_run=True, checkpoint=tmp_path / "cp.json")
+    assert stats.invalid >= 1
+    assert any(uid == user_id and kind == "perfil" and reason for uid, kind, reason in stats.failures)
+    assert any(f"usuario {user_id} (perfil)" in r.getMessage() for r in caplog.records)
@@ -0,0 +1,172 @@
+# tests/test_scaling_parity.py
+"""
+Paridad del motor vectorizado (services/scaling_engine.py) con el algoritmo
+original fila a fila sobre pandas, copiado aquí como referencia.
+
+Única diferencia intencionada: un food_id repetido en un menú. El original se
+quedaba con el último base_g pero aplicaba el factor una vez por aparición
+(y sumaba su aporte varias veces); compile_menu lo trata como un solo
+alimento con el último base_g. Los menús de data/menus.json no repiten
+alimentos; ver test_food_id_repetido.
+"""
+import random
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pytest
+
+from services.catalog import FOODS_PATH, MENUS_PATH, load_foods, load_menus
+from services.menu_generator import (DISTS, Macro, _error_score, generate_all_options, macros_of,
+                                     per_meal_targets, round_grams, scale_menu_to_targets, sum_macros)
+
+TOTALS_PER_SCHEME = 8
+
+
+# ====== referencia: implementación original ======
+def legacy_scale(menu: Dict, foods_df: pd.DataFrame, targets: Macro):
+    fdf = foods_df.set_index("food_id")
+    grams_map: Dict[str, float] = {it["food_id"]: float(it["base_g"]) for it in menu["items"]}
+
+    def current_macros() -> Macro:
+        return sum_macros([macros_of(fdf.loc[fid], g) for fid, g in grams_map.items()])
+
+    protein_ids = [it["food_id"] for it in menu["items"] if fdf.loc[it["food_id"], "category"] == "PROTEIN"]
+    carb_ids = [it["food_id"] for it in menu["items"] if fdf.loc[it["food_id"], "category"] == "CARB"]
+    fatflex_ids = [it["food_id"] for it in menu["items"] if fdf.loc[it["food_id"], "category"] == "FAT_FLEX"]
+    fat_ids = [it["food_id"] for it in menu["items"] if fdf.loc[it["food_id"], "category"] == "FAT"]
+
+    cur = current_macros()
+    base_p = sum(macros_of(fdf.loc[fid], grams_map[fid]).protein_g for fid in protein_ids)
+    if base_p > 0:
+        factor_p = max(0.6, min(3.5, max(0.0, targets.protein_g - (cur.protein_g - base_p)) / base_p))
+        for fid in protein_ids:
+            grams_map[fid] *= factor_p
+
+    cur = current_macros()
+    base_c = sum(macros_of(fdf.loc[fid], grams_map[fid]).carb_g for fid in carb_ids)
+    other_c = cur.carb_g - base_c
+    if base_c > 0:
+        factor_c = max(0.6, min(3.5, max(0.0, targets.carb_g - other_c) / base_c))
+        for fid in carb_ids:
+            grams_map[fid] *= factor_c
+
+    cur = current_macros()
+    base_flex = sum(macros_of(fdf.loc[fid], grams_map[fid]).fat_g for fid in fatflex_ids)
+    base_fats = sum(macros_of(fdf.loc[fid], grams_map[fid]).fat_g for fid in fat_ids)
+    need_f = max(0.0, targets.fat_g - (cur.fat_g - base_flex - base_fats))
+    if len(fatflex_ids) > 0:
+        fid = fatflex_ids[0]
+        fat_per_g = fdf.loc[fid, "fat_g"] / 100.0
+        grams_map[fid] = (need_f / fat_per_g) if fat_per_g > 0 else 0.0
+    elif base_fats > 0:
+        factor_f = max(0.6, min(3.0, need_f / base_fats))
+        for fid in fat_ids:
+            grams_map[fid] *= factor_f
+
+    grams_map = {fid: round_grams(fdf.loc[fid, "category"], g) for fid, g in grams_map.items()}
+
+    final = current_macros()
+    items = []
+    for fid, g in grams_map.items():
+        row = fdf.loc[fid]
+        m = macros_of(row, g)
+        items.append({"food_id": fid, "name": row["name"], "grams": g, "kcal": round(m.kcal, 2),
+                      "protein_g": round(m.protein_g, 2), "carb_g": round(m.carb_g, 2), "fat_g": round(m.fat_g, 2)})
+    debug = {
+        "achieved": {"kcal": final.kcal, "protein_g": final.protein_g, "carb_g": final.carb_g, "fat_g": final.fat_g},
+        "errors": {
+            "kcal": round(final.kcal - targets.kcal, 2),
+            "protein_g": round(final.protein_g - targets.protein_g, 2),
+            "carb_g": round(final.carb_g - targets.carb_g, 2),
+            "fat_g": round(final.fat_g - targets.fat_g, 2),
+        },
+    }
+    return items, debug
+
+def legacy_all_options(foods_df: pd.DataFrame, menus: list, totals: Dict, scheme: str,
+                       top_n: Optional[int]) -> Dict[str, Dict]:
+    targets = per_meal_targets(totals["kcal"], totals["protein_g"], totals["carb_g"], totals["fat_g"], scheme)
+    out = {}
+    for meal in DISTS[scheme]:
+        options = []
+        for m in menus:
+            if m.get("meal_type") != meal:
+                continue
+            items, dbg = legacy_scale(m, foods_df, targets[meal])
+            options.append({"menu_id": m["menu_id"], "menu_name": m["menu_name"], "items": items,
+                            "achieved": dbg["achieved"], "errors": dbg["errors"],
+                            "score": _error_score(dbg["errors"])})
+        options.sort(key=lambda x: x["score"])
+        if top_n is not None:
+            options = options[:top_n]
+        out[meal] = {"target": vars(targets[meal]), "options": options}
+    return out
+
+
+# ====== datos ======
+def random_totals(rnd: random.Random) -> Dict[str, float]:
+    kcal = rnd.uniform(1500, 3500)
+    p_pct, f_pct = rnd.uniform(0.2, 0.35), rnd.uniform(0.2, 0.35)
+    P, F = kcal * p_pct / 4, kcal * f_pct / 9
+    return {"kcal": kcal, "protein_g": P, "carb_g": (kcal - 4 * P - 9 * F) / 4, "fat_g": F}
+
+def random_menus(foods_df: pd.DataFrame, per_meal: int, seed: int = 0) -> List[Dict]:
+    """Menús sin alimentos repetidos que mezclan todas las categorías (FAT_FLEX, FAT, MIXED...)."""
+    rnd = random.Random(seed)
+    food_ids = foods_df["food_id"].astype(str).tolist()
+    meals = sorted({meal for scheme in DISTS.values() for meal in scheme})
+    menus = []
+    for meal in meals:
+        for i in range(per_meal):
+            items = [{"food_id": fid, "base_g": rnd.choice([5, 10, 30, 50, 80, 120, 200, 320])}
+                     for fid in rnd.sample(food_ids, rnd.randint(1, 6))]
+            menus.append({"menu_id": f"rnd_{meal}_{i}", "menu_name": f"Aleatorio {i}", "meal_type": meal,
+                          "items": items})
+    return menus
+
+@pytest.fixture(scope="module")
+def catalog():
+    foods_df = load_foods(FOODS_PATH)
+    return foods_df, load_menus(MENUS_PATH) + random_menus(foods_df, per_meal=10)
+
+
+# ====== paridad ======
+@pytest.mark.parametrize("scheme", list(DISTS))
+@pytest.mark.parametrize("top_n", [1, 5, None])
+def test_generate_all_options_igual_que_el_original(catalog, scheme, top_n):
+    foods_df, menus = catalog
+    rnd = random.Random(f"{scheme}-{top_n}")
+    for _ in range(TOTALS_PER_SCHEME):
+        totals = random_totals(rnd)
+        new = generate_all_options(foods_df, menus, totals, scheme, top_n=top_n)
+        old = legacy_all_options(foods_df, menus, totals, scheme, top_n)
+        assert {meal: {k: v for k, v in res.items() if k != "source"} for meal, res in new.items()} == old
+
+def test_scale_menu_to_targets_igual_que_el_original(catalog):
+    foods_df, menus = catalog
+    rnd = random.Random(1)
+    for menu in menus:
+        tt = random_totals(rnd)
+        t = per_meal_targets(tt["kcal"], tt["protein_g"], tt["carb_g"], tt["fat_g"], "4")["comida"]
+        items, dbg = scale_menu_to_targets(menu, foods_df, t)
+        old_items, old_dbg = legacy_scale(menu, foods_df, t)
+        assert items == old_items
+        assert (dbg["achieved"], dbg["errors"]) == (old_dbg["achieved"], old_dbg["errors"])
+        # mismos tipos en el JSON (grams int o 0.0)
+        assert [type(i["grams"]) for i in items] == [type(i["grams"]) for i in old_items]
+
+def test_food_id_repetido(catalog):
+    # cambio intencionado: un alimento repetido cuenta una vez, con el último base_g
+    foods_df, _ = catalog
+    prot = foods_df.loc[foods_df["category"] == "PROTEIN", "food_id"].iloc[0]
+    carb = foods_df.loc[foods_df["category"] == "CARB", "food_id"].iloc[0]
+    menu = {"menu_id": "dup", "menu_name": "Repetido", "meal_type": "comida",
+            "items": [{"food_id": prot, "base_g": 100}, {"food_id": carb, "base_g": 80},
+                      {"food_id": prot, "base_g": 150}]}
+    dedup = {**menu, "items": [{"food_id": carb, "base_g": 80}, {"food_id": prot, "base_g": 150}]}
+    t = per_meal_targets(2500, 150, 300, 80, "3")["comida"]
+
+    items, _ = scale_menu_to_targets(menu, foods_df, t)
+    assert [i["food_id"] for i in items] == [prot, carb]
+    expected, _ = legacy_scale(dedup, foods_df, t)
+    assert sorted(items, key=lambda i: i["food_id"]) == sorted(expected, key=lambda i: i["food_id"])
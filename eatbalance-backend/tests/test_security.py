@@ -0,0 +1,123 @@
+# tests/test_security.py
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import security
+from db import close_async_engine, create_db_and_tables, engine, get_async_engine
+from models import User
+from security import (AuthCache, AuthUser, auth_cache, create_user_token, get_current_user,
+                      get_current_user_read, revoke_user_tokens, revoke_user_tokens_async)
+
+
+class NoDB:
+    """Sesión que falla si se usa: la petición tiene que resolverse sin ir a la BD."""
+
+    def get(self, *args, **kwargs):
+        raise AssertionError("consulta a la BD inesperada")
+
+
+@pytest.fixture
+def user():
+    create_db_and_tables()
+    auth_cache.clear()
+    with Session(engine) as session:
+        u = User(email=f"tokens{time.time_ns()}@example.com", full_name="Test", hashed_password="x")
+        session.add(u)
+        session.commit()
+        session.refresh(u)
+        session.expunge(u)
+    yield u
+    auth_cache.clear()
+
+def _status(fn, *args):
+    with pytest.raises(HTTPException) as e:
+        fn(*args)
+    return e.value.status_code
+
+
+# ====== caché ======
+def test_token_en_cache_no_consulta_la_bd(user):
+    token = create_user_token(user)
+    with Session(engine) as session:
+        first = get_current_user(token, session)
+    assert first == AuthUser.from_user(user)
+    hits = auth_cache.hits
+    assert get_current_user(token, NoDB()) == first
+    assert auth_cache.hits == hits + 1
+
+def test_ttl_no_pasa_de_la_caducidad_del_token(user):
+    token = create_user_token(user)
+    _, _, exp = security._decode(token)
+    with Session(engine) as session:
+        get_current_user(token, session)
+    assert auth_cache._data[token][0] <= exp
+
+    cache = AuthCache(maxsize=10, ttl_s=60)
+    cache.put("t", AuthUser.from_user(user), token_exp=time.time() + 0.1)
+    assert cache.get("t") is not None
+    time.sleep(0.15)
+    assert cache.get("t") is None
+
+def test_cache_acotada_por_tamano(user):
+    cache = AuthCache(maxsize=2, ttl_s=60)
+    for t in ("a", "b", "c"):
+        cache.put(t, AuthUser.from_user(user), token_exp=time.time() + 60)
+    assert cache.get("a") is None and cache.get("c") is not None
+
+
+# ====== revocación ======
+def test_revocar_invalida_el_token_cacheado(user):
+    token = create_user_token(user)
+    with Session(engine) as session:
+        get_current_user(token, session)
+        db_user = session.get(User, user.id)
+        revoke_user_tokens(session, db_user)
+        new_token = create_user_token(db_user)
+    assert token not in auth_cache._data
+
+    with Session(engine) as session:
+        assert _status(get_current_user, token, session) == 401
+        assert get_current_user(new_token, session).token_version == user.token_version + 1
+
+def test_revocar_async(user):
+    token = create_user_token(user)
+    with Session(engine) as session:
+        get_current_user(token, session)
+
+    async def revoke():
+        try:
+            async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+                await revoke_user_tokens_async(session, await session.get(User, user.id))
+        finally:
+            await close_async_engine()
+
+    asyncio.run(revoke())
+    with Session(engine) as session:
+        assert _status(get_current_user, token, session) == 401
+
+def test_usuario_desactivado(user):
+    token = create_user_token(user)
+    with Session(engine) as session:
+        db_user = session.get(User, user.id)
+        db_user.is_active = False
+        session.add(db_user)
+        session.commit()
+        assert _status(get_current_user, token, session) == 401
+
+
+# ====== lectura solo con el token ======
+def test_lectura_solo_con_claims(user, monkeypatch):
+    monkeypatch.setattr(security, "AUTH_READ_CLAIMS_ONLY", True)
+    token = create_user_token(user)
+    assert get_current_user_read(token, NoDB()) == AuthUser(user.id, None, None, True, user.token_version)
+    assert _status(get_current_user_read, token + "x", NoDB()) == 401
+
+def test_lectura_con_bd_por_defecto(user):
+    token = create_user_token(user)
+    with Session(engine) as session:
+        assert get_current_user_read(token, session) == AuthUser.from_user(user)